@@ -1,6 +1,9 @@
 import html
 
 from django.contrib import admin
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.html import format_html, mark_safe, strip_tags
 
 from .models import (Answer, Lesson, Payment, Practice, Question,
@@ -42,7 +45,7 @@ class UserContactAdmin(admin.ModelAdmin):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('get_user_tg_name', 'tariff', 'access_date_start', 'access_date_finish')
-    search_fields = ('user__tg_name',)
+    search_fields = ('user__tg_name', 'external_payment_id')
 
     def get_user_tg_name(self, obj):
         # Возвращает тгимя из связанной модели TelegramUser или '-' если записи нет
@@ -51,82 +54,85 @@ class PaymentAdmin(admin.ModelAdmin):
     get_user_tg_name.short_description = 'ТГ Имя пользователя'  # Название столбца в админке
 
 
-@admin.register(UserAvailability)
-class UserAvailabilityAdmin(admin.ModelAdmin):
-    list_display = ('user', 'get_topics', 'get_lessons', 'get_videos', 'get_tests', 'get_practices')
-    filter_horizontal = ('topics', 'lessons', 'videos', 'tests', 'practices')  # Удобный виджет для M2M
+class ContentSummaryAdmin(admin.ModelAdmin):
+    """
+    Список владельцев ManyToMany-связей с контентом (UserAvailability, UserDone, StartUserAvailability).
+
+    Для каждого вида контента в запрос списка добавляются число связей и первые
+    CONTENT_TITLES_LIMIT названий (подзапросы), поэтому страница списка загружается одним запросом
+    независимо от числа строк и объема открытого контента.
+    """
+    content_fields = ('topics', 'lessons', 'videos', 'tests', 'practices')
+    filter_horizontal = content_fields  # Удобный виджет для M2M
+    CONTENT_TITLES_LIMIT = 5
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        annotations = {}
+        for field_name in self.content_fields:
+            field = self.model._meta.get_field(field_name)
+            through = field.remote_field.through
+            owner = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            ordering = field.related_model._meta.ordering or ['pk']
+            links = through.objects.filter(**{owner: OuterRef('pk')})
+            annotations[f'{field_name}_count'] = Coalesce(
+                Subquery(links.order_by().values(owner).annotate(count=Count('pk')).values('count')), 0
+            )
+            annotations[f'{field_name}_titles'] = ArraySubquery(
+                links.order_by(*[f"{'-' if name.startswith('-') else ''}{target}__{name.lstrip('-')}"
+                                 for name in ordering])
+                .values(f'{target}__title')[:self.CONTENT_TITLES_LIMIT]
+            )
+        return queryset.annotate(**annotations)
+
+    def content_summary(self, obj, field_name: str) -> str:
+        count = getattr(obj, f'{field_name}_count')
+        titles = getattr(obj, f'{field_name}_titles')
+        if not count:
+            return '-'
+        summary = ", ".join(titles)
+        if count > len(titles):
+            summary += ", …"
+        return f"{count}: {summary}"
 
     def get_topics(self, obj):
-        return ", ".join([topic.title for topic in obj.topics.all()])
+        return self.content_summary(obj, 'topics')
     get_topics.short_description = 'Темы'
 
     def get_lessons(self, obj):
-        return ", ".join([lesson.title for lesson in obj.lessons.all()])
+        return self.content_summary(obj, 'lessons')
     get_lessons.short_description = 'Уроки'
 
     def get_videos(self, obj):
-        return ", ".join([video.title for video in obj.videos.all()])
+        return self.content_summary(obj, 'videos')
     get_videos.short_description = 'Видео'
 
     def get_tests(self, obj):
-        return ", ".join([test.title for test in obj.tests.all()])
+        return self.content_summary(obj, 'tests')
     get_tests.short_description = 'Тесты'
 
     def get_practices(self, obj):
-        return ", ".join([practice.title for practice in obj.practices.all()])
+        return self.content_summary(obj, 'practices')
     get_practices.short_description = 'Практики'
 
 
-@admin.register(UserDone)
-class UserDoneAdmin(admin.ModelAdmin):
-    list_display = ('user', 'last_updated', 'get_topics', 'get_lessons', 'get_videos', 'get_tests', 'get_practices')
-    filter_horizontal = ('topics', 'lessons', 'videos', 'tests', 'practices')  # Удобный виджет для M2M
-
-    def get_topics(self, obj):
-        return ", ".join([topic.title for topic in obj.topics.all()])
-    get_topics.short_description = 'Темы'
-
-    def get_lessons(self, obj):
-        return ", ".join([lesson.title for lesson in obj.lessons.all()])
-    get_lessons.short_description = 'Уроки'
-
-    def get_videos(self, obj):
-        return ", ".join([video.title for video in obj.videos.all()])
-    get_videos.short_description = 'Видео'
+@admin.register(UserAvailability)
+class UserAvailabilityAdmin(ContentSummaryAdmin):
+    list_display = ('user', 'get_topics', 'get_lessons', 'get_videos', 'get_tests', 'get_practices')
+    list_select_related = ('user',)
 
-    def get_tests(self, obj):
-        return ", ".join([test.title for test in obj.tests.all()])
-    get_tests.short_description = 'Тесты'
 
-    def get_practices(self, obj):
-        return ", ".join([practice.title for practice in obj.practices.all()])
-    get_practices.short_description = 'Практики'
+@admin.register(UserDone)
+class UserDoneAdmin(ContentSummaryAdmin):
+    list_display = ('user', 'last_updated', 'get_topics', 'get_lessons', 'get_videos', 'get_tests', 'get_practices')
+    list_select_related = ('user',)
 
 
 @admin.register(StartUserAvailability)
-class StartUserAvailabilityAdmin(admin.ModelAdmin):
+class StartUserAvailabilityAdmin(ContentSummaryAdmin):
     list_display = ('tariff', 'get_topics', 'get_lessons', 'get_videos', 'get_tests', 'get_practices')
-    filter_horizontal = ('topics', 'lessons', 'videos', 'tests', 'practices')  # Удобный виджет для M2M
-
-    def get_topics(self, obj):
-        return ", ".join([topic.title for topic in obj.topics.all()])
-    get_topics.short_description = 'Темы'
-
-    def get_lessons(self, obj):
-        return ", ".join([lesson.title for lesson in obj.lessons.all()])
-    get_lessons.short_description = 'Уроки'
-
-    def get_videos(self, obj):
-        return ", ".join([video.title for video in obj.videos.all()])
-    get_videos.short_description = 'Видео'
-
-    def get_tests(self, obj):
-        return ", ".join([test.title for test in obj.tests.all()])
-    get_tests.short_description = 'Тесты'
-
-    def get_practices(self, obj):
-        return ", ".join([practice.title for practice in obj.practices.all()])
-    get_practices.short_description = 'Практики'
+    list_select_related = ('tariff',)
 
 
 class LessonInline(admin.TabularInline):
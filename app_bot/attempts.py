@@ -0,0 +1,135 @@
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import TestAttempt, TestAttemptAnswer
+from .text_utils import get_description_text
+
+# Минимальный процент правильных ответов, с которым тест считается пройденным
+PASS_PERCENTAGE = 80
+
+
+class AttemptError(Exception):
+    """Ошибка в данных ответа (неверный формат номеров ответов и т.п.)."""
+
+
+class AttemptConflictError(AttemptError):
+    """Ответ не может быть принят попыткой: она уже завершена или вопрос не относится к ее тесту."""
+
+
+class TestAnswerKey:
+    """
+    Ключ ответов теста: порядок вопросов и порядковые номера правильных ответов.
+
+    Строится из объектов каталога (вопросы и ответы загружены заранее) вместе с каталогом,
+    поэтому проверка ответа не делает запросов в БД.
+    """
+
+    def __init__(self, test):
+        questions = list(test.questions.all())
+        self.test_id = test.test_id
+        self.show_right_answer = test.show_right_answer
+        self.question_ids = tuple(question.question_id for question in questions)
+        self.position = {question_id: index for index, question_id in enumerate(self.question_ids)}
+        self.right = {}
+        self.right_answers = {}
+        for question in questions:
+            right_answers = [answer for answer in question.answers.all() if answer.right]
+            self.right[question.question_id] = frozenset(answer.serial_number for answer in right_answers)
+            self.right_answers[question.question_id] = [
+                {'serial_number': answer.serial_number, 'description': get_description_text(answer)}
+                for answer in right_answers
+            ]
+
+    def grade(self, question_id: int, selected) -> bool:
+        """Проверяет выбранные порядковые номера ответов на вопрос."""
+        if question_id not in self.right:
+            raise AttemptConflictError(f"Вопрос '{question_id}' не относится к тесту '{self.test_id}'")
+        return frozenset(selected) == self.right[question_id]
+
+    def next_question_id(self, question_id: int):
+        """ИД следующего вопроса теста или None, если вопрос последний."""
+        index = self.position[question_id] + 1
+        return self.question_ids[index] if index < len(self.question_ids) else None
+
+
+def parse_selected(value) -> list:
+    """
+    Приводит ответ пользователя к списку порядковых номеров.
+    Принимает список чисел или строку вида "1,2".
+    """
+    if isinstance(value, str):
+        value = [part for part in value.replace(' ', '').split(',') if part]
+    if not isinstance(value, (list, tuple)):
+        raise AttemptError("Ответ должен быть списком номеров или строкой вида '1,2'")
+    try:
+        return sorted({int(number) for number in value})
+    except (TypeError, ValueError):
+        raise AttemptError("Номера ответов должны быть числами")
+
+
+def start_attempt(user_id: int, answer_key: TestAnswerKey) -> TestAttempt:
+    """Создает новую попытку прохождения теста."""
+    return TestAttempt.objects.create(
+        user_id=user_id,
+        test_id=answer_key.test_id,
+        questions_total=len(answer_key.question_ids),
+    )
+
+
+def submit_answers(attempt: TestAttempt, answer_key: TestAnswerKey, answers: list) -> list:
+    """
+    Проверяет и сохраняет ответы одним INSERT. Повторный ответ на тот же вопрос
+    не перезаписывает первый (ON CONFLICT DO NOTHING): результат по такому вопросу
+    возвращается по сохраненному ответу, по которому считается и итог попытки.
+
+    Args:
+        attempt: незавершенная попытка.
+        answer_key: ключ ответов теста попытки.
+        answers: список пар (question_id, выбранные порядковые номера).
+
+    Returns:
+        Список результатов по каждому ответу.
+    """
+    if attempt.finished_at is not None:
+        raise AttemptConflictError(f"Попытка '{attempt.attempt_id}' уже завершена")
+
+    rows = [
+        TestAttemptAnswer(attempt_id=attempt.attempt_id, question_id=question_id,
+                          selected=selected, is_correct=answer_key.grade(question_id, selected))
+        for question_id, selected in answers
+    ]
+    TestAttemptAnswer.objects.bulk_create(rows, ignore_conflicts=True)
+    stored = dict(
+        TestAttemptAnswer.objects
+        .filter(attempt_id=attempt.attempt_id, question_id__in=[row.question_id for row in rows])
+        .values_list('question_id', 'is_correct')
+    )
+
+    results = []
+    for row in rows:
+        is_correct = stored[row.question_id]
+        results.append({
+            'question_id': row.question_id,
+            'is_correct': is_correct,
+            'right_answers': (answer_key.right_answers[row.question_id]
+                              if answer_key.show_right_answer and not is_correct else []),
+            'next_question_id': answer_key.next_question_id(row.question_id),
+        })
+    return results
+
+
+def finish_attempt(attempt: TestAttempt) -> TestAttempt:
+    """
+    Подсчитывает правильные ответы попытки и сохраняет результат.
+    Повторное завершение возвращает уже сохраненный результат.
+    """
+    if attempt.finished_at is not None:
+        return attempt
+
+    correct_answers = attempt.answers.aggregate(correct=Count('pk', filter=Q(is_correct=True)))['correct']
+    attempt.correct_answers = correct_answers
+    attempt.percentage = round(correct_answers * 100 / attempt.questions_total) if attempt.questions_total else 0
+    attempt.passed = correct_answers * 100 >= PASS_PERCENTAGE * attempt.questions_total
+    attempt.finished_at = timezone.now()
+    attempt.save(update_fields=['correct_answers', 'percentage', 'passed', 'finished_at'])
+    return attempt
@@ -0,0 +1,94 @@
+from .models import Lesson, Practice, Test, Topic, UserAvailability, Video
+
+
+def bulk_add_related(owner, field_name: str, content_ids) -> None:
+    """
+    Добавляет связи ManyToMany одним INSERT в промежуточную таблицу.
+
+    Уже существующие связи пропускаются на уровне БД (ON CONFLICT DO NOTHING),
+    поэтому текущее содержимое связи не читается и стоимость вставки не зависит от него.
+    """
+    content_ids = set(content_ids)
+    if not content_ids:
+        return
+    field = owner._meta.get_field(field_name)
+    through = field.remote_field.through
+    owner_column = f"{field.m2m_field_name()}_id"
+    content_column = f"{field.m2m_reverse_field_name()}_id"
+    through.objects.bulk_create(
+        [through(**{owner_column: owner.pk, content_column: content_id}) for content_id in content_ids],
+        ignore_conflicts=True,
+    )
+
+
+def get_availability_user_id(telegram_id: int):
+    """Возвращает user_id владельца UserAvailability по telegram_id или None."""
+    return UserAvailability.objects.filter(user__tg_id=telegram_id).values_list('user_id', flat=True).first()
+
+
+def get_compact_availability(user_id: int, topic_id: int = None, lesson_id: int = None) -> dict:
+    """
+    Возвращает доступный пользователю контент в компактном виде: только id и названия.
+
+    Каждый вид контента выбирается одним запросом через промежуточную таблицу UserAvailability,
+    поэтому число запросов не зависит от количества открытого контента.
+
+    Args:
+        user_id: ИД пользователя (первичный ключ UserAvailability).
+        topic_id: Ограничить уроки, видео, тесты и практики одной темой (опционально).
+        lesson_id: Ограничить видео, тесты и практики одним уроком (опционально).
+    """
+    topics = Topic.objects.filter(available_to_users=user_id)
+    lessons = Lesson.objects.filter(available_to_users=user_id)
+    videos = Video.objects.filter(available_to_users=user_id)
+    tests = Test.objects.filter(available_to_users=user_id).order_by('test_id')
+    practices = Practice.objects.filter(available_to_users=user_id).order_by('practice_id')
+
+    if topic_id is not None:
+        topics = topics.filter(topic_id=topic_id)
+        lessons = lessons.filter(topic_id=topic_id)
+        videos = videos.filter(lesson__topic_id=topic_id)
+        tests = tests.filter(lesson__topic_id=topic_id)
+        practices = practices.filter(lesson__topic_id=topic_id)
+    if lesson_id is not None:
+        lessons = lessons.filter(lesson_id=lesson_id)
+        videos = videos.filter(lesson_id=lesson_id)
+        tests = tests.filter(lesson_id=lesson_id)
+        practices = practices.filter(lesson_id=lesson_id)
+
+    return {
+        'user_id': user_id,
+        'topics': list(topics.values('topic_id', 'title')),
+        'lessons': list(lessons.values('lesson_id', 'title', 'topic_id')),
+        'videos': list(videos.values('video_id', 'title', 'lesson_id')),
+        'tests': list(tests.values('test_id', 'title', 'lesson_id')),
+        'practices': list(practices.values('practice_id', 'title', 'lesson_id')),
+    }
+
+
+# Вид контента урока -> (модель, первичный ключ)
+LESSON_CONTENT_MODELS = {
+    'videos': (Video, 'video_id'),
+    'tests': (Test, 'test_id'),
+    'practices': (Practice, 'practice_id'),
+}
+
+
+def list_available_lesson_content(telegram_id: int, kind: str, topic_title: str = None,
+                                  lesson_title: str = None, lesson_id: int = None) -> list:
+    """
+    Возвращает контент вида kind ('videos', 'tests', 'practices') в уроке, доступный пользователю.
+
+    Урок задается либо ИД (lesson_id), либо названиями темы и урока.
+    Пересечение контента урока с доступным пользователю выполняется одним запросом с JOIN
+    по промежуточной таблице UserAvailability.
+    """
+    model, pk_name = LESSON_CONTENT_MODELS[kind]
+    content = model.objects.filter(available_to_users__user__tg_id=telegram_id)
+    if lesson_id is not None:
+        content = content.filter(lesson_id=lesson_id)
+    else:
+        content = content.filter(lesson__title=lesson_title, lesson__topic__title=topic_title)
+    if not model._meta.ordering:
+        content = content.order_by(pk_name)
+    return list(content.values(pk_name, 'title'))
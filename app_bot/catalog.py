@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.utils import timezone
+
+from .attempts import TestAnswerKey
+from .models import (ContentVersion, Lesson, Practice, Question,
+                     StartUserAvailability, Test, Topic, Video)
+from .progression import ProgressionGraph
+
+logger = logging.getLogger(__name__)
+
+CONTENT_VERSION_ID = 1
+NEXT_CONTENT_FIELDS = ('next_topics', 'next_lessons', 'next_videos', 'next_tests', 'next_practices')
+START_CONTENT_FIELDS = ('topics', 'lessons', 'videos', 'tests', 'practices')
+
+_lock = threading.Lock()
+_state = {'catalog': None, 'checked_at': 0.0}
+
+
+def get_content_version() -> int:
+    """Возвращает текущую версию учебного контента из БД."""
+    version = ContentVersion.objects.filter(pk=CONTENT_VERSION_ID).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump_content_version() -> None:
+    """
+    Увеличивает общую версию контента. Каталоги всех процессов перечитываются
+    при следующей проверке версии, каталог текущего процесса - сразу после коммита.
+    """
+    updated = ContentVersion.objects.filter(pk=CONTENT_VERSION_ID).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        ContentVersion.objects.get_or_create(pk=CONTENT_VERSION_ID, defaults={'version': 1})
+    transaction.on_commit(invalidate_catalog)
+
+
+def invalidate_catalog() -> None:
+    """Заставляет следующий вызов get_catalog() сверить версию контента с БД."""
+    _state['checked_at'] = 0.0
+
+
+def get_catalog() -> 'ContentCatalog':
+    """
+    Возвращает каталог контента текущего процесса.
+
+    Версия в БД сверяется не чаще, чем раз в CONTENT_CATALOG_CHECK_INTERVAL секунд;
+    каталог перестраивается только если версия изменилась.
+    """
+    catalog = _state['catalog']
+    if catalog is not None and time.monotonic() - _state['checked_at'] < settings.CONTENT_CATALOG_CHECK_INTERVAL:
+        return catalog
+
+    with _lock:
+        version = get_content_version()
+        catalog = _state['catalog']
+        if catalog is None or catalog.version != version:
+            started = time.monotonic()
+            catalog = ContentCatalog(version)
+            _state['catalog'] = catalog
+            logger.info(f"Каталог контента версии {version} загружен за {time.monotonic() - started:.3f} с")
+        _state['checked_at'] = time.monotonic()
+    return catalog
+
+
+def get_cached_payload(catalog: 'ContentCatalog', name: str, content_id: int, build):
+    """
+    Возвращает готовый ответ API для объекта каталога из общего кэша (django cache).
+
+    Ответ строится функцией build() один раз на (name, content_id, версия контента)
+    и дальше отдается всеми процессами из кэша. После изменения контента версия меняется,
+    поэтому старые ответы просто перестают запрашиваться и вытесняются по таймауту.
+    """
+    key = f'{name}:{content_id}:v{catalog.version}'
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload)
+    return payload
+
+
+class ContentCatalog:
+    """
+    Снимок дерева курса (темы -> уроки -> видео/тесты/практики, конспекты, вопросы и ответы)
+    в памяти процесса. Все связанные объекты загружены заранее, поэтому сериализация
+    объектов каталога не делает запросов в БД.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+
+        questions = Question.objects.prefetch_related('answers')
+        topics = list(Topic.objects.all())
+        lessons = list(Lesson.objects.all())
+        videos = list(Video.objects.prefetch_related(
+            'summaries', Prefetch('questions', queryset=questions), *NEXT_CONTENT_FIELDS
+        ))
+        tests = list(Test.objects.order_by('test_id').prefetch_related(
+            Prefetch('questions', queryset=questions), *NEXT_CONTENT_FIELDS
+        ))
+        practices = list(Practice.objects.order_by('practice_id').prefetch_related(*NEXT_CONTENT_FIELDS))
+
+        self.topics = {topic.topic_id: topic for topic in topics}
+        self.lessons = {lesson.lesson_id: lesson for lesson in lessons}
+        self.videos = {video.video_id: video for video in videos}
+        self.tests = {test.test_id: test for test in tests}
+        self.practices = {practice.practice_id: practice for practice in practices}
+
+        # Поиск по названию: первый объект в порядке вывода, как при .first()
+        self.topic_by_title = {}
+        for topic in topics:
+            self.topic_by_title.setdefault(topic.title, topic)
+
+        self.lessons_by_topic = {topic_id: [] for topic_id in self.topics}
+        self.lesson_by_title = {}
+        self.lesson_by_topic_title = {}
+        for lesson in lessons:
+            self.lessons_by_topic.setdefault(lesson.topic_id, []).append(lesson)
+            self.lesson_by_title.setdefault(lesson.title, lesson)
+            self.lesson_by_topic_title.setdefault((lesson.topic_id, lesson.title), lesson)
+
+        self.videos_by_lesson = {lesson_id: [] for lesson_id in self.lessons}
+        self.video_by_lesson_title = {}
+        self.video_question = {}
+        for video in videos:
+            self.videos_by_lesson.setdefault(video.lesson_id, []).append(video)
+            self.video_by_lesson_title.setdefault((video.lesson_id, video.title), video)
+            video_questions = list(video.questions.all())
+            if video_questions:
+                self.video_question[video.video_id] = video_questions[0]
+
+        self.tests_by_lesson = {lesson_id: [] for lesson_id in self.lessons}
+        self.test_by_title = {}
+        self.answer_keys = {}
+        for test in tests:
+            self.tests_by_lesson.setdefault(test.lesson_id, []).append(test)
+            self.test_by_title.setdefault(test.title, test)
+            self.answer_keys[test.test_id] = TestAnswerKey(test)
+
+        self.practices_by_lesson = {lesson_id: [] for lesson_id in self.lessons}
+        self.practice_by_lesson_title = {}
+        for practice in practices:
+            self.practices_by_lesson.setdefault(practice.lesson_id, []).append(practice)
+            self.practice_by_lesson_title.setdefault((practice.lesson_id, practice.title), practice)
+
+        self.progression = ProgressionGraph(self)
+
+        # Стартовый контент тарифов: название тарифа -> ИД тарифа и ИД контента по видам
+        self.start_content = {}
+        start_availabilities = StartUserAvailability.objects.select_related('tariff').prefetch_related(
+            *START_CONTENT_FIELDS
+        )
+        for start_availability in start_availabilities:
+            self.start_content.setdefault(start_availability.tariff.title, {
+                'tariff_id': start_availability.tariff_id,
+                'content': {
+                    field_name: frozenset(obj.pk for obj in getattr(start_availability, field_name).all())
+                    for field_name in START_CONTENT_FIELDS
+                },
+            })
+
+    def get_topic_lessons(self, topic_title: str) -> list:
+        """Уроки всех тем с указанным названием."""
+        return [
+            lesson
+            for topic in self.topics.values() if topic.title == topic_title
+            for lesson in self.lessons_by_topic[topic.topic_id]
+        ]
@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.db import connection
+
+from .models import Entitlement, Payment, Tariff, TelegramUser
+
+# Статус платежа, который дает доступ
+COMPLETED_PAYMENT_STATUS = 'completed'
+# Об окончании доступа уведомляем, только если период закончился не раньше стольких дней назад.
+# Давно закончившиеся периоды (первый обход после выкладки, простой бота) отзываются без сообщения
+EXPIRED_NOTIFY_DAYS = 3
+
+
+def sync_entitlements(user_ids=None) -> int:
+    """
+    Пересобирает Entitlement пользователей из завершенных платежей двумя запросами.
+
+    Текущим считается платеж с самой поздней датой окончания доступа (при равенстве - более поздний).
+    Пользователи без завершенных платежей лишаются Entitlement. При смене платежа или периода
+    отметки о напоминании и отзыве доступа сбрасываются.
+    Без user_ids обрабатывает всех пользователей. Возвращает число записанных Entitlement.
+    """
+    table = Entitlement._meta.db_table
+    payments = Payment._meta.db_table
+    user_filter = ''
+    params = [COMPLETED_PAYMENT_STATUS]
+    if user_ids is not None:
+        user_filter = 'AND {}user_id = ANY(%s)'
+        params.append(list(user_ids))
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} entitlement WHERE NOT EXISTS ("
+            f"SELECT 1 FROM {payments} WHERE {payments}.user_id = entitlement.user_id AND status = %s) "
+            f"{user_filter.format('entitlement.')}",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, tariff_id, payment_id, period, updated_at) "
+            f"SELECT DISTINCT ON (user_id) user_id, tariff_id, payment_id, "
+            f"daterange(access_date_start, access_date_finish, '[]'), now() "
+            f"FROM {payments} WHERE status = %s {user_filter.format('')} "
+            f"ORDER BY user_id, access_date_finish DESC, payment_id DESC "
+            f"ON CONFLICT (user_id) DO UPDATE SET tariff_id = EXCLUDED.tariff_id, "
+            f"payment_id = EXCLUDED.payment_id, period = EXCLUDED.period, updated_at = EXCLUDED.updated_at, "
+            f"reminded_at = NULL, revoked_at = NULL "
+            f"WHERE ({table}.tariff_id, {table}.payment_id, {table}.period) "
+            f"IS DISTINCT FROM (EXCLUDED.tariff_id, EXCLUDED.payment_id, EXCLUDED.period)",
+            params,
+        )
+        return cursor.rowcount
+
+
+def active_at(day):
+    """Entitlement, действующие на дату day (поиск по GiST-индексу периода)."""
+    return Entitlement.objects.filter(period__contains=day)
+
+
+def expiring_between(first_day, last_day):
+    """Entitlement, у которых последний день доступа попадает в [first_day, last_day]."""
+    # Верхняя граница периода не входит в него: это день после окончания доступа
+    return Entitlement.objects.filter(
+        period__endswith__gt=first_day,
+        period__endswith__lte=last_day + timedelta(days=1),
+    )
+
+
+def _sweep_batch(condition: str, condition_params: list, mark_column: str, after, limit: int,
+                 demote: bool = False) -> tuple:
+    """
+    Отмечает пачку неотозванных Entitlement (mark_column = now()) и возвращает их одним запросом.
+
+    Пачка выбирается по индексу entitlement_sweep_idx в порядке (окончание периода, пользователь),
+    начиная после курсора after = [окончание периода, user_id]. Строки, которые параллельно
+    обрабатывает другой обход, пропускаются (SKIP LOCKED). С demote роль 'client' отобранных
+    пользователей меняется на 'user'.
+
+    Returns:
+        (items, next_after) - список словарей и курсор следующей пачки (None, если пачка последняя).
+    """
+    table = Entitlement._meta.db_table
+    users = TelegramUser._meta.db_table
+    tariffs = Tariff._meta.db_table
+    keyset = ''
+    params = list(condition_params)
+    if after:
+        keyset = 'AND (upper(period), user_id) > (%s::date, %s)'
+        params.extend(after)
+    params.append(limit)
+    demote_sql = ''
+    if demote:
+        demote_sql = (f", demoted AS (UPDATE {users} SET role = 'user' FROM marked "
+                      f"WHERE {users}.user_id = marked.user_id AND {users}.role = 'client' RETURNING 1)")
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH batch AS ("
+            f"SELECT user_id, upper(period) AS period_end FROM {table} "
+            f"WHERE revoked_at IS NULL AND {condition} {keyset} "
+            f"ORDER BY upper(period), user_id LIMIT %s FOR UPDATE SKIP LOCKED), "
+            f"marked AS (UPDATE {table} SET {mark_column} = now() FROM batch "
+            f"WHERE {table}.user_id = batch.user_id RETURNING {table}.user_id, {table}.tariff_id, batch.period_end)"
+            f"{demote_sql} "
+            f"SELECT marked.user_id, users.tg_id, marked.period_end, tariffs.title FROM marked "
+            f"JOIN {users} users ON users.user_id = marked.user_id "
+            f"LEFT JOIN {tariffs} tariffs ON tariffs.tariff_id = marked.tariff_id "
+            f"ORDER BY marked.period_end, marked.user_id",
+            params,
+        )
+        rows = cursor.fetchall()
+
+    items = [
+        {'user_id': user_id, 'tg_id': tg_id, 'access_date_finish': period_end - timedelta(days=1), 'tariff': title}
+        for user_id, tg_id, period_end, title in rows
+    ]
+    next_after = [str(rows[-1][2]), rows[-1][0]] if rows and len(rows) == limit else None
+    return items, next_after
+
+
+def sweep_expired(today, after=None, limit: int = 1000, notify_days: int = EXPIRED_NOTIFY_DAYS) -> tuple:
+    """
+    Отзывает доступ у пачки пользователей, чей период закончился до today: Entitlement отмечается
+    revoked_at, роль 'client' меняется на 'user'. UserAvailability не удаляется (доступ заморожен),
+    при продлении оплата снова делает пользователя клиентом и открытый контент возвращается.
+
+    У каждого элемента признак notify: период закончился за последние notify_days дней
+    (upper(period) > today - notify_days). Об отзыве более старых периодов не уведомляют.
+    """
+    items, next_after = _sweep_batch('upper(period) <= %s', [today], 'revoked_at', after, limit, demote=True)
+    notify_from = today - timedelta(days=notify_days)
+    for item in items:
+        item['notify'] = item['access_date_finish'] >= notify_from
+    return items, next_after
+
+
+def sweep_expiring(today, days: int, after=None, limit: int = 1000) -> tuple:
+    """
+    Отмечает reminded_at у пачки пользователей, чей последний день доступа - в ближайшие days дней
+    (включая today), и возвращает их для отправки напоминаний. Каждому периоду - одно напоминание.
+    """
+    return _sweep_batch(
+        'reminded_at IS NULL AND upper(period) > %s AND upper(period) <= %s',
+        [today, today + timedelta(days=days + 1)],
+        'reminded_at', after, limit,
+    )
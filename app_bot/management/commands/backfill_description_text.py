@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_bot.catalog import bump_content_version
+from app_bot.models import (Answer, Lesson, Practice, Question, Test, Topic,
+                            VideoSummary)
+from app_bot.text_utils import clean_html
+
+DESCRIPTION_MODELS = (Topic, Lesson, VideoSummary, Test, Question, Answer, Practice)
+
+
+# Заполняет description_text (описание без HTML) для объектов, сохраненных до появления поля
+class Command(BaseCommand):
+    help = 'Backfill description_text from HTML descriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Objects per bulk_update')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            for model in DESCRIPTION_MODELS:
+                changed = []
+                for obj in model.objects.only('pk', 'description', 'description_text').iterator(chunk_size=batch_size):
+                    description_text = clean_html(obj.description)
+                    if obj.description_text != description_text:
+                        obj.description_text = description_text
+                        changed.append(obj)
+                model.objects.bulk_update(changed, ['description_text'], batch_size=batch_size)
+                self.stdout.write(f'{model.__name__}: updated {len(changed)}')
+            # bulk_update не вызывает сигналы - каталоги процессов перечитываем явно
+            bump_content_version()
+        self.stdout.write(self.style.SUCCESS('description_text backfilled'))
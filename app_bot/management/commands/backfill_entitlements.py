@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_bot.entitlements import sync_entitlements
+from app_bot.models import TelegramUser
+
+
+# Заполнение Entitlement из уже сохраненных платежей.
+# Команду можно запускать повторно: Entitlement пересобираются из платежей целиком.
+class Command(BaseCommand):
+    help = 'Backfill Entitlement rows from completed payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Users per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_user_id = 0
+        total = 0
+        while True:
+            user_ids = list(
+                TelegramUser.objects.filter(user_id__gt=last_user_id)
+                .order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                total += sync_entitlements(user_ids)
+            last_user_id = user_ids[-1]
+            self.stdout.write(f'Processed users up to user_id={last_user_id}')
+        self.stdout.write(self.style.SUCCESS(f'Entitlements written for {total} users'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app_bot.models import TelegramUser
+from app_bot.user_progress import sync_progress
+
+
+# Перенос прогресса пользователей из ManyToMany таблиц UserAvailability/UserDone в UserProgress.
+# Команду можно запускать повторно: строки UserProgress пересобираются целиком.
+class Command(BaseCommand):
+    help = 'Backfill UserProgress arrays from UserAvailability and UserDone'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_user_id = 0
+        total = 0
+        while True:
+            user_ids = list(
+                TelegramUser.objects.filter(user_id__gt=last_user_id)
+                .order_by('user_id').values_list('user_id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                total += sync_progress(user_ids)
+            last_user_id = user_ids[-1]
+            self.stdout.write(f'Processed users up to user_id={last_user_id}')
+        self.stdout.write(self.style.SUCCESS(f'UserProgress backfilled for {total} users'))
@@ -0,0 +1,85 @@
+import statistics
+import time
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from app_bot.catalog import get_catalog
+from app_bot.models import TelegramUser
+from app_bot.payments import activate_payment
+
+
+class Rollback(Exception):
+    """Откатывает все изменения, сделанные замером."""
+
+
+# Замер активации оплаты: прежний путь (payment/add/ + start_content/add/, два запроса и две транзакции),
+# эндпоинт payment/activate/ и прямой вызов activate_payment. Запросы выполняются в процессе
+# через тестовый клиент, без сети и nginx; все данные откатываются.
+class Command(BaseCommand):
+    help = 'Benchmark payment activation: payment/add + start_content/add vs payment/activate vs the service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=200, help='Activations per variant')
+        parser.add_argument('--tariff', help='Tariff title (default: the first one with start content)')
+
+    def handle(self, *args, **options):
+        start_content = get_catalog().start_content
+        tariff = options['tariff'] or next(iter(start_content), None)
+        if tariff not in start_content:
+            raise CommandError('No tariff with start content, load the fixture first')
+
+        client = Client()
+        variants = {
+            'payment/add + start_content/add': lambda payload: (
+                client.post('/bot/payment/add/', payload, content_type='application/json'),
+                client.post('/bot/start_content/add/', {'user': payload['user'], 'tariff': tariff},
+                            content_type='application/json'),
+            ),
+            'payment/activate': lambda payload: client.post('/bot/payment/activate/', payload,
+                                                            content_type='application/json'),
+            'activate_payment()': lambda payload: activate_payment(
+                user_id=payload['user'], tariff_title=tariff, amount=payload['amount'],
+                access_date_start=date.fromisoformat(payload['access_date_start']),
+                access_date_finish=date.fromisoformat(payload['access_date_finish']),
+                external_payment_id=payload['external_payment_id'],
+            ),
+        }
+
+        self.stdout.write(f"{'variant':<34} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for name, activate in variants.items():
+            try:
+                with transaction.atomic():
+                    queries, latencies = self.measure(activate, tariff, options['payments'])
+                    raise Rollback
+            except Rollback:
+                pass
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f"{name:<34} {queries:>8} {statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+    def measure(self, activate, tariff, payments):
+        users = TelegramUser.objects.bulk_create([
+            TelegramUser(tg_id=-number - 1, tg_name=f'bench_activation_{number}') for number in range(payments)
+        ])
+        latencies = []
+        with CaptureQueriesContext(connection) as context:
+            for user in users:
+                payload = {
+                    'amount': 1000,
+                    'user': user.user_id,
+                    'access_date_start': '2024-01-01',
+                    'access_date_finish': '2024-01-31',
+                    'tariff': tariff,
+                    'status': 'completed',
+                    'service_description': f'Оплата тарифа {tariff}',
+                    'external_payment_id': f'bench-{uuid.uuid4()}',
+                }
+                started = time.perf_counter()
+                activate(payload)
+                latencies.append((time.perf_counter() - started) * 1000)
+        return len(context.captured_queries) // payments, latencies
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_bot.catalog import get_catalog
+from app_bot.serializers import (LessonSerializer, PracticeSerializer,
+                                 TestSerializer, VideoSerializer)
+
+
+# Сравнение скорости сериализации контента: описания, очищаемые BeautifulSoup на каждый запрос,
+# против сохраненного description_text. Объекты берутся из каталога, поэтому запросов в БД нет.
+class Command(BaseCommand):
+    help = 'Benchmark serializers with on-the-fly HTML cleaning vs stored description_text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Serializations of the whole course per run')
+
+    def handle(self, *args, **options):
+        catalog = get_catalog()
+        payloads = [
+            (TestSerializer, list(catalog.tests.values())),
+            (LessonSerializer, list(catalog.lessons.values())),
+            (VideoSerializer, list(catalog.videos.values())),
+            (PracticeSerializer, list(catalog.practices.values())),
+        ]
+        objects = [
+            obj
+            for test in catalog.tests.values()
+            for question in test.questions.all()
+            for obj in (question, *question.answers.all())
+        ]
+        objects += list(catalog.tests.values()) + list(catalog.lessons.values()) + list(catalog.practices.values())
+        objects += [summary for video in catalog.videos.values() for summary in video.summaries.all()]
+        if not any(obj.description_text for obj in objects):
+            raise CommandError('description_text is empty, run backfill_description_text first')
+
+        stored = {id(obj): obj.description_text for obj in objects}
+        repeat = options['repeat']
+
+        # Пустой description_text - сериализатор очищает HTML на лету, как раньше
+        for obj in objects:
+            obj.description_text = ''
+        try:
+            before = self.run(payloads, repeat)
+        finally:
+            for obj in objects:
+                obj.description_text = stored[id(obj)]
+        after = self.run(payloads, repeat)
+
+        self.stdout.write(f'descriptions per run: {len(objects)}')
+        self.stdout.write(f'clean_html per request: {repeat / before:.1f} runs/s')
+        self.stdout.write(f'stored description_text: {repeat / after:.1f} runs/s ({before / after:.1f}x)')
+
+    @staticmethod
+    def run(payloads, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for serializer_class, instances in payloads:
+                serializer_class(instances, many=True).data
+        return time.perf_counter() - started
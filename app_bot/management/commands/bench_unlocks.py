@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from app_bot.catalog import get_catalog
+from app_bot.models import (Lesson, TelegramUser, UserAvailability, UserDone,
+                            Video)
+from app_bot.views import add_done_content, add_new_content
+
+
+class Rollback(Exception):
+    """Откатывает все изменения, сделанные замером."""
+
+
+# Замер стоимости открытия контента в зависимости от объема уже открытого пользователю.
+# Все данные (пользователь, синтетические видео) создаются в транзакции и откатываются.
+class Command(BaseCommand):
+    help = 'Benchmark add_new_content/add_done_content against the amount of already unlocked content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[0, 100, 1000, 5000],
+                            help='How many videos the user has already unlocked and done')
+        parser.add_argument('--repeat', type=int, default=20, help='Calls per size')
+
+    def handle(self, *args, **options):
+        lesson = Lesson.objects.first()
+        if lesson is None:
+            raise CommandError('No lessons in the database, load the fixture first')
+        catalog = get_catalog()
+        unlocks = next((unlocks for unlocks in catalog.progression.unlocks.values() if any(unlocks)), None)
+        if unlocks is None:
+            raise CommandError('No next_* links in the content, nothing to unlock')
+
+        self.stdout.write(f"{'unlocked':>9} {'queries':>8} {'ms/call':>8}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    queries, elapsed = self.measure(lesson, unlocks, size, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+            self.stdout.write(f"{size:>9} {queries:>8} {elapsed * 1000:>8.2f}")
+
+    def measure(self, lesson, unlocks, size, repeat):
+        user = TelegramUser.objects.create(tg_id=-1, tg_name='bench_unlocks')
+        user_availability = UserAvailability.objects.create(user=user)
+        user_done = UserDone.objects.create(user=user)
+
+        videos = Video.objects.bulk_create([
+            Video(lesson=lesson, title=f'bench video {number}', serial_number=number,
+                  video_link='https://example.com')
+            for number in range(size)
+        ])
+        user_availability.videos.add(*videos)
+        user_done.videos.add(*videos)
+
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                add_new_content(user_availability, *(set(content) for content in unlocks))
+                add_done_content(user_done, topics=set(unlocks.topics), lessons=set(unlocks.lessons),
+                                 videos=set(unlocks.videos))
+            elapsed = (time.perf_counter() - started) / repeat
+        return len(context.captured_queries) // repeat, elapsed
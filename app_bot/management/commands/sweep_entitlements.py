@@ -0,0 +1,32 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app_bot.entitlements import sweep_expired
+
+
+# Отзыв доступа с окончившимся периодом без бота (например, из cron).
+# Обычно обход выполняет задача бота, которая заодно рассылает напоминания и уведомления
+# (telegram_code/entitlement_sweeper.py); повторный обход отозванных не затрагивает.
+class Command(BaseCommand):
+    help = 'Revoke expired entitlements in keyset-paginated batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Entitlements per statement')
+        parser.add_argument('--date', type=date.fromisoformat, help='Treat this date as today (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        today = options['date'] or timezone.localdate()
+        started = time.monotonic()
+        after = None
+        total = 0
+        while True:
+            items, after = sweep_expired(today, after, options['batch_size'])
+            total += len(items)
+            if after is None:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Revoked {total} expired entitlements in {time.monotonic() - started:.1f} s'
+        ))
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0014_userdone_last_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='версия контента')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='дата изменения')),
+            ],
+            options={
+                'verbose_name': 'версия контента',
+                'verbose_name_plural': 'версии контента',
+                'db_table': 'contentversion',
+            },
+        ),
+    ]
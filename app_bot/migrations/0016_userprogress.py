@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-17 03:08
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0015_contentversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProgress',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='progress', serialize=False, to='app_bot.telegramuser')),
+                ('available_topics', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='доступные темы (ИД)')),
+                ('available_lessons', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='доступные уроки (ИД)')),
+                ('available_videos', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='доступные видео (ИД)')),
+                ('available_tests', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='доступные тесты (ИД)')),
+                ('available_practices', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='доступные практические задания (ИД)')),
+                ('done_topics', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='пройденные темы (ИД)')),
+                ('done_lessons', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='пройденные уроки (ИД)')),
+                ('done_videos', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='пройденные видео (ИД)')),
+                ('done_tests', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='пройденные тесты (ИД)')),
+                ('done_practices', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='пройденные практические задания (ИД)')),
+                ('last_updated', models.DateTimeField(auto_now=True, verbose_name='Последнее обновление')),
+            ],
+            options={
+                'verbose_name': 'Прогресс пользователя',
+                'verbose_name_plural': '4.3 Прогресс пользователя',
+                'db_table': 'user_progress',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['available_topics'], name='progress_avail_topics_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['available_lessons'], name='progress_avail_lessons_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['available_videos'], name='progress_avail_videos_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['available_tests'], name='progress_avail_tests_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['available_practices'], name='progress_avail_practices_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['done_topics'], name='progress_done_topics_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['done_lessons'], name='progress_done_lessons_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['done_videos'], name='progress_done_videos_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['done_tests'], name='progress_done_tests_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['done_practices'], name='progress_done_practices_gin'),
+        ),
+    ]
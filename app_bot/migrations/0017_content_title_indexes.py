@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0016_userprogress'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['topic', 'title'], name='lesson_topic_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['title'], name='lesson_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practice',
+            index=models.Index(fields=['lesson', 'title'], name='practice_lesson_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['lesson', 'title'], name='test_lesson_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['title'], name='test_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['title'], name='topic_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['lesson', 'title'], name='video_lesson_title_idx'),
+        ),
+    ]
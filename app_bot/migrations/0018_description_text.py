@@ -0,0 +1,48 @@
+# Generated by Django 4.2 on 2026-10-17 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0017_content_title_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='practice',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+        migrations.AddField(
+            model_name='videosummary',
+            name='description_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='описание без HTML'),
+        ),
+    ]
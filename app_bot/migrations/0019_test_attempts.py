@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-17 03:16
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0018_description_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestAttempt',
+            fields=[
+                ('attempt_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='дата начала')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='дата завершения')),
+                ('questions_total', models.PositiveIntegerField(verbose_name='количество вопросов')),
+                ('correct_answers', models.PositiveIntegerField(default=0, verbose_name='правильных ответов')),
+                ('percentage', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='процент правильных ответов')),
+                ('passed', models.BooleanField(blank=True, null=True, verbose_name='тест пройден')),
+                ('test', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='app_bot.test', verbose_name='тест')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_attempts', to='app_bot.telegramuser', verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'попытка прохождения теста',
+                'verbose_name_plural': 'попытки прохождения тестов',
+                'db_table': 'test_attempt',
+            },
+        ),
+        migrations.CreateModel(
+            name='TestAttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('selected', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None, verbose_name='выбранные ответы (порядковые номера)')),
+                ('is_correct', models.BooleanField(verbose_name='ответ правильный')),
+                ('answered_at', models.DateTimeField(auto_now_add=True, verbose_name='дата ответа')),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='app_bot.testattempt', verbose_name='попытка')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_answers', to='app_bot.question', verbose_name='вопрос')),
+            ],
+            options={
+                'verbose_name': 'ответ в попытке',
+                'verbose_name_plural': 'ответы в попытках',
+                'db_table': 'test_attempt_answer',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='testattemptanswer',
+            constraint=models.UniqueConstraint(fields=('attempt', 'question'), name='attempt_question_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['user', 'test', '-started_at'], name='attempt_user_test_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['user', '-started_at'], name='attempt_user_started_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0019_test_attempts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramFileCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('media_path', models.CharField(max_length=500, verbose_name='путь к файлу в media')),
+                ('kind', models.CharField(choices=[('photo', 'фото'), ('document', 'документ')], max_length=20, verbose_name='тип сообщения')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='размер и время изменения файла')),
+                ('file_id', models.CharField(max_length=255, verbose_name='file_id в Telegram')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'файл в Telegram',
+                'verbose_name_plural': 'файлы в Telegram',
+                'db_table': 'telegram_file_cache',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='telegramfilecache',
+            constraint=models.UniqueConstraint(fields=('media_path', 'kind'), name='telegram_file_path_kind_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 03:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0020_telegram_file_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='external_payment_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='ИД платежа в ЮKassa'),
+        ),
+    ]
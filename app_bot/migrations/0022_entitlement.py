@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-17 03:39
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0021_payment_external_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Entitlement',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='entitlement', serialize=False, to='app_bot.telegramuser')),
+                ('period', django.contrib.postgres.fields.ranges.DateRangeField(verbose_name='период доступа')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='дата обновления')),
+                ('payment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entitlements', to='app_bot.payment', verbose_name='платеж')),
+                ('tariff', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entitlements', to='app_bot.tariff', verbose_name='тариф')),
+            ],
+            options={
+                'verbose_name': 'оплаченный доступ',
+                'verbose_name_plural': '3.1 Оплаченный доступ',
+                'db_table': 'entitlement',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='entitlement',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['period'], name='entitlement_period_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='entitlement',
+            index=models.Index(django.contrib.postgres.fields.ranges.RangeEndsWith('period'), name='entitlement_period_end_idx'),
+        ),
+    ]
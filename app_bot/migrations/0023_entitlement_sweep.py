@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 03:42
+
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0022_entitlement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entitlement',
+            name='reminded_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='напоминание об окончании отправлено'),
+        ),
+        migrations.AddField(
+            model_name='entitlement',
+            name='revoked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='доступ отозван'),
+        ),
+        migrations.AddIndex(
+            model_name='entitlement',
+            index=models.Index(django.contrib.postgres.fields.ranges.RangeEndsWith('period'), models.F('user_id'), condition=models.Q(('revoked_at__isnull', True)), name='entitlement_sweep_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Перенос прогресса из ManyToMany таблиц UserAvailability/UserDone в UserProgress (как sync_progress).
+# SQL зафиксирован по схеме на момент этой миграции, чтобы не зависеть от текущих моделей
+BACKFILL_USER_PROGRESS_SQL = """
+    INSERT INTO user_progress (
+        user_id, available_topics, available_lessons, available_videos, available_tests, available_practices,
+        done_topics, done_lessons, done_videos, done_tests, done_practices, last_updated
+    )
+    SELECT users.user_id,
+        ARRAY(SELECT topic_id FROM useravailability_topics WHERE useravailability_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT lesson_id FROM useravailability_lessons WHERE useravailability_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT video_id FROM useravailability_videos WHERE useravailability_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT test_id FROM useravailability_tests WHERE useravailability_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT practice_id FROM useravailability_practices WHERE useravailability_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT topic_id FROM users_done_topics WHERE userdone_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT lesson_id FROM users_done_lessons WHERE userdone_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT video_id FROM users_done_videos WHERE userdone_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT test_id FROM users_done_tests WHERE userdone_id = users.user_id ORDER BY 1),
+        ARRAY(SELECT practice_id FROM users_done_practices WHERE userdone_id = users.user_id ORDER BY 1),
+        now()
+    FROM telegramuser users
+    ON CONFLICT (user_id) DO UPDATE SET
+        available_topics = EXCLUDED.available_topics,
+        available_lessons = EXCLUDED.available_lessons,
+        available_videos = EXCLUDED.available_videos,
+        available_tests = EXCLUDED.available_tests,
+        available_practices = EXCLUDED.available_practices,
+        done_topics = EXCLUDED.done_topics,
+        done_lessons = EXCLUDED.done_lessons,
+        done_videos = EXCLUDED.done_videos,
+        done_tests = EXCLUDED.done_tests,
+        done_practices = EXCLUDED.done_practices,
+        last_updated = EXCLUDED.last_updated
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0023_entitlement_sweep'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_USER_PROGRESS_SQL, migrations.RunSQL.noop, elidable=True),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# Пересборка Entitlement по всем пользователям из завершенных платежей (как sync_entitlements).
+# SQL зафиксирован по схеме на момент этой миграции, чтобы не зависеть от текущих моделей;
+# повторный запуск безопасен
+BACKFILL_ENTITLEMENTS_SQL = [
+    """
+    DELETE FROM entitlement WHERE NOT EXISTS (
+        SELECT 1 FROM payment WHERE payment.user_id = entitlement.user_id AND status = 'completed'
+    )
+    """,
+    """
+    INSERT INTO entitlement (user_id, tariff_id, payment_id, period, updated_at)
+    SELECT DISTINCT ON (user_id) user_id, tariff_id, payment_id,
+        daterange(access_date_start, access_date_finish, '[]'), now()
+    FROM payment WHERE status = 'completed'
+    ORDER BY user_id, access_date_finish DESC, payment_id DESC
+    ON CONFLICT (user_id) DO UPDATE SET
+        tariff_id = EXCLUDED.tariff_id,
+        payment_id = EXCLUDED.payment_id,
+        period = EXCLUDED.period,
+        updated_at = EXCLUDED.updated_at,
+        reminded_at = NULL,
+        revoked_at = NULL
+    WHERE (entitlement.tariff_id, entitlement.payment_id, entitlement.period)
+        IS DISTINCT FROM (EXCLUDED.tariff_id, EXCLUDED.payment_id, EXCLUDED.period)
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_bot', '0024_backfill_user_progress'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_ENTITLEMENTS_SQL, migrations.RunSQL.noop, elidable=True),
+    ]
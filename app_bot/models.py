@@ -1,6 +1,11 @@
-from django.contrib.postgres.fields import ArrayField
+from datetime import timedelta
+
+from django.contrib.postgres.fields import ArrayField, DateRangeField
+from django.contrib.postgres.fields.ranges import RangeEndsWith
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q
 from phonenumber_field.modelfields import PhoneNumberField
 from tinymce.models import HTMLField
 
@@ -100,6 +105,13 @@ class Payment(models.Model):
         blank=True,
         null=True,
         verbose_name='назначение платежа')
+    external_payment_id = models.CharField(
+        max_length=64,
+        unique=True,
+        blank=True,
+        null=True,
+        verbose_name='ИД платежа в ЮKassa'
+    )
 
     class Meta:
         db_table = 'payment'
@@ -110,6 +122,62 @@ class Payment(models.Model):
         return f"Payment {self.payment_id} for {self.user.tg_name}"
 
 
+# Текущий оплаченный доступ пользователя: завершенный платеж с самой поздней датой окончания доступа.
+# Пересобирается из платежей при каждом их изменении (entitlements.sync_entitlements)
+class Entitlement(models.Model):
+    user = models.OneToOneField(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='entitlement'
+    )
+    tariff = models.ForeignKey(
+        Tariff,
+        on_delete=models.SET_NULL,
+        related_name='entitlements',
+        null=True,
+        verbose_name='тариф'
+    )
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        related_name='entitlements',
+        null=True,
+        verbose_name='платеж'
+    )
+    # Хранится как [начало, окончание + 1 день): так PostgreSQL приводит диапазоны дат
+    period = DateRangeField(verbose_name='период доступа')
+    # Сбрасываются при продлении: напоминание и отзыв доступа относятся к текущему периоду
+    reminded_at = models.DateTimeField(null=True, blank=True, verbose_name='напоминание об окончании отправлено')
+    revoked_at = models.DateTimeField(null=True, blank=True, verbose_name='доступ отозван')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='дата обновления')
+
+    class Meta:
+        db_table = 'entitlement'
+        verbose_name = 'оплаченный доступ'
+        verbose_name_plural = '3.1 Оплаченный доступ'
+        indexes = [
+            # Действующие на дату: period @> дата
+            GistIndex(fields=['period'], name='entitlement_period_gist'),
+            # Истекающие в интервале дат: upper(period) BETWEEN ...
+            models.Index(RangeEndsWith('period'), name='entitlement_period_end_idx'),
+            # Обход неотозванных по (окончание, пользователь) пачками (entitlements.sweep_expired и др.)
+            models.Index(RangeEndsWith('period'), F('user_id'), condition=Q(revoked_at__isnull=True),
+                         name='entitlement_sweep_idx'),
+        ]
+
+    @property
+    def access_date_start(self):
+        return self.period.lower
+
+    @property
+    def access_date_finish(self):
+        return self.period.upper - timedelta(days=1)
+
+    def __str__(self):
+        return f"Entitlement of user {self.user_id}: {self.access_date_start} - {self.access_date_finish}"
+
+
 # Контактная информация пользователя
 class UserContact(models.Model):
     user = models.OneToOneField(
@@ -160,6 +228,12 @@ class Topic(models.Model):
         default='',
         verbose_name='описание'
     )
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     serial_number = models.IntegerField(verbose_name='последовательность вывода')
     picture = models.ImageField(
         upload_to='topics/',  # Папка в media, куда будут сохраняться файлы
@@ -173,6 +247,9 @@ class Topic(models.Model):
         verbose_name = 'тема'
         verbose_name_plural = '5. Темы'
         ordering = ['serial_number']
+        indexes = [
+            models.Index(fields=['title'], name='topic_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -193,6 +270,12 @@ class Lesson(models.Model):
         default='',
         verbose_name='описание'
     )
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     serial_number = models.IntegerField(verbose_name='последовательность вывода')
     picture = models.ImageField(
         upload_to='lesons/',  # Папка в media, куда будут сохраняться файлы
@@ -206,6 +289,10 @@ class Lesson(models.Model):
         verbose_name = 'урок'
         verbose_name_plural = '6. Уроки'
         ordering = ['serial_number']
+        indexes = [
+            models.Index(fields=['topic', 'title'], name='lesson_topic_title_idx'),
+            models.Index(fields=['title'], name='lesson_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -261,6 +348,9 @@ class Video(models.Model):
         verbose_name = 'видео'
         verbose_name_plural = '7. Видео'
         ordering = ['serial_number']
+        indexes = [
+            models.Index(fields=['lesson', 'title'], name='video_lesson_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -286,6 +376,12 @@ class VideoSummary(models.Model):
         default='',
         verbose_name='описание'
     )
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     picture = models.ImageField(
         upload_to='video_summary/',  # Папка в media, куда будут сохраняться файлы
         blank=True,
@@ -322,6 +418,12 @@ class Test(models.Model):
         default='',
         verbose_name='описание'
     )
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     show_right_answer = models.BooleanField(default=False)
     next_topics = models.ManyToManyField(
         'Topic',
@@ -359,6 +461,10 @@ class Test(models.Model):
         db_table = 'test'
         verbose_name = 'тест'
         verbose_name_plural = '9. Тесты'
+        indexes = [
+            models.Index(fields=['lesson', 'title'], name='test_lesson_title_idx'),
+            models.Index(fields=['title'], name='test_title_idx'),
+        ]
 
     def __str__(self):
         return self.title or "Без названия"
@@ -386,6 +492,12 @@ class Question(models.Model):
         verbose_name='вопрос для видео'
     )
     description = HTMLField(verbose_name='описание вопроса')
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     serial_number = models.IntegerField(verbose_name='последовательность вывода')
     picture = models.ImageField(
         upload_to='questions/',
@@ -429,6 +541,12 @@ class Answer(models.Model):
         db_index=True
     )
     description = HTMLField(verbose_name='описание ответа')
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     serial_number = models.IntegerField(blank=True, verbose_name='последовательность вывода')
     right = models.BooleanField(verbose_name='метка правильности ответа')
 
@@ -474,6 +592,12 @@ class Practice(models.Model):
         default='',
         verbose_name='описание'
     )
+    description_text = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='описание без HTML'
+    )
     exercise = models.FileField(
         upload_to='exercises/',
         verbose_name='файл с заданием',
@@ -516,6 +640,9 @@ class Practice(models.Model):
         db_table = 'practice'
         verbose_name = 'практическое задание'
         verbose_name_plural = 'практические задания'
+        indexes = [
+            models.Index(fields=['lesson', 'title'], name='practice_lesson_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -667,3 +794,222 @@ class UserDone(models.Model):
 
     def __str__(self):
         return f"Done for {self.user.tg_name}"
+
+
+# Компактный прогресс пользователя: ИД доступного и пройденного контента в массивах одной строки.
+# Заполняется параллельно с UserAvailability/UserDone (двойная запись), перенос - команда backfill_user_progress
+class UserProgress(models.Model):
+    user = models.OneToOneField(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='progress'
+    )
+    available_topics = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='доступные темы (ИД)'
+    )
+    available_lessons = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='доступные уроки (ИД)'
+    )
+    available_videos = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='доступные видео (ИД)'
+    )
+    available_tests = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='доступные тесты (ИД)'
+    )
+    available_practices = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='доступные практические задания (ИД)'
+    )
+    done_topics = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='пройденные темы (ИД)'
+    )
+    done_lessons = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='пройденные уроки (ИД)'
+    )
+    done_videos = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='пройденные видео (ИД)'
+    )
+    done_tests = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='пройденные тесты (ИД)'
+    )
+    done_practices = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='пройденные практические задания (ИД)'
+    )
+    last_updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Последнее обновление'
+    )
+
+    class Meta:
+        db_table = 'user_progress'
+        verbose_name = 'Прогресс пользователя'
+        verbose_name_plural = '4.3 Прогресс пользователя'
+        indexes = [
+            GinIndex(fields=['available_topics'], name='progress_avail_topics_gin'),
+            GinIndex(fields=['available_lessons'], name='progress_avail_lessons_gin'),
+            GinIndex(fields=['available_videos'], name='progress_avail_videos_gin'),
+            GinIndex(fields=['available_tests'], name='progress_avail_tests_gin'),
+            GinIndex(fields=['available_practices'], name='progress_avail_practices_gin'),
+            GinIndex(fields=['done_topics'], name='progress_done_topics_gin'),
+            GinIndex(fields=['done_lessons'], name='progress_done_lessons_gin'),
+            GinIndex(fields=['done_videos'], name='progress_done_videos_gin'),
+            GinIndex(fields=['done_tests'], name='progress_done_tests_gin'),
+            GinIndex(fields=['done_practices'], name='progress_done_practices_gin'),
+        ]
+
+    def __str__(self):
+        return f"Progress for {self.user_id}"
+
+    def is_available(self, kind: str, content_id: int) -> bool:
+        """Доступен ли контент вида kind ('topics', 'lessons', ...) пользователю."""
+        return content_id in getattr(self, f'available_{kind}')
+
+    def is_done(self, kind: str, content_id: int) -> bool:
+        """Пройден ли контент вида kind пользователем."""
+        return content_id in getattr(self, f'done_{kind}')
+
+    def get_counts(self) -> dict:
+        """Количество доступного и пройденного контента по видам."""
+        kinds = ('topics', 'lessons', 'videos', 'tests', 'practices')
+        return {
+            'available': {kind: len(getattr(self, f'available_{kind}')) for kind in kinds},
+            'done': {kind: len(getattr(self, f'done_{kind}')) for kind in kinds},
+        }
+
+
+# Версия учебного контента, общая для всех процессов бэкенда
+class ContentVersion(models.Model):
+    version = models.PositiveBigIntegerField(default=0, verbose_name='версия контента')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='дата изменения')
+
+    class Meta:
+        db_table = 'contentversion'
+        verbose_name = 'версия контента'
+        verbose_name_plural = 'версии контента'
+
+    def __str__(self):
+        return f"Content version {self.version}"
+
+
+# Попытки прохождения тестов
+class TestAttempt(models.Model):
+    attempt_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        TelegramUser,
+        on_delete=models.CASCADE,
+        related_name='test_attempts',
+        verbose_name='пользователь'
+    )
+    test = models.ForeignKey(
+        Test,
+        on_delete=models.CASCADE,
+        related_name='attempts',
+        verbose_name='тест'
+    )
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name='дата начала')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='дата завершения')
+    questions_total = models.PositiveIntegerField(verbose_name='количество вопросов')
+    correct_answers = models.PositiveIntegerField(default=0, verbose_name='правильных ответов')
+    percentage = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='процент правильных ответов')
+    passed = models.BooleanField(blank=True, null=True, verbose_name='тест пройден')
+
+    class Meta:
+        db_table = 'test_attempt'
+        verbose_name = 'попытка прохождения теста'
+        verbose_name_plural = 'попытки прохождения тестов'
+        indexes = [
+            models.Index(fields=['user', 'test', '-started_at'], name='attempt_user_test_idx'),
+            models.Index(fields=['user', '-started_at'], name='attempt_user_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"Attempt {self.attempt_id} of Test {self.test_id} by {self.user_id}"
+
+
+# Ответы в попытке прохождения теста (только добавляются, один ответ на вопрос)
+class TestAttemptAnswer(models.Model):
+    attempt = models.ForeignKey(
+        TestAttempt,
+        on_delete=models.CASCADE,
+        related_name='answers',
+        verbose_name='попытка'
+    )
+    question = models.ForeignKey(
+        Question,
+        on_delete=models.CASCADE,
+        related_name='attempt_answers',
+        verbose_name='вопрос'
+    )
+    selected = ArrayField(
+        models.IntegerField(),
+        default=list,
+        blank=True,
+        verbose_name='выбранные ответы (порядковые номера)'
+    )
+    is_correct = models.BooleanField(verbose_name='ответ правильный')
+    answered_at = models.DateTimeField(auto_now_add=True, verbose_name='дата ответа')
+
+    class Meta:
+        db_table = 'test_attempt_answer'
+        verbose_name = 'ответ в попытке'
+        verbose_name_plural = 'ответы в попытках'
+        constraints = [
+            models.UniqueConstraint(fields=['attempt', 'question'], name='attempt_question_unique'),
+        ]
+
+    def __str__(self):
+        return f"Answer to Question {self.question_id} in Attempt {self.attempt_id}"
+
+
+# Файлы из media, уже загруженные в Telegram (повторная отправка по file_id без загрузки файла)
+class TelegramFileCache(models.Model):
+    KIND_CHOICES = (
+        ('photo', 'фото'),
+        ('document', 'документ'),
+    )
+    media_path = models.CharField(max_length=500, verbose_name='путь к файлу в media')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='тип сообщения')
+    fingerprint = models.CharField(max_length=64, verbose_name='размер и время изменения файла')
+    file_id = models.CharField(max_length=255, verbose_name='file_id в Telegram')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='дата загрузки')
+
+    class Meta:
+        db_table = 'telegram_file_cache'
+        verbose_name = 'файл в Telegram'
+        verbose_name_plural = 'файлы в Telegram'
+        constraints = [
+            models.UniqueConstraint(fields=['media_path', 'kind'], name='telegram_file_path_kind_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.media_path}"
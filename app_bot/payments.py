@@ -0,0 +1,95 @@
+import logging
+import time
+from datetime import date
+
+from django.db import IntegrityError, transaction
+
+from .availability import bulk_add_related
+from .catalog import get_catalog
+from .models import Payment, Tariff, TelegramUser, UserAvailability
+from .user_progress import merge_progress
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentActivationError(Exception):
+    """Платеж нельзя активировать: пользователь или тариф не найден."""
+
+
+def grant_start_content(user_id: int, tariff_title: str) -> bool:
+    """
+    Открывает пользователю стартовый контент тарифа.
+
+    Стартовый контент берется из каталога (без запросов к StartUserAvailability),
+    каждый вид контента записывается одной идемпотентной вставкой. Вызывается внутри транзакции.
+    Возвращает False, если для тарифа стартовый контент не задан.
+    """
+    start_content = get_catalog().start_content.get(tariff_title)
+    if start_content is None:
+        return False
+    UserAvailability.objects.bulk_create([UserAvailability(user_id=user_id)], ignore_conflicts=True)
+    user_availability = UserAvailability(user_id=user_id)
+    for field_name, content_ids in start_content['content'].items():
+        bulk_add_related(user_availability, field_name, content_ids)
+    # Двойная запись в компактный прогресс на время переноса с ManyToMany
+    merge_progress(user_id, 'available', start_content['content'])
+    return True
+
+
+def activate_payment(user_id: int,
+                     tariff_title: str,
+                     amount: int,
+                     access_date_start: date,
+                     access_date_finish: date,
+                     external_payment_id: str = None,
+                     payment_status: str = 'completed',
+                     service_description: str = None) -> tuple:
+    """
+    Активирует оплату тарифа в одной транзакции: сохраняет платеж, делает пользователя клиентом
+    и открывает стартовый контент тарифа. Либо выполняется все, либо ничего.
+
+    Повторная активация с тем же external_payment_id (повторное уведомление ЮKassa)
+    ничего не меняет и возвращает уже сохраненный платеж.
+
+    Returns:
+        (payment, created) - платеж и признак того, что он создан этим вызовом.
+    """
+    started = time.monotonic()
+    external_payment_id = external_payment_id or None
+    if external_payment_id:
+        payment = Payment.objects.filter(external_payment_id=external_payment_id).first()
+        if payment is not None:
+            logger.info(f"Платеж ЮKassa {external_payment_id} уже активирован: {payment.payment_id}")
+            return payment, False
+
+    try:
+        with transaction.atomic():
+            tariff_id = Tariff.objects.filter(title=tariff_title).values_list('tariff_id', flat=True).first()
+            if tariff_id is None:
+                raise PaymentActivationError(f"Тариф '{tariff_title}' не найден")
+            if not TelegramUser.objects.filter(user_id=user_id).update(role='client'):
+                raise PaymentActivationError(f"Пользователь с user_id '{user_id}' не найден")
+            payment = Payment.objects.create(
+                amount=amount,
+                user_id=user_id,
+                access_date_start=access_date_start,
+                access_date_finish=access_date_finish,
+                tariff_id=tariff_id,
+                status=payment_status,
+                service_description=service_description,
+                external_payment_id=external_payment_id,
+            )
+            if not grant_start_content(user_id, tariff_title):
+                logger.warning(f"Стартовый контент для тарифа '{tariff_title}' не задан")
+    except IntegrityError:
+        # То же уведомление параллельно активировано другим запросом
+        if external_payment_id is None:
+            raise
+        payment = Payment.objects.filter(external_payment_id=external_payment_id).first()
+        if payment is None:
+            raise
+        return payment, False
+
+    logger.info(f"Платеж {payment.payment_id} пользователя {user_id} по тарифу '{tariff_title}' "
+                f"активирован за {(time.monotonic() - started) * 1000:.1f} мс")
+    return payment, True
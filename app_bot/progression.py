@@ -0,0 +1,127 @@
+import logging
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Unlocks(NamedTuple):
+    """Контент, который открывается после прохождения видео, теста или практики."""
+    topics: tuple = ()
+    lessons: tuple = ()
+    videos: tuple = ()
+    tests: tuple = ()
+    practices: tuple = ()
+
+
+NO_UNLOCKS = Unlocks()
+
+
+def by_serial_number(content):
+    """Ключ сортировки: serial_number, при равенстве - первичный ключ."""
+    return content.serial_number, content.pk
+
+
+def by_pk(content):
+    """Ключ сортировки для тестов и практик, у которых нет serial_number."""
+    return content.pk
+
+
+class ProgressionGraph:
+    """
+    Скомпилированный граф прохождения курса.
+
+    Связи next_topics/next_lessons/next_videos/next_tests/next_practices у Video, Test и Practice
+    собираются в словарь (вид, id) -> Unlocks, где объекты уже отсортированы по serial_number.
+    Для тем и уроков заранее вычислены предыдущие по serial_number и последний урок темы,
+    родители (тема урока, урок видео/практики) берутся из словарей каталога по ИД.
+    Граф строится вместе с каталогом контента и перестраивается только при изменении контента.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.unlocks = {}
+        for kind, contents in (('video', catalog.videos), ('test', catalog.tests), ('practice', catalog.practices)):
+            for content_id, content in contents.items():
+                self.unlocks[(kind, content_id)] = Unlocks(
+                    topics=self._resolve(content.next_topics.all(), catalog.topics),
+                    lessons=self._resolve(content.next_lessons.all(), catalog.lessons),
+                    videos=self._resolve(content.next_videos.all(), catalog.videos),
+                    tests=self._resolve(content.next_tests.all(), catalog.tests, key=by_pk),
+                    practices=self._resolve(content.next_practices.all(), catalog.practices, key=by_pk),
+                )
+
+        # Первая тема/урок с данным serial_number, как Model.objects.filter(serial_number=...).first()
+        topic_by_serial = {}
+        for topic in sorted(catalog.topics.values(), key=by_serial_number):
+            topic_by_serial.setdefault(topic.serial_number, topic)
+        lesson_by_serial = {}
+        for lesson in sorted(catalog.lessons.values(), key=by_serial_number):
+            lesson_by_serial.setdefault(lesson.serial_number, lesson)
+
+        self.previous_topic = {}
+        for topic_id, topic in catalog.topics.items():
+            if topic.serial_number > 1:
+                previous_topic = topic_by_serial.get(topic.serial_number - 1)
+                if previous_topic is not None:
+                    self.previous_topic[topic_id] = previous_topic
+
+        self.previous_lesson = {}
+        for lesson_id, lesson in catalog.lessons.items():
+            if lesson.serial_number > 1:
+                previous_lesson = lesson_by_serial.get(lesson.serial_number - 1)
+                if previous_lesson is not None:
+                    self.previous_lesson[lesson_id] = previous_lesson
+
+        self.last_lesson = {
+            topic_id: max(lessons, key=by_serial_number)
+            for topic_id, lessons in catalog.lessons_by_topic.items() if lessons
+        }
+
+    @staticmethod
+    def _resolve(related, contents: dict, key=by_serial_number) -> tuple:
+        """Заменяет связанные объекты на объекты каталога и сортирует их."""
+        return tuple(sorted((contents[content.pk] for content in related), key=key))
+
+    def get_unlocks(self, kind: str, content_id: int) -> Unlocks:
+        """Возвращает контент, открываемый после видео/теста/практики ('video', 'test', 'practice')."""
+        return self.unlocks.get((kind, content_id), NO_UNLOCKS)
+
+    def get_next_step(self, unlocks: Unlocks) -> tuple:
+        """
+        Определяет следующий шаг пользователя по открывшемуся контенту.
+
+        Приоритет: тема, урок, видео, тест, практика; внутри вида берется первый
+        по serial_number (тесты и практики - по ИД).
+        """
+        catalog = self.catalog
+        if unlocks.topics:
+            next_topic = unlocks.topics[0]
+            return 'topic', {'topic_id': next_topic.topic_id,
+                             'topic_title': next_topic.title}
+        if unlocks.lessons:
+            next_lesson = unlocks.lessons[0]
+            topic = catalog.topics[next_lesson.topic_id]
+            return 'lesson', {'lesson_id': next_lesson.lesson_id,
+                              'lesson_title': next_lesson.title,
+                              'topic_id': topic.topic_id,
+                              'topic_title': topic.title}
+        if unlocks.videos:
+            next_video = unlocks.videos[0]
+            lesson = catalog.lessons[next_video.lesson_id]
+            return 'video', {'video_id': next_video.video_id,
+                             'video_title': next_video.title,
+                             'lesson_id': lesson.lesson_id,
+                             'lesson_title': lesson.title}
+        if unlocks.tests:
+            next_test = unlocks.tests[0]
+            return 'test', {'test_id': next_test.test_id,
+                            'test_title': next_test.title}
+        if unlocks.practices:
+            next_practice = unlocks.practices[0]
+            lesson = catalog.lessons[next_practice.lesson_id]
+            return 'practice', {'practice_id': next_practice.practice_id,
+                                'practice_title': next_practice.title,
+                                'lesson_id': lesson.lesson_id,
+                                'lesson_title': lesson.title}
+        logger.warning("No next step or content found")
+        return None, {}
@@ -1,24 +1,10 @@
-from bs4 import BeautifulSoup
 from rest_framework import serializers
 from django.conf import settings
 
-from .models import (Answer, Lesson, Payment, Practice, Question, Tariff,
-                     TelegramUser, Test, Topic, UserAvailability, UserContact,
-                     Video, VideoSummary)
-
-
-def clean_html(html_text):
-    """Удаляет HTML-теги и лишние пробелы/переносы, возвращает чистый текст."""
-    if not html_text:
-        return ""
-    # Удаляем HTML-теги
-    soup = BeautifulSoup(html_text, 'html.parser')
-    text = soup.get_text()
-    # Заменяем неразрывные пробелы на обычные
-    text = text.replace('\xa0', ' ')
-    # Убираем лишние переносы строк и сжимаем пробелы
-    text = ' '.join(text.split())
-    return text.strip()
+from .models import (Answer, Entitlement, Lesson, Payment, Practice,
+                     Question, Tariff, TelegramUser, Test, Topic,
+                     UserAvailability, UserContact, Video, VideoSummary)
+from .text_utils import get_description_text
 
 
 class TariffSerializer(serializers.ModelSerializer):
@@ -41,7 +27,7 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ['amount', 'user', 'access_date_start', 'access_date_finish', 'tariff',
-                  'tariff_detail', 'status', 'service_description']
+                  'tariff_detail', 'status', 'service_description', 'external_payment_id']
 
 
 class UserContactSerializer(serializers.ModelSerializer):
@@ -51,9 +37,21 @@ class UserContactSerializer(serializers.ModelSerializer):
         fields = ['user', 'firstname', 'secondname', 'email', 'city', 'phonenumber']
 
 
+class EntitlementSerializer(serializers.ModelSerializer):
+    """Текущий оплаченный доступ: тариф и даты в том же виде, что и у платежа."""
+    tariff_detail = TariffSerializer(source='tariff', read_only=True)
+    access_date_start = serializers.DateField(read_only=True)
+    access_date_finish = serializers.DateField(read_only=True)
+
+    class Meta:
+        model = Entitlement
+        fields = ['payment', 'tariff_detail', 'access_date_start', 'access_date_finish']
+
+
 class TelegramUserSerializer(serializers.ModelSerializer):
     contact = UserContactSerializer(many=False, read_only=True)
-    payments = PaymentSerializer(many=True, read_only=True)
+    # Только текущий доступ вместо всей истории платежей
+    entitlement = EntitlementSerializer(many=False, read_only=True)
 
     class Meta:
         model = TelegramUser
@@ -63,7 +61,7 @@ class TelegramUserSerializer(serializers.ModelSerializer):
 class TopicSerializer(serializers.ModelSerializer):
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     def get_picture(self, obj):
         """Возвращает полный URL для изображения."""
@@ -77,14 +75,14 @@ class TopicSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Topic
-        fields = '__all__'
+        exclude = ['description_text']
 
 
 class AnswerSerializer(serializers.ModelSerializer):
     description = serializers.SerializerMethodField()
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     class Meta:
         model = Answer
@@ -97,7 +95,7 @@ class QuestionSerializer(serializers.ModelSerializer):
     answers = AnswerSerializer(many=True, read_only=True)
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     def get_picture(self, obj):
         """Возвращает полный URL для изображения."""
@@ -119,7 +117,7 @@ class TestSerializer(serializers.ModelSerializer):
     questions = QuestionSerializer(many=True, read_only=True)
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     class Meta:
         model = Test
@@ -131,7 +129,7 @@ class LessonSerializer(serializers.ModelSerializer):
     picture = serializers.SerializerMethodField()
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     def get_picture(self, obj):
         """Возвращает полный URL для изображения."""
@@ -153,7 +151,7 @@ class VideoSummarySerializer(serializers.ModelSerializer):
     picture = serializers.SerializerMethodField()
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     def get_picture(self, obj):
         """Возвращает полный URL для изображения."""
@@ -183,7 +181,7 @@ class PracticeSerializer(serializers.ModelSerializer):
     exercise = serializers.SerializerMethodField()
 
     def get_description(self, obj):
-        return clean_html(obj.description)
+        return get_description_text(obj)
 
     def get_exercise(self, obj):
         """Возвращает полный URL для файла с практическими заданиями."""
@@ -197,7 +195,7 @@ class PracticeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Practice
-        fields = '__all__'
+        exclude = ['description_text']
 
 
 class UserAvailabilitySerializer(serializers.ModelSerializer):
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+
+from .catalog import (NEXT_CONTENT_FIELDS, START_CONTENT_FIELDS,
+                      bump_content_version)
+from .entitlements import sync_entitlements
+from .models import (Answer, Lesson, Payment, Practice, Question,
+                     StartUserAvailability, Tariff, Test, Topic, Video,
+                     VideoSummary)
+from .telegram_files import MEDIA_FILE_FIELDS, forget_stale_files
+from .text_utils import clean_html
+from .user_progress import CONTENT_KINDS, PROGRESS_SOURCES, sync_progress
+
+# Tariff в каталог бэкенда не входит, но кэшируется ботом вместе с темами, поэтому тоже меняет версию
+CATALOG_MODELS = (Topic, Lesson, Video, VideoSummary, Test, Question, Answer, Practice, Tariff,
+                  StartUserAvailability)
+DESCRIPTION_MODELS = (Topic, Lesson, VideoSummary, Test, Question, Answer, Practice)
+
+
+def fill_description_text(sender, instance, **kwargs):
+    """Очищенный от HTML текст описания вычисляется один раз при сохранении, а не при каждой сериализации."""
+    instance.description_text = clean_html(instance.description)
+
+
+def content_changed(sender, **kwargs):
+    """Любое изменение учебного контента увеличивает общую версию каталога."""
+    if kwargs.get('raw'):
+        return
+    bump_content_version()
+
+
+def content_links_changed(sender, action, **kwargs):
+    """
+    Изменение связей next_* (что открывается после прохождения) и стартового контента тарифов
+    тоже меняет каталог.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_content_version()
+
+
+for model in DESCRIPTION_MODELS:
+    pre_save.connect(fill_description_text, sender=model, dispatch_uid=f'description_text_{model.__name__}')
+
+for model in CATALOG_MODELS:
+    post_save.connect(content_changed, sender=model, dispatch_uid=f'catalog_save_{model.__name__}')
+    post_delete.connect(content_changed, sender=model, dispatch_uid=f'catalog_delete_{model.__name__}')
+
+for model in (Video, Test, Practice):
+    for field_name in NEXT_CONTENT_FIELDS:
+        m2m_changed.connect(
+            content_links_changed,
+            sender=getattr(model, field_name).through,
+            dispatch_uid=f'catalog_links_{model.__name__}_{field_name}',
+        )
+
+for field_name in START_CONTENT_FIELDS:
+    m2m_changed.connect(
+        content_links_changed,
+        sender=getattr(StartUserAvailability, field_name).through,
+        dispatch_uid=f'catalog_links_StartUserAvailability_{field_name}',
+    )
+
+
+def progress_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Изменения UserAvailability/UserDone через .add()/.remove() (например, в админке)
+    переносятся в UserProgress после коммита.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif pk_set is not None:
+        user_ids = list(pk_set)
+    else:
+        user_ids = None
+    transaction.on_commit(lambda: sync_progress(user_ids))
+
+
+def progress_owner_deleted(sender, instance, **kwargs):
+    """Удаление UserAvailability/UserDone очищает соответствующие массивы UserProgress."""
+    transaction.on_commit(lambda: sync_progress([instance.pk]))
+
+
+for model in PROGRESS_SOURCES.values():
+    post_delete.connect(progress_owner_deleted, sender=model, dispatch_uid=f'progress_delete_{model.__name__}')
+    for field_name in CONTENT_KINDS:
+        m2m_changed.connect(
+            progress_links_changed,
+            sender=getattr(model, field_name).through,
+            dispatch_uid=f'progress_links_{model.__name__}_{field_name}',
+        )
+
+
+def payment_changed(sender, instance, **kwargs):
+    """
+    Entitlement пересобирается в той же транзакции, что и сохранение или удаление платежа,
+    поэтому оплата и доступ по ней записываются вместе.
+    """
+    if kwargs.get('raw'):
+        return
+    sync_entitlements([instance.user_id])
+
+
+post_save.connect(payment_changed, sender=Payment, dispatch_uid='entitlement_payment_save')
+post_delete.connect(payment_changed, sender=Payment, dispatch_uid='entitlement_payment_delete')
+
+
+def media_file_changed(sender, instance, **kwargs):
+    """Замененная в админке картинка или файл задания больше не отправляются по старому file_id."""
+    if kwargs.get('raw'):
+        return
+    forget_stale_files(instance)
+
+
+for model in MEDIA_FILE_FIELDS:
+    post_save.connect(media_file_changed, sender=model, dispatch_uid=f'telegram_files_{model.__name__}')
@@ -0,0 +1,79 @@
+import os
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .models import (Lesson, Practice, Question, TelegramFileCache, Topic,
+                     VideoSummary)
+
+# Модель -> поля с файлами, которые бот отправляет в Telegram
+MEDIA_FILE_FIELDS = {
+    Topic: ('picture',),
+    Lesson: ('picture',),
+    VideoSummary: ('picture',),
+    Question: ('picture',),
+    Practice: ('exercise',),
+}
+
+
+def get_media_path(url: str):
+    """Путь файла относительно MEDIA_ROOT по его URL (абсолютному или /media/...), либо None."""
+    path = unquote(urlparse(url).path)
+    media_url = urlparse(settings.MEDIA_URL).path
+    if not path.startswith(media_url):
+        return None
+    media_path = os.path.normpath(path[len(media_url):]).lstrip('/')
+    if media_path.startswith('..'):
+        return None
+    return media_path
+
+
+def get_fingerprint(media_path: str):
+    """Отпечаток файла (размер и время изменения) или None, если файла нет."""
+    try:
+        stat = os.stat(default_storage.path(media_path))
+    except (OSError, NotImplementedError):
+        return None
+    return f'{stat.st_size}-{stat.st_mtime_ns}'
+
+
+def get_file_id(media_path: str, kind: str):
+    """
+    file_id ранее загруженного файла. Если файл с тех пор заменили (изменился отпечаток),
+    запись удаляется и возвращается None.
+    """
+    cached = TelegramFileCache.objects.filter(media_path=media_path, kind=kind).values_list(
+        'fingerprint', 'file_id'
+    ).first()
+    if cached is None:
+        return None
+    fingerprint, file_id = cached
+    if fingerprint != get_fingerprint(media_path):
+        TelegramFileCache.objects.filter(media_path=media_path, kind=kind).delete()
+        return None
+    return file_id
+
+
+def save_file_id(media_path: str, kind: str, file_id: str) -> bool:
+    """Запоминает file_id загруженного файла вместе с его текущим отпечатком (INSERT ... ON CONFLICT)."""
+    fingerprint = get_fingerprint(media_path)
+    if fingerprint is None:
+        return False
+    TelegramFileCache.objects.bulk_create(
+        [TelegramFileCache(media_path=media_path, kind=kind, fingerprint=fingerprint, file_id=file_id)],
+        update_conflicts=True,
+        unique_fields=['media_path', 'kind'],
+        update_fields=['fingerprint', 'file_id'],
+    )
+    return True
+
+
+def forget_stale_files(instance) -> None:
+    """Удаляет file_id файлов объекта, которые были заменены после загрузки в Telegram."""
+    for field_name in MEDIA_FILE_FIELDS.get(type(instance), ()):
+        file = getattr(instance, field_name)
+        if not file:
+            continue
+        fingerprint = get_fingerprint(file.name)
+        TelegramFileCache.objects.filter(media_path=file.name).exclude(fingerprint=fingerprint).delete()
@@ -1,3 +1,245 @@
+import itertools
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import catalog
+from .models import (Answer, Entitlement, Lesson, Practice, Question, StartUserAvailability,
+                     Tariff, TelegramUser, Test, TestAttemptAnswer, Topic,
+                     UserAvailability, UserDone, Video)
+
+
+class ContentSummaryAdminTests(TestCase):
+    """Число запросов страницы списка в админке не зависит от числа строк и объема контента."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.topics = [Topic.objects.create(title=f'Тема {number}', serial_number=number) for number in range(3)]
+        cls.lessons = [
+            Lesson.objects.create(topic=cls.topics[0], title=f'Урок {number}', serial_number=number)
+            for number in range(8)
+        ]
+        lesson = cls.lessons[0]
+        cls.videos = [
+            Video.objects.create(lesson=lesson, title=f'Видео {number}', serial_number=number,
+                                 video_link='https://example.com')
+            for number in range(3)
+        ]
+        cls.tests = [Test.objects.create(lesson=lesson, title=f'Тест {number}') for number in range(3)]
+        cls.practices = [Practice.objects.create(lesson=lesson, title=f'Практика {number}') for number in range(3)]
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+        self.numbers = itertools.count(1)
+
+    def add_content(self, owner):
+        owner.topics.add(*self.topics)
+        owner.lessons.add(*self.lessons)
+        owner.videos.add(*self.videos)
+        owner.tests.add(*self.tests)
+        owner.practices.add(*self.practices)
+
+    def create_users(self, model, count):
+        for _ in range(count):
+            number = next(self.numbers)
+            user = TelegramUser.objects.create(tg_id=number, tg_name=f'user_{number}')
+            self.add_content(model.objects.create(user=user))
+
+    def create_start_availabilities(self, count):
+        for _ in range(count):
+            tariff = Tariff.objects.create(title=f'Тариф {next(self.numbers)}', price=100)
+            self.add_content(StartUserAvailability.objects.create(tariff=tariff))
+
+    def count_changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assert_constant_queries(self, url, add_rows):
+        add_rows(2)
+        queries, _ = self.count_changelist_queries(url)
+        add_rows(30)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        # Сессия, пользователь админки, два подсчета строк и сама страница
+        self.assertLessEqual(queries, 6)
+        # Число связей и первые CONTENT_TITLES_LIMIT названий
+        self.assertContains(response, '8: Урок 0, Урок 1, Урок 2, Урок 3, Урок 4, …')
+        self.assertContains(response, '3: Видео 0, Видео 1, Видео 2<')
+
+    def test_user_availability_changelist(self):
+        self.assert_constant_queries('/admin/app_bot/useravailability/',
+                                     lambda count: self.create_users(UserAvailability, count))
+
+    def test_user_done_changelist(self):
+        self.assert_constant_queries('/admin/app_bot/userdone/',
+                                     lambda count: self.create_users(UserDone, count))
+
+    def test_start_user_availability_changelist(self):
+        self.assert_constant_queries('/admin/app_bot/startuseravailability/', self.create_start_availabilities)
+
+
+class TestAttemptTests(TestCase):
+    """Попытки прохождения теста: проверка ответов, повторы, завершение и открытие контента."""
+
+    @classmethod
+    def setUpTestData(cls):
+        topic = Topic.objects.create(title='Тема', serial_number=1)
+        cls.lesson = Lesson.objects.create(topic=topic, title='Урок 1', serial_number=1)
+        cls.next_lesson = Lesson.objects.create(topic=topic, title='Урок 2', serial_number=2)
+        cls.test = Test.objects.create(lesson=cls.lesson, title='Тест', show_right_answer=True)
+        cls.test.next_lessons.add(cls.next_lesson)
+        cls.question_ids = []
+        for number in range(1, 6):
+            question = Question.objects.create(test=cls.test, description=f'Вопрос {number}', serial_number=number)
+            Answer.objects.create(question=question, description='Верно', serial_number=1, right=True)
+            Answer.objects.create(question=question, description='Неверно', serial_number=2, right=False)
+            cls.question_ids.append(question.question_id)
+        other_test = Test.objects.create(lesson=cls.lesson, title='Другой тест')
+        cls.other_question = Question.objects.create(test=other_test, description='Чужой вопрос', serial_number=1)
+        cls.client_user = TelegramUser.objects.create(tg_id=101, tg_name='client', role='client')
+
+    def setUp(self):
+        # Каталог прошлого теста мог быть построен для той же версии контента
+        catalog._state['catalog'] = None
+
+    def post(self, url, data):
+        return self.client.post(f'/bot/{url}', data, content_type='application/json')
+
+    def start(self, user=None):
+        user = user or self.client_user
+        response = self.post('test_attempt/start/', {'telegram_id': user.tg_id, 'test_id': self.test.test_id})
+        self.assertEqual(response.status_code, 201)
+        return response.json()['attempt_id']
+
+    def answer(self, attempt_id, question_id, answer):
+        return self.post(f'test_attempt/{attempt_id}/answer/', {'question_id': question_id, 'answer': answer})
+
+    def answer_all(self, attempt_id, correct):
+        answers = [{'question_id': question_id, 'answer': '1' if index < correct else '2'}
+                   for index, question_id in enumerate(self.question_ids)]
+        response = self.post(f'test_attempt/{attempt_id}/answers/', {'answers': answers})
+        self.assertEqual(response.status_code, 200)
+
+    def finish(self, attempt_id):
+        response = self.post(f'test_attempt/{attempt_id}/finish/', {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def available_lessons(self):
+        return set(UserAvailability.objects.get(user=self.client_user).lessons.values_list('lesson_id', flat=True))
+
+    def test_answer_is_graded(self):
+        attempt_id = self.start()
+        correct = self.answer(attempt_id, self.question_ids[0], '1').json()
+        self.assertTrue(correct['is_correct'])
+        self.assertEqual(correct['right_answers'], [])
+        self.assertEqual(correct['next_question']['question_id'], self.question_ids[1])
+
+        wrong = self.answer(attempt_id, self.question_ids[1], '1,2').json()
+        self.assertFalse(wrong['is_correct'])
+        self.assertEqual([answer['serial_number'] for answer in wrong['right_answers']], [1])
+
+    def test_repeated_answer_returns_stored_result(self):
+        attempt_id = self.start()
+        self.assertFalse(self.answer(attempt_id, self.question_ids[0], '2').json()['is_correct'])
+        repeated = self.answer(attempt_id, self.question_ids[0], '1')
+        self.assertEqual(repeated.status_code, 200)
+        self.assertFalse(repeated.json()['is_correct'])
+        self.assertEqual(TestAttemptAnswer.objects.get(attempt_id=attempt_id).selected, [2])
+
+    def test_invalid_answer_format(self):
+        attempt_id = self.start()
+        self.assertEqual(self.answer(attempt_id, self.question_ids[0], 'один').status_code, 400)
+
+    def test_answers_rejected_by_attempt(self):
+        attempt_id = self.start()
+        self.assertEqual(self.answer(attempt_id, self.other_question.question_id, '1').status_code, 409)
+        self.finish(attempt_id)
+        self.assertEqual(self.answer(attempt_id, self.question_ids[0], '1').status_code, 409)
+        response = self.post(f'test_attempt/{attempt_id}/answers/',
+                             {'answers': [{'question_id': self.question_ids[0], 'answer': '1'}]})
+        self.assertEqual(response.status_code, 409)
+
+    def test_passed_attempt_unlocks_next_content(self):
+        attempt_id = self.start()
+        self.answer_all(attempt_id, correct=4)
+        result = self.finish(attempt_id)
+        self.assertEqual((result['correct_answers'], result['percentage'], result['passed']), (4, 80, True))
+        self.assertEqual(result['unlock']['next_content']['next_lessons_name'], ['Урок 2'])
+        self.assertIn(self.next_lesson.lesson_id, self.available_lessons())
+        # Повторное завершение возвращает сохраненный результат
+        self.assertEqual(self.finish(attempt_id)['correct_answers'], 4)
+
+    def test_failed_attempt_does_not_unlock(self):
+        attempt_id = self.start()
+        self.answer_all(attempt_id, correct=3)
+        result = self.finish(attempt_id)
+        self.assertEqual((result['percentage'], result['passed'], result['unlock']), (60, False, None))
+        self.assertFalse(UserAvailability.objects.filter(user=self.client_user).exists())
+
+    def test_user_without_tariff_is_not_unlocked(self):
+        user = TelegramUser.objects.create(tg_id=102, tg_name='user', role='user')
+        attempt_id = self.start(user)
+        self.answer_all(attempt_id, correct=5)
+        result = self.finish(attempt_id)
+        self.assertTrue(result['passed'])
+        self.assertIsNone(result['unlock'])
+
+    def test_add_content_after_test_requires_passed_attempt(self):
+        payload = {'user_id': self.client_user.user_id, 'test_id': self.test.test_id}
+        self.assertEqual(self.post('next_content_test/add/', payload).status_code, 403)
+        attempt_id = self.start()
+        self.answer_all(attempt_id, correct=5)
+        self.finish(attempt_id)
+        self.assertEqual(self.post('next_content_test/add/', payload).status_code, 201)
+
+    def test_attempt_history(self):
+        first = self.start()
+        self.finish(first)
+        second = self.start()
+        response = self.client.get(f'/bot/test_attempts/{self.client_user.tg_id}/',
+                                   {'test_id': self.test.test_id})
+        self.assertEqual([attempt['attempt_id'] for attempt in response.json()], [second, first])
+        response = self.client.get(f'/bot/test_attempts/{self.client_user.tg_id}/', {'limit': -5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        response = self.client.get(f'/bot/test_attempts/{self.client_user.tg_id}/', {'test_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SweepEntitlementsTests(TestCase):
+    """Обход Entitlement: проверка параметров пачки и курсора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        for tg_id in (201, 202):
+            user = TelegramUser.objects.create(tg_id=tg_id, tg_name=f'user{tg_id}', role='client')
+            Entitlement.objects.create(user=user, period=(today - timedelta(days=40), today - timedelta(days=10)))
+
+    def sweep(self, **data):
+        return self.client.post('/bot/entitlements/sweep/', {'kind': 'expired', **data},
+                                content_type='application/json')
+
+    def test_invalid_parameters(self):
+        for data in ({'limit': 0}, {'limit': -1}, {'limit': 5001}, {'limit': 'x'},
+                     {'after': 'x'}, {'after': {'a': 1}}, {'after': ['2024-01-01']},
+                     {'after': ['не дата', 1]}, {'after': [1, 1]}, {'after': ['2024-01-01', '1']}):
+            with self.subTest(data=data):
+                self.assertEqual(self.sweep(**data).status_code, 400)
+        self.assertFalse(Entitlement.objects.filter(revoked_at__isnull=False).exists())
 
-# Create your tests here.
+    def test_cursor_pages(self):
+        first = self.sweep(limit=1).json()
+        self.assertEqual(len(first['items']), 1)
+        self.assertEqual(date.fromisoformat(first['next'][0]), timezone.localdate() - timedelta(days=10))
+        second = self.sweep(limit=1, after=first['next']).json()
+        self.assertEqual([item['tg_id'] for item in first['items'] + second['items']], [201, 202])
+        self.assertEqual(self.sweep(limit=1, after=second['next']).json(), {'items': [], 'next': None})
@@ -0,0 +1,25 @@
+from bs4 import BeautifulSoup
+
+
+def clean_html(html_text):
+    """Удаляет HTML-теги и лишние пробелы/переносы, возвращает чистый текст."""
+    if not html_text:
+        return ""
+    # Удаляем HTML-теги
+    soup = BeautifulSoup(html_text, 'html.parser')
+    text = soup.get_text()
+    # Заменяем неразрывные пробелы на обычные
+    text = text.replace('\xa0', ' ')
+    # Убираем лишние переносы строк и сжимаем пробелы
+    text = ' '.join(text.split())
+    return text.strip()
+
+
+def get_description_text(obj) -> str:
+    """
+    Очищенное описание объекта: сохраненное в description_text при записи,
+    либо вычисленное на лету, если поле еще не заполнено (до запуска backfill_description_text).
+    """
+    if obj.description_text or not obj.description:
+        return obj.description_text
+    return clean_html(obj.description)
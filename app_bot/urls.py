@@ -1,15 +1,26 @@
 from django.http import HttpResponse
 from django.urls import path
 
-from .views import (add_content_after_practice, add_content_after_test,
-                    add_content_after_video, add_payment, add_start_content,
-                    add_user, add_user_contact, get_admin_info,
-                    get_available_lesson, get_available_topic,
+from .views import (activate_payment_view, add_content_after_practice,
+                    add_content_after_test, add_content_after_video,
+                    add_payment, add_start_content, add_telegram_file,
+                    add_user, add_user_contact, answer_test_attempt,
+                    answer_test_attempt_batch, finish_test_attempt,
+                    get_admin_info, get_available_content,
+                    get_available_lesson, get_available_lesson_content,
+                    get_available_lesson_content_by_id, get_available_topic,
+                    get_bot_catalog, get_content_version_info,
+                    get_lesson_by_id, get_lesson_content_by_id,
                     get_lesson_practices, get_lesson_tests, get_lesson_video,
-                    get_lessons, get_practice_info, get_practices, get_tariff,
-                    get_tariffs, get_test, get_tests, get_topic,
-                    get_topic_lessons, get_topics, get_user, get_video_info,
-                    get_video_question, get_videos, index_page, get_user_progress)
+                    get_lessons, get_practice_by_id, get_practice_info,
+                    get_practices, get_session_bootstrap, get_tariff,
+                    get_tariffs, get_telegram_file, get_test,
+                    get_test_attempts, get_test_by_id, get_tests, get_topic,
+                    get_topic_by_id, get_topic_lessons,
+                    get_topic_lessons_by_id, get_topics, get_user,
+                    get_video_by_id, get_video_info, get_video_question,
+                    get_videos, index_page, get_user_progress,
+                    start_test_attempt, sweep_entitlements_view)
 
 app_name = "app_bot"
 
@@ -20,18 +31,30 @@ urlpatterns = [
     path('', index_page, name="index_page"),
     path('tg_user/<int:telegram_id>', get_user),
     path('user/add/', add_user),
+    path('bootstrap/<int:telegram_id>/', get_session_bootstrap),
     path('topics/', get_topics),
+    path('catalog/', get_bot_catalog),
+    path('content_version/', get_content_version_info),
     path('topic/<str:topic_title>/', get_topic),
     path('contact/add/', add_user_contact),
     path('start_test/<str:test_title>/', get_test),
     path('tariffs/', get_tariffs),
     path('tariff/<str:tariff_title>/', get_tariff),
     path('payment/add/', add_payment, name='add_payment'),
+    path('payment/activate/', activate_payment_view, name='activate_payment'),
+    path('entitlements/sweep/', sweep_entitlements_view, name='sweep_entitlements'),
     path('available_topics/<int:telegram_id>/', get_available_topic),
+    path('available_content/<int:telegram_id>/', get_available_content),
     path('topic_lessons/<str:topic_title>/', get_topic_lessons),
     path('lesson/<str:topic_title>/<str:lesson_title>/', get_available_lesson),
     path('lessons/', get_lessons),
     path('lesson_video/<str:topic_title>/<str:lesson_title>/', get_lesson_video),
+    path('available_lesson_video/<int:telegram_id>/<str:topic_title>/<str:lesson_title>/',
+         get_available_lesson_content, {'kind': 'videos'}),
+    path('available_lesson_tests/<int:telegram_id>/<str:topic_title>/<str:lesson_title>/',
+         get_available_lesson_content, {'kind': 'tests'}),
+    path('available_lesson_practices/<int:telegram_id>/<str:topic_title>/<str:lesson_title>/',
+         get_available_lesson_content, {'kind': 'practices'}),
     path('video/<str:lesson_title>/<str:video_title>/', get_video_info),
     path('videos/', get_videos),
     path('video_question/<int:video_id>/', get_video_question),
@@ -46,5 +69,28 @@ urlpatterns = [
     path('practices/', get_practices),
     path('next_content_practice/add/', add_content_after_practice),
     path('health/', health_check, name='health_check'),
+    # Маршруты по ИД контента
+    path('topic_by_id/<int:topic_id>/', get_topic_by_id),
+    path('topic_lessons_by_id/<int:topic_id>/', get_topic_lessons_by_id),
+    path('lesson_by_id/<int:lesson_id>/', get_lesson_by_id),
+    path('lesson_video_by_id/<int:lesson_id>/', get_lesson_content_by_id, {'kind': 'videos'}),
+    path('lesson_tests_by_id/<int:lesson_id>/', get_lesson_content_by_id, {'kind': 'tests'}),
+    path('lesson_practices_by_id/<int:lesson_id>/', get_lesson_content_by_id, {'kind': 'practices'}),
+    path('video_by_id/<int:video_id>/', get_video_by_id),
+    path('start_test_by_id/<int:test_id>/', get_test_by_id),
+    path('test_attempt/start/', start_test_attempt),
+    path('test_attempt/<int:attempt_id>/answer/', answer_test_attempt),
+    path('test_attempt/<int:attempt_id>/answers/', answer_test_attempt_batch),
+    path('test_attempt/<int:attempt_id>/finish/', finish_test_attempt),
+    path('test_attempts/<int:telegram_id>/', get_test_attempts),
+    path('telegram_file/', get_telegram_file),
+    path('telegram_file/add/', add_telegram_file),
+    path('practice_by_id/<int:practice_id>/', get_practice_by_id),
+    path('available_lesson_video_by_id/<int:telegram_id>/<int:lesson_id>/',
+         get_available_lesson_content_by_id, {'kind': 'videos'}),
+    path('available_lesson_tests_by_id/<int:telegram_id>/<int:lesson_id>/',
+         get_available_lesson_content_by_id, {'kind': 'tests'}),
+    path('available_lesson_practices_by_id/<int:telegram_id>/<int:lesson_id>/',
+         get_available_lesson_content_by_id, {'kind': 'practices'}),
     path('done_content/<int:telegram_id>/', get_user_progress),
 ]
@@ -0,0 +1,110 @@
+from django.db import connection
+
+from .models import TelegramUser, UserAvailability, UserDone, UserProgress
+from .progression import by_pk, by_serial_number
+
+CONTENT_KINDS = ('topics', 'lessons', 'videos', 'tests', 'practices')
+# Префикс колонок UserProgress -> модель со связями ManyToMany, из которой они переносятся
+PROGRESS_SOURCES = {'available': UserAvailability, 'done': UserDone}
+PROGRESS_COLUMNS = [f'{prefix}_{kind}' for prefix in PROGRESS_SOURCES for kind in CONTENT_KINDS]
+
+
+def merge_progress(user_id: int, prefix: str, content: dict) -> None:
+    """
+    Добавляет ИД контента в массивы UserProgress одним запросом (INSERT ... ON CONFLICT DO UPDATE).
+
+    Args:
+        user_id: ИД пользователя.
+        prefix: 'available' или 'done'.
+        content: вид контента ('topics', 'lessons', ...) -> набор ИД.
+    """
+    columns = {f'{prefix}_{kind}': sorted(ids) for kind, ids in content.items() if ids}
+    if not columns:
+        return
+    table = UserProgress._meta.db_table
+    values = [columns.get(column, []) for column in PROGRESS_COLUMNS]
+    updates = ', '.join(
+        f"{column} = ARRAY(SELECT DISTINCT unnest({table}.{column} || EXCLUDED.{column}) ORDER BY 1)"
+        for column in columns
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, {', '.join(PROGRESS_COLUMNS)}, last_updated) "
+            f"VALUES (%s, {', '.join(['%s::integer[]'] * len(PROGRESS_COLUMNS))}, now()) "
+            f"ON CONFLICT (user_id) DO UPDATE SET {updates}, last_updated = EXCLUDED.last_updated",
+            [user_id, *values],
+        )
+
+
+def _collect_sql(column: str) -> str:
+    """Подзапрос, собирающий ИД контента пользователя из промежуточной таблицы ManyToMany."""
+    prefix, kind = column.split('_', 1)
+    field = PROGRESS_SOURCES[prefix]._meta.get_field(kind)
+    through = field.remote_field.through._meta.db_table
+    owner_column = f'{field.m2m_field_name()}_id'
+    content_column = f'{field.m2m_reverse_field_name()}_id'
+    return (f"ARRAY(SELECT {content_column} FROM {through} "
+            f"WHERE {owner_column} = users.user_id ORDER BY 1)")
+
+
+def sync_progress(user_ids=None) -> int:
+    """
+    Пересобирает строки UserProgress из таблиц UserAvailability и UserDone одним запросом.
+
+    Используется для переноса данных и после изменений связей в админке.
+    Без user_ids обрабатывает всех пользователей. Возвращает число обработанных пользователей.
+    """
+    users_table = TelegramUser._meta.db_table
+    where = ''
+    params = []
+    if user_ids is not None:
+        where = 'WHERE users.user_id = ANY(%s)'
+        params.append(list(user_ids))
+
+    table = UserProgress._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, {', '.join(PROGRESS_COLUMNS)}, last_updated) "
+            f"SELECT users.user_id, {', '.join(_collect_sql(column) for column in PROGRESS_COLUMNS)}, now() "
+            f"FROM {users_table} users {where} "
+            f"ON CONFLICT (user_id) DO UPDATE SET "
+            f"{', '.join(f'{column} = EXCLUDED.{column}' for column in PROGRESS_COLUMNS)}, "
+            f"last_updated = EXCLUDED.last_updated",
+            params,
+        )
+        return cursor.rowcount
+
+
+# Вид контента -> (первичный ключ, поле родителя, ключ сортировки) как в get_compact_availability
+COMPACT_FIELDS = {
+    'topics': ('topic_id', None, by_serial_number),
+    'lessons': ('lesson_id', 'topic_id', by_serial_number),
+    'videos': ('video_id', 'lesson_id', by_serial_number),
+    'tests': ('test_id', 'lesson_id', by_pk),
+    'practices': ('practice_id', 'lesson_id', by_pk),
+}
+
+
+def get_compact_progress_availability(progress, catalog) -> dict:
+    """
+    Доступный пользователю контент в формате get_compact_availability (только ИД и названия),
+    собранный из массивов UserProgress и каталога без запросов в БД.
+
+    Args:
+        progress: строка UserProgress пользователя или None, если прогресса еще нет.
+        catalog: каталог контента (ContentCatalog).
+    """
+    availability = {}
+    for kind, (pk_name, parent_field, sort_key) in COMPACT_FIELDS.items():
+        contents = getattr(catalog, kind)
+        available_ids = getattr(progress, f'available_{kind}') if progress is not None else ()
+        available = sorted((contents[content_id] for content_id in available_ids if content_id in contents),
+                           key=sort_key)
+        items = []
+        for content in available:
+            item = {pk_name: content.pk, 'title': content.title}
+            if parent_field:
+                item[parent_field] = getattr(content, parent_field)
+            items.append(item)
+        availability[kind] = items
+    return availability
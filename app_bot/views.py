@@ -1,25 +1,44 @@
 import html
 import logging
 import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
 from django.utils.html import strip_tags
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from .attempts import (PASS_PERCENTAGE, AttemptConflictError, AttemptError,
+                       finish_attempt, parse_selected, start_attempt,
+                       submit_answers)
+from .availability import (bulk_add_related, get_availability_user_id,
+                           get_compact_availability,
+                           list_available_lesson_content)
+from .catalog import get_cached_payload, get_catalog, get_content_version
+from .entitlements import EXPIRED_NOTIFY_DAYS, sweep_expired, sweep_expiring
 from .forms import TopicForm
-from .models import (Lesson, Practice, Question, StartUserAvailability, Tariff,
-                     TelegramUser, Test, Topic, UserAvailability, UserContact,
-                     Video, UserDone)
-from .serializers import (LessonSerializer, PaymentSerializer,
-                          PracticeSerializer, QuestionSerializer,
-                          TariffSerializer, TelegramUserSerializer,
-                          TestSerializer, TopicSerializer,
-                          UserAvailabilitySerializer, UserContactSerializer,
-                          VideoSerializer)
+from .models import (Lesson, Payment, Practice, Question,
+                     StartUserAvailability, Tariff, TelegramFileCache,
+                     TelegramUser, Test, TestAttempt, Topic, UserAvailability,
+                     UserContact, Video, UserDone)
+from .payments import (PaymentActivationError, activate_payment,
+                       grant_start_content)
+from .progression import by_serial_number
+from .serializers import (EntitlementSerializer, LessonSerializer,
+                          PaymentSerializer, PracticeSerializer,
+                          QuestionSerializer, TariffSerializer,
+                          TelegramUserSerializer, TestSerializer,
+                          TopicSerializer, UserAvailabilitySerializer,
+                          UserContactSerializer, VideoSerializer)
+from .telegram_files import get_file_id, get_media_path, save_file_id
+from .user_progress import (get_compact_progress_availability,
+                            merge_progress)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -70,7 +89,7 @@ def get_user(request, telegram_id):
     Если пользователя нет в БД - возвращает 502 статус.
     """
     try:
-        user = TelegramUser.objects.get(tg_id=telegram_id)
+        user = TelegramUser.objects.select_related('contact', 'entitlement__tariff').get(tg_id=telegram_id)
     except ObjectDoesNotExist:
         return Response(
             {'status': 'false', 'message': 'user not found'},
@@ -81,6 +100,58 @@ def get_user(request, telegram_id):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+# Поля контакта, без которых контакт пользователя считается незаполненным
+CONTACT_REQUIRED_FIELDS = ('firstname', 'secondname', 'email', 'city', 'phonenumber')
+
+
+@api_view(['GET'])
+def get_session_bootstrap(request, telegram_id):
+    """
+    Данные для /start одним ответом: пользователь и роль, контакт и его заполненность,
+    текущий оплаченный доступ (Entitlement), доступный контент (ИД и названия) и счетчики прогресса.
+
+    Пользователь, контакт, доступ и прогресс выбираются одним запросом,
+    контент берется из каталога, поэтому число запросов не зависит от объема данных.
+    """
+    logger.info(f"Received telegram_id: {telegram_id}")
+    user = (
+        TelegramUser.objects.select_related('contact', 'progress', 'entitlement__tariff')
+        .filter(tg_id=telegram_id)
+        .first()
+    )
+    if user is None:
+        return Response(
+            {'status': 'false', 'message': 'user not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    contact = getattr(user, 'contact', None)
+    progress = getattr(user, 'progress', None)
+    entitlement = getattr(user, 'entitlement', None)
+    if entitlement is not None and timezone.localdate() not in entitlement.period:
+        entitlement = None
+
+    if progress is not None:
+        counts = progress.get_counts()
+    else:
+        counts = {prefix: {kind: 0 for kind in CONTENT_FIELDS} for prefix in ('available', 'done')}
+
+    payload = {
+        'user_id': user.user_id,
+        'tg_id': user.tg_id,
+        'tg_name': user.tg_name,
+        'role': user.role,
+        'contact': UserContactSerializer(contact).data if contact is not None else None,
+        'contact_complete': contact is not None and all(
+            getattr(contact, field) for field in CONTACT_REQUIRED_FIELDS
+        ),
+        'entitlement': EntitlementSerializer(entitlement).data if entitlement is not None else None,
+        'available': get_compact_progress_availability(progress, get_catalog()),
+        'progress': counts,
+    }
+    return Response(payload, status=status.HTTP_200_OK)
+
+
 @csrf_exempt
 @api_view(['POST'])
 def add_user(request):
@@ -115,7 +186,9 @@ def get_topic(request, topic_title):
     """
     logger.info(f"Received topic_title: {topic_title}")
     try:
-        topic = get_object_or_404(Topic, title=topic_title)
+        topic = get_catalog().topic_by_title.get(topic_title)
+        if topic is None:
+            raise Topic.DoesNotExist
         serializer = TopicSerializer(topic, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -147,15 +220,25 @@ def add_user_contact(request):
     )
 
 
+def get_test_payload(catalog, test: Test) -> dict:
+    """
+    Тест с вопросами и ответами в виде ответа API. Сериализуется из каталога
+    (вопросы и ответы загружены заранее) один раз на версию контента и берется из общего кэша.
+    """
+    return get_cached_payload(catalog, 'test', test.test_id, lambda: dict(TestSerializer(test).data))
+
+
 @api_view(['GET'])
 def get_test(request, test_title):
     """Отправляем тест с вопросами и ответами."""
     logger.info(f"Запрос теста: {test_title}")
     try:
-        test = Test.objects.get(title=test_title)
-        serializer = TestSerializer(test)
+        catalog = get_catalog()
+        test = catalog.test_by_title.get(test_title)
+        if test is None:
+            raise Test.DoesNotExist
         logger.info(f"Тест '{test_title}' успешно найден")
-        return Response(serializer.data)
+        return Response(get_test_payload(catalog, test))
     except Test.DoesNotExist:
         logger.error(f"Тест '{test_title}' не найден")
         return Response({"error": f"Тест '{test_title}' не найден"}, status=status.HTTP_404_NOT_FOUND)
@@ -176,6 +259,37 @@ def get_tariffs(request):
     return Response({"error": "No tariff available"}, status=404)
 
 
+@api_view(['GET'])
+def get_content_version_info(request):
+    """Текущая версия контента: бот сверяет ее, чтобы перечитывать каталог только после изменений."""
+    return Response({'version': get_content_version()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_bot_catalog(request):
+    """
+    Каталог для кэша бота одним ответом: темы с уроками, тарифы и названия всего контента
+    вместе с версией контента.
+    Изменение контента или тарифов в админке меняет версию, и бот перечитывает каталог.
+    """
+    catalog = get_catalog()
+    context = {'request': request}
+    topics = []
+    for topic in sorted(catalog.topics.values(), key=by_serial_number):
+        topic_data = TopicSerializer(topic, context=context).data
+        topic_data['lessons'] = LessonSerializer(
+            sorted(catalog.lessons_by_topic[topic.topic_id], key=by_serial_number), many=True, context=context
+        ).data
+        topics.append(topic_data)
+    tariffs = TariffSerializer(Tariff.objects.order_by('tariff_id'), many=True).data
+    # Названия всего контента - по ним бот проверяет нажатые кнопки без запросов к API
+    titles = {kind: sorted({content.title for content in getattr(catalog, kind).values() if content.title})
+              for kind in CONTENT_FIELDS}
+    titles['tariffs'] = sorted({tariff['title'] for tariff in tariffs})
+    return Response({'version': catalog.version, 'topics': topics, 'tariffs': tariffs, 'titles': titles},
+                    status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def get_tariff(request, tariff_title):
     """
@@ -197,9 +311,23 @@ def get_tariff(request, tariff_title):
 @csrf_exempt
 @api_view(['POST'])
 def add_payment(request):
-    """Добавление платежа и обновление роли пользователя."""
+    """
+    Добавление платежа и обновление роли пользователя.
+    Платеж с уже сохраненным external_payment_id (повторное уведомление ЮKassa) не создается повторно.
+    """
     data = request.data
+    external_payment_id = data.get('external_payment_id') or None
     try:
+        if external_payment_id:
+            payment_id = Payment.objects.filter(external_payment_id=external_payment_id).values_list(
+                'payment_id', flat=True
+            ).first()
+            if payment_id is not None:
+                logger.info(f"Платеж ЮKassa {external_payment_id} уже сохранен: {payment_id}")
+                return Response(
+                    {'status': 'true', 'message': 'Payment already exists', 'payment_id': payment_id},
+                    status=status.HTTP_200_OK
+                )
         # Извлекаем объекты
         tariff = Tariff.objects.get(title=data['tariff'])
         user = TelegramUser.objects.get(user_id=data['user'])
@@ -211,16 +339,23 @@ def add_payment(request):
             'access_date_finish': data['access_date_finish'],
             'tariff': tariff.tariff_id,
             'status': data['status'],
-            'service_description': data['service_description']
+            'service_description': data['service_description'],
+            'external_payment_id': external_payment_id,
         }
         serializer = PaymentSerializer(data=payment_info)
         if serializer.is_valid():
-            serializer.save()
-            # Обновляем роль пользователя
-            user.role = 'client'
-            user.save()
+            try:
+                with transaction.atomic():
+                    payment = serializer.save()
+                    # Обновляем роль пользователя
+                    user.role = 'client'
+                    user.save()
+            except IntegrityError:
+                # То же уведомление параллельно сохранено другим запросом
+                return Response({'status': 'true', 'message': 'Payment already exists'}, status=status.HTTP_200_OK)
             return Response(
-                {'status': 'true', 'message': 'Payment created and user role updated'},
+                {'status': 'true', 'message': 'Payment created and user role updated',
+                 'payment_id': payment.payment_id},
                 status=status.HTTP_201_CREATED
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -230,6 +365,84 @@ def add_payment(request):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@csrf_exempt
+@api_view(['POST'])
+def activate_payment_view(request):
+    """
+    Активация оплаты одним запросом: платеж, роль клиента и стартовый контент тарифа
+    сохраняются в одной транзакции (payments.activate_payment).
+    Повторный запрос с тем же external_payment_id возвращает уже сохраненный платеж.
+    """
+    data = request.data
+    try:
+        payment, created = activate_payment(
+            user_id=int(data['user']),
+            tariff_title=data['tariff'],
+            amount=int(Decimal(str(data['amount']))),
+            access_date_start=date.fromisoformat(data['access_date_start']),
+            access_date_finish=date.fromisoformat(data['access_date_finish']),
+            external_payment_id=data.get('external_payment_id'),
+            payment_status=data.get('status', 'completed'),
+            service_description=data.get('service_description'),
+        )
+    except PaymentActivationError as e:
+        return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+    except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+        return Response({'error': f"Некорректные данные платежа: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not created:
+        return Response(
+            {'status': 'true', 'message': 'Payment already exists', 'payment_id': payment.payment_id},
+            status=status.HTTP_200_OK
+        )
+    return Response(
+        {'status': 'true', 'message': 'Payment activated', 'payment_id': payment.payment_id},
+        status=status.HTTP_201_CREATED
+    )
+
+
+def parse_sweep_cursor(after):
+    """Проверяет курсор обхода [окончание периода, user_id]; None - первая пачка."""
+    if after is None:
+        return None
+    if not isinstance(after, list) or len(after) != 2 \
+            or not isinstance(after[1], int) or isinstance(after[1], bool):
+        raise ValueError(f"курсор after должен быть [дата, user_id], получено {after!r}")
+    return [date.fromisoformat(after[0]), after[1]]
+
+
+@csrf_exempt
+@api_view(['POST'])
+def sweep_entitlements_view(request):
+    """
+    Одна пачка обхода Entitlement для задачи бота:
+    kind='expired' - отзыв доступа с окончившимся периодом (уведомлять только тех, у кого он
+    закончился за последние notify_days дней), kind='expiring' - напоминания
+    тем, у кого доступ заканчивается в ближайшие days дней. Курсор next передается в after
+    следующего запроса; next = None - пачка последняя.
+    """
+    data = request.data
+    try:
+        kind = data['kind']
+        after = parse_sweep_cursor(data.get('after'))
+        limit = int(data.get('limit', 1000))
+        if not 1 <= limit <= 5000:
+            raise ValueError(f"limit должен быть от 1 до 5000, получено {limit}")
+        today = timezone.localdate()
+        if kind == 'expired':
+            items, next_after = sweep_expired(today, after, limit,
+                                              int(data.get('notify_days', EXPIRED_NOTIFY_DAYS)))
+        elif kind == 'expiring':
+            items, next_after = sweep_expiring(today, int(data.get('days', 3)), after, limit)
+        else:
+            return Response({'error': f"Неизвестный вид обхода '{kind}'"}, status=status.HTTP_400_BAD_REQUEST)
+    except (KeyError, TypeError, ValueError) as e:
+        return Response({'error': f"Некорректные параметры обхода: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    logger.info(f"Обход Entitlement '{kind}': {len(items)} пользователей")
+    return Response({'items': items, 'next': next_after}, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def get_available_topic(request, telegram_id):
     """
@@ -249,6 +462,344 @@ def get_available_topic(request, telegram_id):
         )
 
 
+@api_view(['GET'])
+def get_available_content(request, telegram_id):
+    """
+    Возвращает доступный пользователю контент в компактном виде (только id и названия).
+    Query-параметры topic_id и lesson_id ограничивают выборку темой или уроком.
+    """
+    logger.info(f"Received telegram_id: {telegram_id}")
+    try:
+        topic_id = request.query_params.get('topic_id')
+        lesson_id = request.query_params.get('lesson_id')
+        topic_id = int(topic_id) if topic_id else None
+        lesson_id = int(lesson_id) if lesson_id else None
+    except ValueError:
+        return Response({'error': "topic_id и lesson_id должны быть числами"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    user_id = get_availability_user_id(telegram_id)
+    if user_id is None:
+        return Response(
+            {"status": "false", "message": f"User with '{telegram_id}' not found"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    availability = get_compact_availability(user_id, topic_id=topic_id, lesson_id=lesson_id)
+    return Response(availability, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_available_lesson_content(request, telegram_id, topic_title, lesson_title, kind):
+    """
+    Возвращает видео, тесты или практики урока (kind), доступные пользователю, одним запросом.
+    """
+    logger.info(f"Запрос доступного контента '{kind}' для {telegram_id}: '{topic_title}' / '{lesson_title}'")
+    try:
+        content = list_available_lesson_content(telegram_id, kind, topic_title, lesson_title)
+        return Response(content, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Ошибка в get_available_lesson_content: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def get_available_lesson_content_by_id(request, telegram_id, lesson_id, kind):
+    """
+    Возвращает видео, тесты или практики урока (kind) по ИД урока, доступные пользователю.
+    """
+    logger.info(f"Запрос доступного контента '{kind}' для {telegram_id}: урок {lesson_id}")
+    try:
+        content = list_available_lesson_content(telegram_id, kind, lesson_id=lesson_id)
+        return Response(content, status=status.HTTP_200_OK)
+    except Exception as e:
+        logger.error(f"Ошибка в get_available_lesson_content_by_id: {str(e)}")
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def get_topic_by_id(request, topic_id):
+    """Возвращает всю информацию по теме по ее ИД."""
+    topic = get_catalog().topics.get(topic_id)
+    if topic is None:
+        return Response({'error': f"Тема с ИД '{topic_id}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
+    serializer = TopicSerializer(topic, context={'request': request})
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_topic_lessons_by_id(request, topic_id):
+    """Возвращает информацию по урокам темы по ИД темы."""
+    catalog = get_catalog()
+    if topic_id not in catalog.topics:
+        return Response({'error': f"Тема с ИД '{topic_id}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
+    serializer = LessonSerializer(catalog.lessons_by_topic[topic_id], many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_lesson_by_id(request, lesson_id):
+    """Возвращает информацию по уроку по его ИД."""
+    lesson = get_catalog().lessons.get(lesson_id)
+    if lesson is None:
+        return Response({'error': f"Урок с ИД '{lesson_id}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+    serializer = LessonSerializer(lesson)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_lesson_content_by_id(request, lesson_id, kind):
+    """Возвращает видео, тесты или практики урока (kind) по ИД урока."""
+    catalog = get_catalog()
+    if lesson_id not in catalog.lessons:
+        return Response({'error': f"Урок с ИД '{lesson_id}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+    serializer_class = {'videos': VideoSerializer, 'tests': TestSerializer, 'practices': PracticeSerializer}[kind]
+    content = getattr(catalog, f'{kind}_by_lesson')[lesson_id]
+    serializer = serializer_class(content, many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_video_by_id(request, video_id):
+    """Возвращает видео и его конспект по ИД видео."""
+    video = get_catalog().videos.get(video_id)
+    if video is None:
+        return Response({'error': f"Видео с ИД '{video_id}' не найдено"}, status=status.HTTP_404_NOT_FOUND)
+    serializer = VideoSerializer(video)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_test_by_id(request, test_id):
+    """Отправляем тест с вопросами и ответами по ИД теста."""
+    catalog = get_catalog()
+    test = catalog.tests.get(test_id)
+    if test is None:
+        logger.error(f"Тест с ИД '{test_id}' не найден")
+        return Response({"error": f"Тест с ИД '{test_id}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(get_test_payload(catalog, test), status=status.HTTP_200_OK)
+
+
+def get_test_questions_payload(catalog, test: Test) -> list:
+    """Вопросы теста с вариантами ответов без метки правильности (из общего кэша)."""
+    def build():
+        return [
+            {**question, 'answers': [
+                {key: value for key, value in answer.items() if key != 'right'}
+                for answer in question['answers']
+            ]}
+            for question in get_test_payload(catalog, test)['questions']
+        ]
+
+    return get_cached_payload(catalog, 'test_questions', test.test_id, build)
+
+
+def get_open_attempt(attempt_id: int):
+    """Попытка для приема ответов: только поля, нужные для проверки."""
+    return TestAttempt.objects.only('attempt_id', 'test_id', 'finished_at', 'questions_total').get(
+        attempt_id=attempt_id
+    )
+
+
+@csrf_exempt
+@api_view(['POST'])
+def start_test_attempt(request):
+    """
+    Начинает попытку прохождения теста. Тест задается test_id или test_title.
+    Возвращает ИД попытки и вопросы без правильных ответов - проверка ответов выполняется на сервере.
+    """
+    telegram_id = request.data.get('telegram_id')
+    test_id = request.data.get('test_id')
+    test_title = request.data.get('test_title')
+    logger.info(f"Начало попытки теста: telegram_id={telegram_id}, test_id={test_id}, test_title={test_title}")
+
+    user_id = TelegramUser.objects.filter(tg_id=telegram_id).values_list('user_id', flat=True).first()
+    if user_id is None:
+        return Response({'error': f"Пользователь '{telegram_id}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+
+    catalog = get_catalog()
+    try:
+        test = catalog.tests.get(int(test_id)) if test_id else catalog.test_by_title.get(test_title)
+    except (TypeError, ValueError):
+        return Response({'error': "test_id должен быть числом"}, status=status.HTTP_400_BAD_REQUEST)
+    if test is None:
+        return Response({'error': f"Тест '{test_id or test_title}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+
+    answer_key = catalog.answer_keys[test.test_id]
+    if not answer_key.question_ids:
+        return Response({'error': f"В тесте '{test.title}' нет вопросов"}, status=status.HTTP_400_BAD_REQUEST)
+
+    attempt = start_attempt(user_id, answer_key)
+    return Response({
+        'attempt_id': attempt.attempt_id,
+        'test_id': test.test_id,
+        'title': test.title,
+        'show_right_answer': test.show_right_answer,
+        'questions_total': attempt.questions_total,
+        'questions': get_test_questions_payload(catalog, test),
+    }, status=status.HTTP_201_CREATED)
+
+
+def answer_results(catalog, attempt, answers: list) -> Response:
+    """Проверяет и сохраняет ответы попытки, к каждому результату добавляет следующий вопрос."""
+    answer_key = catalog.answer_keys.get(attempt.test_id)
+    if answer_key is None:
+        return Response({'error': f"Тест '{attempt.test_id}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        parsed = [(int(answer['question_id']), parse_selected(answer.get('answer')))
+                  for answer in answers]
+        results = submit_answers(attempt, answer_key, parsed)
+    except (KeyError, TypeError, ValueError):
+        return Response({'error': "Каждый ответ должен содержать question_id и answer"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except AttemptConflictError as e:
+        # Повтор ответа не поможет: бот должен завершить или начать попытку заново
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    except AttemptError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    questions = get_test_questions_payload(catalog, catalog.tests[attempt.test_id])
+    for result in results:
+        next_question_id = result.pop('next_question_id')
+        result['next_question'] = (questions[answer_key.position[next_question_id]]
+                                   if next_question_id is not None else None)
+    return Response({'attempt_id': attempt.attempt_id, 'results': results}, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['POST'])
+def answer_test_attempt(request, attempt_id):
+    """
+    Принимает ответ на один вопрос попытки: {"question_id": 1, "answer": "1,2"}.
+    Возвращает правильность ответа, правильные ответы (если тест их показывает) и следующий вопрос.
+    400 - неверный формат ответа, 409 - попытка завершена или вопрос не из ее теста.
+    """
+    try:
+        attempt = get_open_attempt(attempt_id)
+    except TestAttempt.DoesNotExist:
+        return Response({'error': f"Попытка '{attempt_id}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = answer_results(get_catalog(), attempt, [request.data])
+    if response.status_code == status.HTTP_200_OK:
+        response.data = {'attempt_id': attempt.attempt_id, **response.data['results'][0]}
+    return response
+
+
+@csrf_exempt
+@api_view(['POST'])
+def answer_test_attempt_batch(request, attempt_id):
+    """Принимает ответы на несколько вопросов попытки: {"answers": [{"question_id": 1, "answer": [1, 2]}, ...]}."""
+    answers = request.data.get('answers')
+    if not isinstance(answers, list):
+        return Response({'error': "answers должен быть списком"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        attempt = get_open_attempt(attempt_id)
+    except TestAttempt.DoesNotExist:
+        return Response({'error': f"Попытка '{attempt_id}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+    return answer_results(get_catalog(), attempt, answers)
+
+
+@csrf_exempt
+@api_view(['POST'])
+def finish_test_attempt(request, attempt_id):
+    """
+    Завершает попытку: подсчитывает правильные ответы, процент и признак прохождения теста.
+    Если тест пройден клиентом или администратором, открывает следующий контент (unlock_after_test)
+    и возвращает его в unlock; иначе unlock = None.
+    """
+    try:
+        attempt = finish_attempt(TestAttempt.objects.select_related('user').get(attempt_id=attempt_id))
+    except TestAttempt.DoesNotExist:
+        return Response({'error': f"Попытка '{attempt_id}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
+
+    logger.info(f"Попытка {attempt.attempt_id} завершена: {attempt.percentage}%, пройден - {attempt.passed}")
+    unlock = None
+    if attempt.passed and attempt.user.role in ('admin', 'client'):
+        progression = get_catalog().progression
+        test = progression.catalog.tests.get(attempt.test_id)
+        if test is not None:
+            unlock = unlock_after_test(attempt.user, test, progression)
+    return Response({
+        'attempt_id': attempt.attempt_id,
+        'test_id': attempt.test_id,
+        'questions_total': attempt.questions_total,
+        'correct_answers': attempt.correct_answers,
+        'percentage': attempt.percentage,
+        'passed': attempt.passed,
+        'pass_percentage': PASS_PERCENTAGE,
+        'unlock': unlock,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_test_attempts(request, telegram_id):
+    """
+    История попыток прохождения тестов пользователя, новые первыми.
+    Query-параметры: test_id - только попытки одного теста, limit - количество (1-100, по умолчанию 20).
+    """
+    try:
+        test_id = request.query_params.get('test_id')
+        test_id = int(test_id) if test_id else None
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        return Response({'error': "test_id и limit должны быть числами"}, status=status.HTTP_400_BAD_REQUEST)
+
+    attempts = TestAttempt.objects.filter(user__tg_id=telegram_id)
+    if test_id is not None:
+        attempts = attempts.filter(test_id=test_id)
+    attempts = attempts.order_by('-started_at').values(
+        'attempt_id', 'test_id', 'started_at', 'finished_at',
+        'questions_total', 'correct_answers', 'percentage', 'passed'
+    )[:limit]
+    return Response(list(attempts), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def get_telegram_file(request):
+    """
+    Возвращает file_id файла из media, уже загруженного в Telegram.
+    Query-параметры: url - ссылка на файл, kind - 'photo' или 'document'.
+    """
+    media_path = get_media_path(request.query_params.get('url', ''))
+    kind = request.query_params.get('kind', 'photo')
+    if media_path is None:
+        return Response({'error': "url должен указывать на файл в media"}, status=status.HTTP_400_BAD_REQUEST)
+
+    file_id = get_file_id(media_path, kind)
+    if file_id is None:
+        return Response({'error': f"Файл '{media_path}' еще не загружен в Telegram"},
+                        status=status.HTTP_404_NOT_FOUND)
+    return Response({'media_path': media_path, 'kind': kind, 'file_id': file_id}, status=status.HTTP_200_OK)
+
+
+@csrf_exempt
+@api_view(['POST'])
+def add_telegram_file(request):
+    """Сохраняет file_id, полученный ботом после первой загрузки файла из media в Telegram."""
+    media_path = get_media_path(request.data.get('url', ''))
+    kind = request.data.get('kind')
+    file_id = request.data.get('file_id')
+    if media_path is None or kind not in dict(TelegramFileCache.KIND_CHOICES) or not file_id:
+        return Response({'error': "Нужны url файла в media, kind ('photo' или 'document') и file_id"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if not save_file_id(media_path, kind, file_id):
+        return Response({'error': f"Файл '{media_path}' не найден"}, status=status.HTTP_404_NOT_FOUND)
+    logger.info(f"Сохранен file_id для {kind} '{media_path}'")
+    return Response({'media_path': media_path, 'kind': kind, 'file_id': file_id}, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+def get_practice_by_id(request, practice_id):
+    """Возвращает файл практики по ИД практики."""
+    practice = get_catalog().practices.get(practice_id)
+    if practice is None:
+        return Response({'error': f"Практическое задание с ИД '{practice_id}' не найдено"},
+                        status=status.HTTP_404_NOT_FOUND)
+    serializer = PracticeSerializer(practice)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 def get_topic_lessons(request, topic_title):
     """
@@ -256,7 +807,7 @@ def get_topic_lessons(request, topic_title):
     """
     logger.info(f"Received topic_title: {topic_title}")
     try:
-        lessons = Lesson.objects.filter(topic__title=topic_title)
+        lessons = get_catalog().get_topic_lessons(topic_title)
         serializer = LessonSerializer(lessons,  many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Exception as e:
@@ -275,8 +826,13 @@ def get_available_lesson(request, topic_title, lesson_title):
     logger.info(f"Received topic_title: {topic_title}")
     logger.info(f"Received lesson_title: {lesson_title}")
     try:
-        topic = Topic.objects.get(title=topic_title)
-        lesson = Lesson.objects.get(title=lesson_title, topic=topic)
+        catalog = get_catalog()
+        topic = catalog.topic_by_title.get(topic_title)
+        if topic is None:
+            raise Topic.DoesNotExist
+        lesson = catalog.lesson_by_topic_title.get((topic.topic_id, lesson_title))
+        if lesson is None:
+            raise Lesson.DoesNotExist
         serializer = LessonSerializer(lesson)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Topic.DoesNotExist:
@@ -304,9 +860,14 @@ def get_lesson_video(request, topic_title, lesson_title):
     logger.info(f"Received topic_title: {topic_title}")
     logger.info(f"Received lesson_title: {lesson_title}")
     try:
-        topic = Topic.objects.get(title=topic_title)
-        lesson = Lesson.objects.get(title=lesson_title, topic=topic)
-        video = Video.objects.filter(lesson=lesson.lesson_id)
+        catalog = get_catalog()
+        topic = catalog.topic_by_title.get(topic_title)
+        if topic is None:
+            raise Topic.DoesNotExist
+        lesson = catalog.lesson_by_topic_title.get((topic.topic_id, lesson_title))
+        if lesson is None:
+            raise Lesson.DoesNotExist
+        video = catalog.videos_by_lesson[lesson.lesson_id]
         serializer = VideoSerializer(video, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Topic.DoesNotExist:
@@ -326,8 +887,13 @@ def get_video_info(request, lesson_title, video_title):
     logger.info(f"Received video_title: {video_title}")
     logger.info(f"Received lesson_title: {lesson_title}")
     try:
-        lesson = Lesson.objects.get(title=lesson_title)
-        video = Video.objects.get(title=video_title, lesson=lesson.lesson_id)
+        catalog = get_catalog()
+        lesson = catalog.lesson_by_title.get(lesson_title)
+        if lesson is None:
+            raise Lesson.DoesNotExist
+        video = catalog.video_by_lesson_title.get((lesson.lesson_id, video_title))
+        if video is None:
+            raise Video.DoesNotExist
         serializer = VideoSerializer(video)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Lesson.DoesNotExist:
@@ -351,7 +917,9 @@ def get_videos(request):
 def get_video_question(request, video_id):
     """Возвращает контрольный вопрос для видео."""
     try:
-        question_for_video = Question.objects.get(video__video_id=video_id)
+        question_for_video = get_catalog().video_question.get(video_id)
+        if question_for_video is None:
+            raise Question.DoesNotExist
         serializer = QuestionSerializer(question_for_video)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Question.DoesNotExist:
@@ -367,12 +935,17 @@ def get_lesson_tests(request, topic_title, lesson_title):
     """
     logger.info(f"Запрос тестов для темы '{topic_title}', урока '{lesson_title}'")
     try:
-        topic = Topic.objects.get(title=topic_title)
-        lesson = Lesson.objects.get(title=lesson_title, topic=topic)
-        tests = Test.objects.filter(lesson=lesson.lesson_id)
-        logger.info(f"Найдено тестов: {tests.count()}")
-
-        if not tests.exists():
+        catalog = get_catalog()
+        topic = catalog.topic_by_title.get(topic_title)
+        if topic is None:
+            raise Topic.DoesNotExist
+        lesson = catalog.lesson_by_topic_title.get((topic.topic_id, lesson_title))
+        if lesson is None:
+            raise Lesson.DoesNotExist
+        tests = catalog.tests_by_lesson[lesson.lesson_id]
+        logger.info(f"Найдено тестов: {len(tests)}")
+
+        if not tests:
             logger.info(f"Тесты для урока '{lesson_title}' не найдены")
             return Response(
                 {'status': 'success', 'data': [], 'message': 'Тесты отсутствуют'},
@@ -405,6 +978,9 @@ def get_tests(request):
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+CONTENT_FIELDS = ('topics', 'lessons', 'videos', 'tests', 'practices')
+
+
 def add_new_content(user_availability: 'UserAvailability',
                     topics: set = None,
                     lessons: set = None,
@@ -414,40 +990,22 @@ def add_new_content(user_availability: 'UserAvailability',
     """
     Добавляет новый контент в UserAvailability, избегая дубликатов.
 
+    Каждый вид контента записывается одной идемпотентной вставкой в промежуточную таблицу,
+    все вставки выполняются в одной транзакции.
+
     Args:
         user_availability: Объект UserAvailability, куда добавляется контент.
         topics, lessons, videos, tests, practices: Наборы объектов для добавления (опционально).
     """
-    # Получаем текущие доступные объекты пользователя
-    current_topics = set(user_availability.topics.all())
-    current_lessons = set(user_availability.lessons.all())
-    current_videos = set(user_availability.videos.all())
-    current_tests = set(user_availability.tests.all())
-    current_practices = set(user_availability.practices.all())
-
-    # Проверяем и добавляем только новые объекты
-    if topics:
-        new_topics = topics - current_topics
-        if new_topics:
-            user_availability.topics.add(*new_topics)
-    if lessons:
-        new_lessons = lessons - current_lessons
-        if new_lessons:
-            user_availability.lessons.add(*new_lessons)
-    if videos:
-        new_videos = videos - current_videos
-        if new_videos:
-            user_availability.videos.add(*new_videos)
-    if tests:
-        new_tests = tests - current_tests
-        if new_tests:
-            user_availability.tests.add(*new_tests)
-    if practices:
-        new_practices = practices - current_practices
-        if new_practices:
-            user_availability.practices.add(*new_practices)
-    # Сохраняем изменения
-    user_availability.save()
+    content = {
+        field_name: {obj.pk for obj in objects or ()}
+        for field_name, objects in zip(CONTENT_FIELDS, (topics, lessons, videos, tests, practices))
+    }
+    with transaction.atomic():
+        for field_name, content_ids in content.items():
+            bulk_add_related(user_availability, field_name, content_ids)
+        # Двойная запись в компактный прогресс на время переноса с ManyToMany
+        merge_progress(user_availability.pk, 'available', content)
 
 
 def add_done_content(user_done: 'UserDone',
@@ -459,139 +1017,42 @@ def add_done_content(user_done: 'UserDone',
     """
     Добавляет выполненный контент в UserDone, избегая дубликатов.
 
+    Для открывшихся тем и уроков выполненными считаются предыдущие по serial_number
+    (для темы - еще и ее последний урок); они берутся из графа прохождения без запросов в БД.
+    Запись - идемпотентные вставки в одной транзакции.
+
     Args:
         user_done: Объект UserDone, куда добавляется контент.
         topics, lessons, videos, tests, practices: Наборы объектов для добавления (опционально).
     """
-    # Получаем текущие выполненные объекты пользователя
-    current_topics = set(user_done.topics.all())
-    current_lessons = set(user_done.lessons.all())
-    current_videos = set(user_done.videos.all())
-    current_tests = set(user_done.tests.all())
-    current_practices = set(user_done.practices.all())
-    # Проверяем и добавляем только новые объекты
+    progression = get_catalog().progression
+    done_topics = set()
+    done_lessons = set()
     # Логика для тем и уроков - добавляем предыдущий по serial_number
-    if topics:
-        for topic in topics:
-            done_topic_serial_number = int(topic.serial_number) - 1
-            if done_topic_serial_number > 0:
-                done_topic = Topic.objects.filter(serial_number=done_topic_serial_number).first()
-                if done_topic and done_topic not in current_topics:
-                    user_done.topics.add(done_topic)
-                    lesson_done = Lesson.objects.filter(topic=done_topic).last()
-                    user_done.lessons.add(lesson_done)
-
-    if lessons:
-        for lesson in lessons:
-            done_lesson_serial_number = int(lesson.serial_number) - 1
-            if done_lesson_serial_number > 0:
-                done_lesson = Lesson.objects.filter(serial_number=done_lesson_serial_number).first()
-                if done_lesson and done_lesson not in current_lessons:
-                    user_done.lessons.add(done_lesson)
+    for topic in topics or ():
+        done_topic = progression.previous_topic.get(topic.topic_id)
+        if done_topic:
+            done_topics.add(done_topic.topic_id)
+            lesson_done = progression.last_lesson.get(done_topic.topic_id)
+            if lesson_done:
+                done_lessons.add(lesson_done.lesson_id)
+    for lesson in lessons or ():
+        done_lesson = progression.previous_lesson.get(lesson.lesson_id)
+        if done_lesson:
+            done_lessons.add(done_lesson.lesson_id)
 
     # Логика для видео, тестов и практик - добавляем переданные объекты
-    if videos:
-        new_done_videos = videos - current_videos
-        if new_done_videos:
-            user_done.videos.add(*new_done_videos)
-    if tests:
-        new_done_tests = tests - current_tests
-        if new_done_tests:
-            user_done.tests.add(*new_done_tests)
-    if practices:
-        new_done_practices = practices - current_practices
-        if new_done_practices:
-            user_done.practices.add(*new_done_practices)
-
-
-def get_serial_numbers(content):
-    """Возвращает последовательность получаемых объектов."""
-    hasattr(content, 'serial_number') and content.serial_number is not None
-    return content.serial_number
-
-
-def get_next_step(topics: set = None,
-                  lessons: set = None,
-                  videos: set = None,
-                  tests: set = None,
-                  practices: set = None) -> tuple[str, dict]:
-    """
-    Определяем следующий шаг после просмотра видео
-
-    Args:
-        topics, lessons, videos, tests, practices: Наборы объектов доступных после просмотра видео (опционально).
-    """
-    logger.info(f"get_next_step called with: topics={len(topics or [])}, lessons={len(lessons or [])}, "
-                f"videos={len(videos or [])}, tests={len(tests or [])}, practices={len(practices or [])}")
-
-    # Проверяем, что доступно после видео
-    if topics:
-        next_topic = min(topics, key=get_serial_numbers)
-        next_step = 'topic'
-        next_step_params = {'topic_title': next_topic.title}
-    elif lessons:
-        next_lesson = min(lessons, key=get_serial_numbers)
-        next_step = 'lesson'
-        try:
-            topic = Topic.objects.get(lessons__title=next_lesson.title)
-        except Lesson.DoesNotExist:
-            logger.error(f"Lesson '{next_lesson.title}' not found in Topic")
-            return '', {}
-        next_step_params = {'lesson_title': next_lesson.title,
-                            'topic_title': topic.title}
-    elif videos:
-        next_video = min(videos, key=get_serial_numbers)
-        next_step = 'video'
-        try:
-            lesson = Lesson.objects.get(videos__title=next_video.title)
-        except Lesson.DoesNotExist:
-            logger.error(f"Lesson for video '{next_video.title}' not found")
-            return '', {}
-        next_step_params = {'video_title': next_video.title,
-                            'lesson_title': lesson.title}
-    elif tests:
-        next_test = list(tests)[0]
-        next_step = 'test'
-        next_step_params = {'test_title': next_test.title}
-
-    elif practices:
-        next_practice = list(practices)[0]
-        next_step = 'practice'
-        try:
-            lesson = Lesson.objects.get(practices__title=next_practice.title)
-        except Lesson.DoesNotExist:
-            logger.error(f"Lesson for practice '{next_practice.title}' not found")
-            return '', {}
-        next_step_params = {'practice_title': next_practice.title,
-                            'lesson_title': lesson.title}
-    else:
-        logger.warning("No next step or content found")
-        next_step = None
-        next_step_params = {}
-
-    return next_step, next_step_params
-
-
-@api_view(['GET'])
-def get_lesson_video(request, topic_title, lesson_title):
-    """
-    Возвращает информацию по видео в выбранном уроке.
-    """
-    logger.info(f"Received topic_title: {topic_title}")
-    logger.info(f"Received lesson_title: {lesson_title}")
-    try:
-        topic = Topic.objects.get(title=topic_title)
-        lesson = Lesson.objects.get(title=lesson_title, topic=topic)
-        video = Video.objects.filter(lesson=lesson.lesson_id)
-        serializer = VideoSerializer(video, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    except Topic.DoesNotExist:
-        return Response({'error': f"Тема '{topic_title}' не найдена"}, status=status.HTTP_404_NOT_FOUND)
-    except Lesson.DoesNotExist:
-        return Response({'error': f"Урок '{lesson_title}' не найден в теме '{topic_title}'"},
-                        status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    done_content = {
+        'topics': done_topics,
+        'lessons': done_lessons,
+        'videos': {video.pk for video in videos or ()},
+        'tests': {test.pk for test in tests or ()},
+        'practices': {practice.pk for practice in practices or ()},
+    }
+    with transaction.atomic():
+        for field_name, content_ids in done_content.items():
+            bulk_add_related(user_done, field_name, content_ids)
+        merge_progress(user_done.pk, 'done', done_content)
 
 
 @csrf_exempt
@@ -600,27 +1061,11 @@ def add_start_content(request):
     """Добавление стартового контента пользователю, избегая дубликатов."""
     data = request.data
     try:
-        # Извлекаем объекты
-        start_availability = StartUserAvailability.objects.get(tariff__title=data['tariff'])
-        user = TelegramUser.objects.get(user_id=data['user'])
-        user_availability, created = UserAvailability.objects.get_or_create(user=user)
-
-        # Получаем стартовые объекты
-        start_topics = set(start_availability.topics.all())
-        start_lessons = set(start_availability.lessons.all())
-        start_videos = set(start_availability.videos.all())
-        start_tests = set(start_availability.tests.all())
-        start_practices = set(start_availability.practices.all())
-
-        # Добавляем новый контент через универсальную функцию
-        add_new_content(
-            user_availability=user_availability,
-            topics=start_topics,
-            lessons=start_lessons,
-            videos=start_videos,
-            tests=start_tests,
-            practices=start_practices
-        )
+        if not TelegramUser.objects.filter(user_id=data['user']).exists():
+            raise TelegramUser.DoesNotExist
+        with transaction.atomic():
+            if not grant_start_content(data['user'], data['tariff']):
+                raise StartUserAvailability.DoesNotExist
 
         return Response(
             {'status': 'true', 'message': 'Start content added successfully'},
@@ -642,41 +1087,47 @@ def add_content_after_video(request):
     """Добавление контента пользователю после просмотра видео."""
     data = request.data
     try:
-        video = Video.objects.get(video_id=data['video_id'])
+        progression = get_catalog().progression
+        video = progression.catalog.videos.get(int(data['video_id']))
+        if video is None:
+            raise Video.DoesNotExist
         user = TelegramUser.objects.get(user_id=data['user_id'])
         user_availability, created = UserAvailability.objects.get_or_create(user=user)
         # Получаем объекты, которые открываются после просмотра видео
-        next_topics = set(video.next_topics.all())
-        next_lessons = set(video.next_lessons.all())
-        next_videos = set(video.next_videos.all())
-        next_tests = set(video.next_tests.all())
-        next_practices = set(video.next_practices.all())
-
-        # Добавляем новый контент
-        add_new_content(
-            user_availability=user_availability,
-            topics=next_topics,
-            lessons=next_lessons,
-            videos=next_videos,
-            tests=next_tests,
-            practices=next_practices
-        )
+        unlocks = progression.get_unlocks('video', video.video_id)
+        next_topics = set(unlocks.topics)
+        next_lessons = set(unlocks.lessons)
+        next_videos = set(unlocks.videos)
+        next_tests = set(unlocks.tests)
+        next_practices = set(unlocks.practices)
+
+        # Открытие нового и отметка выполненного контента - одной транзакцией
+        with transaction.atomic():
+            # Добавляем новый контент
+            add_new_content(
+                user_availability=user_availability,
+                topics=next_topics,
+                lessons=next_lessons,
+                videos=next_videos,
+                tests=next_tests,
+                practices=next_practices
+            )
 
-        # Добавляем выполненный пользователем контент
-        user_done, created = UserDone.objects.get_or_create(user=user)
-        add_done_content(
-            user_done=user_done,
-            topics=next_topics,
-            lessons=next_lessons,
-            videos={video},
-        )
+            # Добавляем выполненный пользователем контент
+            user_done, created = UserDone.objects.get_or_create(user=user)
+            add_done_content(
+                user_done=user_done,
+                topics=next_topics,
+                lessons=next_lessons,
+                videos={video},
+            )
 
         # Формируем имена для ответа
-        next_topics_name = [next_topic.title for next_topic in next_topics] or ["Нет новых тем"]
-        next_lessons_name = [next_lesson.title for next_lesson in next_lessons] or ["Нет новых уроков"]
-        next_videos_name = [next_video.title for next_video in next_videos] or ["Нет новых видео"]
-        next_tests_name = [next_test.title for next_test in next_tests] or ["Нет новых тестов"]
-        next_practices_name = [next_practice.title for next_practice in next_practices] or ["Нет новых практик"]
+        next_topics_name = [next_topic.title for next_topic in unlocks.topics] or ["Нет новых тем"]
+        next_lessons_name = [next_lesson.title for next_lesson in unlocks.lessons] or ["Нет новых уроков"]
+        next_videos_name = [next_video.title for next_video in unlocks.videos] or ["Нет новых видео"]
+        next_tests_name = [next_test.title for next_test in unlocks.tests] or ["Нет новых тестов"]
+        next_practices_name = [next_practice.title for next_practice in unlocks.practices] or ["Нет новых практик"]
         next_content = {
             "next_topics_name": next_topics_name,
             "next_lessons_name": next_lessons_name,
@@ -684,11 +1135,7 @@ def add_content_after_video(request):
             "next_tests_name": next_tests_name,
             "next_practices_name": next_practices_name,
         }
-        next_step, next_step_params = get_next_step(topics=next_topics,
-                                                    lessons=next_lessons,
-                                                    videos=next_videos,
-                                                    tests=next_tests,
-                                                    practices=next_practices)
+        next_step, next_step_params = progression.get_next_step(unlocks)
         if not next_step and not any([next_topics, next_lessons, next_videos, next_tests, next_practices]):
             logger.warning(f"No next step or content found for video_id={data['video_id']}")
             return Response(
@@ -715,23 +1162,23 @@ def add_content_after_video(request):
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@csrf_exempt
-@api_view(['POST'])
-def add_content_after_test(request):
-    """Добавление контента пользователю после успешного прохождения теста."""
-    data = request.data
-    try:
-        test = Test.objects.get(test_id=data['test_id'])
-        user = TelegramUser.objects.get(user_id=data['user_id'])
-        user_availability, created = UserAvailability.objects.get_or_create(user=user)
-
-        # Получаем объекты, которые открываются после прохождения теста
-        next_topics = set(test.next_topics.all())
-        next_lessons = set(test.next_lessons.all())
-        next_videos = set(test.next_videos.all())
-        next_tests = set(test.next_tests.all())
-        next_practices = set(test.next_practices.all())
-
+def unlock_after_test(user: TelegramUser, test, progression) -> dict:
+    """
+    Открывает пользователю контент, следующий за пройденным тестом, и отмечает тест выполненным.
+    Повторный вызов ничего не меняет. Возвращает названия открытого контента и следующий шаг.
+    """
+    user_availability, created = UserAvailability.objects.get_or_create(user=user)
+
+    # Получаем объекты, которые открываются после прохождения теста
+    unlocks = progression.get_unlocks('test', test.test_id)
+    next_topics = set(unlocks.topics)
+    next_lessons = set(unlocks.lessons)
+    next_videos = set(unlocks.videos)
+    next_tests = set(unlocks.tests)
+    next_practices = set(unlocks.practices)
+
+    # Открытие нового и отметка выполненного контента - одной транзакцией
+    with transaction.atomic():
         # Добавляем новый контент
         add_new_content(
             user_availability=user_availability,
@@ -750,42 +1197,55 @@ def add_content_after_test(request):
             tests={test},
         )
 
-        # Формируем имена для ответа
-        next_topics_name = [next_topic.title for next_topic in next_topics] or ["Нет новых тем"]
-        next_lessons_name = [next_lesson.title for next_lesson in next_lessons] or ["Нет новых уроков"]
-        next_videos_name = [next_video.title for next_video in next_videos] or ["Нет новых видео"]
-        next_tests_name = [next_test.title for next_test in next_tests] or ["Нет новых тестов"]
-        next_practices_name = [next_practice.title for next_practice in next_practices] or ["Нет новых практик"]
+    # Формируем имена для ответа
+    next_topics_name = [next_topic.title for next_topic in unlocks.topics] or ["Нет новых тем"]
+    next_lessons_name = [next_lesson.title for next_lesson in unlocks.lessons] or ["Нет новых уроков"]
+    next_videos_name = [next_video.title for next_video in unlocks.videos] or ["Нет новых видео"]
+    next_tests_name = [next_test.title for next_test in unlocks.tests] or ["Нет новых тестов"]
+    next_practices_name = [next_practice.title for next_practice in unlocks.practices] or ["Нет новых практик"]
+
+    next_content = {
+        "next_topics_name": next_topics_name,
+        "next_lessons_name": next_lessons_name,
+        "next_videos_name": next_videos_name,
+        "next_tests_name": next_tests_name,
+        "next_practices_name": next_practices_name,
+    }
+    next_step, next_step_params = progression.get_next_step(unlocks)
+    if not next_step and not any([next_topics, next_lessons, next_videos, next_tests, next_practices]):
+        logger.warning(f"No next step or content found for test_id={test.test_id}")
+        return {'status': 'false', 'message': 'Нет доступного следующего контента', "next_content": next_content}
+
+    return {
+        'status': 'true',
+        'message': 'Content added after test',
+        "next_content": next_content,
+        "next_step": next_step,
+        "next_step_params": next_step_params
+    }
 
-        next_content = {
-            "next_topics_name": next_topics_name,
-            "next_lessons_name": next_lessons_name,
-            "next_videos_name": next_videos_name,
-            "next_tests_name": next_tests_name,
-            "next_practices_name": next_practices_name,
-        }
-        next_step, next_step_params = get_next_step(topics=next_topics,
-                                                    lessons=next_lessons,
-                                                    videos=next_videos,
-                                                    tests=next_tests,
-                                                    practices=next_practices)
-        if not next_step and not any([next_topics, next_lessons, next_videos, next_tests, next_practices]):
-            logger.warning(f"No next step or content found for video_id={data['video_id']}")
-            return Response(
-                {'status': 'false', 'message': 'Нет доступного следующего контента', "next_content": next_content},
-                status=status.HTTP_200_OK
-            )
 
-        return Response(
-            {
-                'status': 'true',
-                'message': 'Content added after test',
-                "next_content": next_content,
-                "next_step": next_step,
-                "next_step_params": next_step_params
-            },
-            status=status.HTTP_201_CREATED
-        )
+@csrf_exempt
+@api_view(['POST'])
+def add_content_after_test(request):
+    """
+    Добавление контента пользователю после успешного прохождения теста.
+    Контент открывается, только если у пользователя есть завершенная пройденная попытка этого теста.
+    Бот получает открытый контент в ответе test_attempt/<id>/finish/, этот эндпоинт - для повторного открытия.
+    """
+    data = request.data
+    try:
+        progression = get_catalog().progression
+        test = progression.catalog.tests.get(int(data['test_id']))
+        if test is None:
+            raise Test.DoesNotExist
+        user = TelegramUser.objects.get(user_id=data['user_id'])
+        if not TestAttempt.objects.filter(user=user, test_id=test.test_id, passed=True).exists():
+            return Response({'error': f"Тест '{test.title}' не пройден пользователем '{user.user_id}'"},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        payload = unlock_after_test(user, test, progression)
+        return Response(payload, status=status.HTTP_201_CREATED if payload['status'] == 'true' else status.HTTP_200_OK)
     except Test.DoesNotExist:
         return Response({'error': f"Тест с ID '{data['test_id']}' не найден"},
                         status=status.HTTP_404_NOT_FOUND)
@@ -825,12 +1285,17 @@ def get_lesson_practices(request, topic_title, lesson_title):
     """
     logger.info(f"Запрос практик для темы '{topic_title}', урока '{lesson_title}'")
     try:
-        topic = Topic.objects.get(title=topic_title)
-        lesson = Lesson.objects.get(title=lesson_title, topic=topic)
-        practices = Practice.objects.filter(lesson=lesson.lesson_id)
-        logger.info(f"Найдено тестов: {practices.count()}")
-
-        if not practices.exists():
+        catalog = get_catalog()
+        topic = catalog.topic_by_title.get(topic_title)
+        if topic is None:
+            raise Topic.DoesNotExist
+        lesson = catalog.lesson_by_topic_title.get((topic.topic_id, lesson_title))
+        if lesson is None:
+            raise Lesson.DoesNotExist
+        practices = catalog.practices_by_lesson[lesson.lesson_id]
+        logger.info(f"Найдено тестов: {len(practices)}")
+
+        if not practices:
             logger.info(f"Практические задания для урока '{lesson_title}' не найдены")
             return Response(
                 {'status': 'success', 'data': [], 'message': 'Тесты отсутствуют'},
@@ -863,8 +1328,13 @@ def get_practice_info(request, lesson_title, practice_title):
     logger.info(f"Received video_title: {practice_title}")
     logger.info(f"Received lesson_title: {lesson_title}")
     try:
-        lesson = Lesson.objects.get(title=lesson_title)
-        practice = Practice.objects.get(title=practice_title, lesson=lesson.lesson_id)
+        catalog = get_catalog()
+        lesson = catalog.lesson_by_title.get(lesson_title)
+        if lesson is None:
+            raise Lesson.DoesNotExist
+        practice = catalog.practice_by_lesson_title.get((lesson.lesson_id, practice_title))
+        if practice is None:
+            raise Practice.DoesNotExist
         serializer = PracticeSerializer(practice)
         return Response(serializer.data, status=status.HTTP_200_OK)
     except Lesson.DoesNotExist:
@@ -890,41 +1360,47 @@ def add_content_after_practice(request):
     """Добавление контента пользователю после успешного прохождения практики."""
     data = request.data
     try:
-        practice = Practice.objects.get(practice_id=data['practice_id'])
+        progression = get_catalog().progression
+        practice = progression.catalog.practices.get(int(data['practice_id']))
+        if practice is None:
+            raise Practice.DoesNotExist
         user = TelegramUser.objects.get(tg_id=data['telegram_id'])
         user_availability, created = UserAvailability.objects.get_or_create(user=user)
 
         # Получаем объекты, которые открываются после прохождения теста
-        next_topics = set(practice.next_topics.all())
-        next_lessons = set(practice.next_lessons.all())
-        next_videos = set(practice.next_videos.all())
-        next_tests = set(practice.next_tests.all())
-        next_practices = set(practice.next_practices.all())
-
-        # Добавляем новый контент
-        add_new_content(
-            user_availability=user_availability,
-            topics=next_topics,
-            lessons=next_lessons,
-            videos=next_videos,
-            tests=next_tests,
-            practices=next_practices
-        )
+        unlocks = progression.get_unlocks('practice', practice.practice_id)
+        next_topics = set(unlocks.topics)
+        next_lessons = set(unlocks.lessons)
+        next_videos = set(unlocks.videos)
+        next_tests = set(unlocks.tests)
+        next_practices = set(unlocks.practices)
+
+        # Открытие нового и отметка выполненного контента - одной транзакцией
+        with transaction.atomic():
+            # Добавляем новый контент
+            add_new_content(
+                user_availability=user_availability,
+                topics=next_topics,
+                lessons=next_lessons,
+                videos=next_videos,
+                tests=next_tests,
+                practices=next_practices
+            )
 
-        # Добавляем выполненный пользователем контент
-        user_done, created = UserDone.objects.get_or_create(user=user)
-        add_done_content(
-            user_done=user_done,
-            topics=next_topics,
-            lessons=next_lessons,
-            practices={practice},
-        )
+            # Добавляем выполненный пользователем контент
+            user_done, created = UserDone.objects.get_or_create(user=user)
+            add_done_content(
+                user_done=user_done,
+                topics=next_topics,
+                lessons=next_lessons,
+                practices={practice},
+            )
         # Формируем имена для ответа
-        next_topics_name = [next_topic.title for next_topic in next_topics] or ["Нет новых тем"]
-        next_lessons_name = [next_lesson.title for next_lesson in next_lessons] or ["Нет новых уроков"]
-        next_videos_name = [next_video.title for next_video in next_videos] or ["Нет новых видео"]
-        next_tests_name = [next_test.title for next_test in next_tests] or ["Нет новых тестов"]
-        next_practices_name = [next_practice.title for next_practice in next_practices] or ["Нет новых практик"]
+        next_topics_name = [next_topic.title for next_topic in unlocks.topics] or ["Нет новых тем"]
+        next_lessons_name = [next_lesson.title for next_lesson in unlocks.lessons] or ["Нет новых уроков"]
+        next_videos_name = [next_video.title for next_video in unlocks.videos] or ["Нет новых видео"]
+        next_tests_name = [next_test.title for next_test in unlocks.tests] or ["Нет новых тестов"]
+        next_practices_name = [next_practice.title for next_practice in unlocks.practices] or ["Нет новых практик"]
 
         next_content = {
             "next_topics_name": next_topics_name,
@@ -934,13 +1410,9 @@ def add_content_after_practice(request):
             "next_practices_name": next_practices_name,
         }
 
-        next_step, next_step_params = get_next_step(topics=next_topics,
-                                                    lessons=next_lessons,
-                                                    videos=next_videos,
-                                                    tests=next_tests,
-                                                    practices=next_practices)
+        next_step, next_step_params = progression.get_next_step(unlocks)
         if not next_step and not any([next_topics, next_lessons, next_videos, next_tests, next_practices]):
-            logger.warning(f"No next step or content found for video_id={data['video_id']}")
+            logger.warning(f"No next step or content found for practice_id={data['practice_id']}")
             return Response(
                 {'status': 'false', 'message': 'Нет доступного следующего контента', "next_content": next_content},
                 status=status.HTTP_200_OK
@@ -971,48 +1443,31 @@ def get_user_progress(request, telegram_id):
     """
     logger.info(f"Received telegram_id: {telegram_id}")
     try:
-        user = TelegramUser.objects.get(tg_id=telegram_id)
-        content_done, created = UserDone.objects.get_or_create(user=user)
-
-        # Получаем пройденные объекты пользователя
-        done_topics = content_done.topics.all()
-        done_lessons = content_done.lessons.all()
-        done_videos = content_done.videos.all()
-        done_tests = content_done.tests.all()
-        done_practices = content_done.practices.all()
-        names_done_topics = [done_topic.title for done_topic in done_topics]
-        names_done_lessons = [done_lesson.title for done_lesson in done_lessons]
-        names_done_videos = [done_video.title for done_video in done_videos]
-        names_done_tests = [done_test.title for done_test in done_tests]
-        names_done_practices = [done_practice.title for done_practice in done_practices]
+        # Пройденный контент - одной строкой UserProgress (LEFT JOIN от пользователя)
+        done_columns = [f'progress__done_{kind}' for kind in CONTENT_FIELDS]
+        user_progress = TelegramUser.objects.filter(tg_id=telegram_id).values_list(*done_columns).first()
+        if user_progress is None:
+            raise TelegramUser.DoesNotExist
+
+        # Названия и общее количество контента - из каталога
+        catalog = get_catalog()
+        names_done = {}
+        for kind, done_ids in zip(CONTENT_FIELDS, user_progress):
+            contents = getattr(catalog, kind)
+            done_content = [contents[content_id] for content_id in done_ids or () if content_id in contents]
+            if kind in ('topics', 'lessons', 'videos'):
+                done_content.sort(key=by_serial_number)
+            names_done[kind] = [content.title for content in done_content]
+
         payload = {
-            'names_done': {
-                'names_done_topics': names_done_topics,
-                'names_done_lessons': names_done_lessons,
-                'names_done_videos': names_done_videos,
-                'names_done_tests': names_done_tests,
-                'names_done_practices': names_done_practices},
-            'quantity_done': {
-                'quantity_done_topics': done_topics.count(),
-                'quantity_done_lessons': done_lessons.count(),
-                'quantity_done_videos': done_videos.count(),
-                'quantity_done_tests': done_tests.count(),
-                'quantity_done_practices': done_practices.count()},
-            'quantity_all': {
-                'topics': Topic.objects.all().count(),
-                'lessons': Lesson.objects.all().count(),
-                'videos': Video.objects.all().count(),
-                'tests': Test.objects.all().count(),
-                'practices': Practice.objects.all().count()
-            }
+            'names_done': {f'names_done_{kind}': names for kind, names in names_done.items()},
+            'quantity_done': {f'quantity_done_{kind}': len(names) for kind, names in names_done.items()},
+            'quantity_all': {kind: len(getattr(catalog, kind)) for kind in CONTENT_FIELDS},
         }
         return Response(payload, status=status.HTTP_200_OK)
 
     except TelegramUser.DoesNotExist:
         return Response({'error': f"Пользователь '{telegram_id}' не найден"},
                         status=status.HTTP_404_NOT_FOUND)
-    except UserDone.DoesNotExist:
-        return Response({'error': f"Выполненные задания для пользователя '{telegram_id}' не найдены"},
-                        status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
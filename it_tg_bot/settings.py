@@ -116,3 +116,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 BASE_MEDIA_URL = env('BASE_MEDIA_URL', 'http://127.0.0.1:8000')
+
+# Как часто (в секундах) процесс сверяет версию каталога контента с БД
+CONTENT_CATALOG_CHECK_INTERVAL = env.float('CONTENT_CATALOG_CHECK_INTERVAL', 2.0)
+
+# Общий для всех воркеров gunicorn кэш готовых ответов API (ключи содержат версию контента)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env('DJANGO_CACHE_DIR', '/tmp/it_tg_bot_cache'),
+        'TIMEOUT': env.int('DJANGO_CACHE_TIMEOUT', 24 * 60 * 60),
+        'OPTIONS': {'MAX_ENTRIES': env.int('DJANGO_CACHE_MAX_ENTRIES', 1000)},
+    }
+}
@@ -0,0 +1,233 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+import environs
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+BASE_URL = env.str("BASE_MEDIA_URL", "http://nginx:80").rstrip('/')
+
+# (connect, read) таймауты в секундах: по умолчанию и для отдельных эндпоинтов (по префиксу пути)
+DEFAULT_TIMEOUT = (env.float("API_CONNECT_TIMEOUT", 3.05), env.float("API_READ_TIMEOUT", 10))
+ENDPOINT_TIMEOUTS = {
+    'bot/bootstrap/': (3.05, 5),
+    # finish открывает следующий контент, как next_content
+    'bot/test_attempt/': (3.05, 15),
+    'bot/telegram_file/': (3.05, 3),
+    'bot/next_content': (3.05, 15),
+    'bot/start_content/': (3.05, 15),
+    'bot/entitlements/': (3.05, 30),
+}
+MEDIA_TIMEOUT = (3.05, 30)
+
+# Повторы только для GET: количество, базовая и максимальная пауза (экспоненциально, с jitter)
+GET_RETRIES = env.int("API_GET_RETRIES", 2)
+RETRY_BACKOFF = 0.2
+RETRY_BACKOFF_MAX = 2.0
+RETRY_STATUSES = {502, 503, 504}
+
+# Circuit breaker: после стольких ошибок подряд запросы к бэкенду не выполняются COOLDOWN секунд
+BREAKER_THRESHOLD = env.int("API_BREAKER_THRESHOLD", 5)
+BREAKER_COOLDOWN = env.float("API_BREAKER_COOLDOWN", 15.0)
+
+
+class CircuitBreaker:
+    """
+    Размыкается после BREAKER_THRESHOLD ошибок подряд и в течение COOLDOWN секунд отказывает сразу,
+    не задерживая обработку обновлений ожиданием таймаута. Затем пропускает один пробный запрос.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial_in_progress:
+                return False
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Бэкенд снова отвечает, circuit breaker замкнут")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.trial_in_progress = False
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.error(f"Бэкенд недоступен ({self.failures} ошибок подряд), "
+                                 f"запросы отклоняются {self.cooldown:.0f} с")
+                self.opened_at = time.monotonic()
+
+
+class EndpointMetrics:
+    """Счетчики запросов, ошибок и задержек по эндпоинтам (ИД и названия в пути заменены на '*')."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def endpoint_key(method: str, endpoint: str) -> str:
+        path = endpoint.split('?', 1)[0].strip('/').split('/')
+        return f"{method} " + '/'.join(path[:2] + ['*'] * (len(path) > 2))
+
+    def record(self, method: str, endpoint: str, elapsed: float, error: bool, retries: int = 0) -> None:
+        key = self.endpoint_key(method, endpoint)
+        with self._lock:
+            stats = self._stats.setdefault(key, {'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['retries'] += retries
+            stats['total_ms'] += elapsed * 1000
+            stats['max_ms'] = max(stats['max_ms'], elapsed * 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                key: {**stats, 'avg_ms': round(stats['total_ms'] / stats['calls'], 1)}
+                for key, stats in self._stats.items()
+            }
+
+
+class ApiClient:
+    """
+    Клиент API бэкенда, общий для всех обработчиков бота: пул keep-alive соединений
+    размера BOT_WORKERS, таймауты по эндпоинтам, повторы GET, circuit breaker и метрики.
+
+    Ошибки сети и разомкнутый breaker возвращаются как ответ 503, поэтому обработчики,
+    которые проверяют response.ok или вызывают raise_for_status(), работают без изменений.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 8):
+        self.base_url = base_url
+        self.breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+        self.metrics = EndpointMetrics()
+        self.configure(pool_size)
+
+    def configure(self, pool_size: int) -> None:
+        """Пересоздает сессию с пулом на pool_size соединений."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self.session = session
+
+    @staticmethod
+    def get_timeout(endpoint: str) -> tuple:
+        path = endpoint.lstrip('/')
+        for prefix, timeout in ENDPOINT_TIMEOUTS.items():
+            if path.startswith(prefix):
+                return timeout
+        return DEFAULT_TIMEOUT
+
+    @staticmethod
+    def unavailable_response(url: str, reason: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 503
+        response.reason = 'Service Unavailable'
+        response.url = url
+        response._content = json.dumps({'error': reason}, ensure_ascii=False).encode()
+        response.headers['Content-Type'] = 'application/json'
+        return response
+
+    def request(self, method: str, url: str, endpoint: str, timeout: tuple, retries: int, **kwargs) -> requests.Response:
+        if not self.breaker.allow():
+            self.metrics.record(method, endpoint, 0.0, error=True)
+            return self.unavailable_response(url, "backend unavailable (circuit open)")
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                failed = response.status_code in RETRY_STATUSES
+                error = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                failed = True
+                error = str(e)
+
+            if not failed or attempt >= retries:
+                break
+            attempt += 1
+            delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+            logger.warning(f"{method} {endpoint}: {error}, повтор {attempt}/{retries} через {delay:.2f} с")
+            time.sleep(delay)
+
+        if failed:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        error_status = failed or response.status_code >= 500
+        self.metrics.record(method, endpoint, time.monotonic() - started, error=error_status, retries=attempt)
+
+        if response is None:
+            logger.error(f"{method} {endpoint} не выполнен: {error}")
+            return self.unavailable_response(url, error)
+        return response
+
+    def get(self, endpoint: str) -> requests.Response:
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        return self.request('GET', url, endpoint, self.get_timeout(endpoint), GET_RETRIES)
+
+    def post(self, endpoint: str, payload: dict) -> requests.Response:
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        return self.request('POST', url, endpoint, self.get_timeout(endpoint), 0, json=payload)
+
+    def download(self, url: str, timeout=MEDIA_TIMEOUT) -> requests.Response:
+        """Скачивает файл (картинку, документ) через тот же пул соединений."""
+        endpoint = re.sub(r'^https?://[^/]+', '', url)
+        return self.request('GET', url, endpoint, timeout, GET_RETRIES)
+
+
+api_client = ApiClient(BASE_URL)
+
+
+def configure_api_client(pool_size: int) -> None:
+    """Задает размер пула соединений (BOT_WORKERS - по числу потоков обработки обновлений)."""
+    api_client.configure(pool_size)
+
+
+def call_api_get(endpoint: str) -> requests.Response:
+    """GET-запрос к API бэкенда (например, 'bot/topics/')."""
+    return api_client.get(endpoint)
+
+
+def call_api_post(endpoint: str, payload: dict) -> requests.Response:
+    """POST-запрос к API бэкенда с JSON-телом."""
+    return api_client.post(endpoint, payload)
+
+
+def download_media(url: str, timeout=MEDIA_TIMEOUT) -> requests.Response:
+    """Скачивает файл из media бэкенда."""
+    return api_client.download(url, timeout)
+
+
+def log_api_metrics(context=None) -> None:
+    """Пишет в лог счетчики запросов к API (подходит как задача job_queue)."""
+    for endpoint, stats in sorted(api_client.metrics.snapshot().items()):
+        logger.info(f"API {endpoint}: calls={stats['calls']} errors={stats['errors']} retries={stats['retries']} "
+                    f"avg={stats['avg_ms']}ms max={stats['max_ms']:.1f}ms")
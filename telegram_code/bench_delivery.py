@@ -0,0 +1,107 @@
+"""
+Замер доставки обновлений ботом в режимах polling и webhook на локальной заглушке Telegram API.
+
+Скрипт поднимает fake_telegram_api, запускает бота с TELEGRAM_API_URL на заглушку и нужным BOT_MODE,
+отправляет N сообщений от разных пользователей и считает обновления в секунду и задержку
+от отправки обновления до первого ответа бота в этот чат (p50/p95/max).
+
+Бэкенд (BASE_MEDIA_URL) должен быть доступен, т.к. обработчики бота обращаются к API.
+
+    python bench_delivery.py --mode polling --updates 200
+    python bench_delivery.py --mode webhook --updates 200 --text "/start"
+"""
+import argparse
+import os
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_telegram_api import start_fake_telegram_api
+
+FIRST_CHAT_ID = 500000000
+
+
+def wait_bot_ready(api, mode: str, timeout: float) -> bool:
+    """Бот готов: в режиме webhook вызвал setWebhook, в режиме polling начал getUpdates."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if mode == 'webhook' and api.webhook_url:
+            return True
+        if mode == 'polling' and api.calls.get('getUpdates'):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run(args) -> int:
+    api, server = start_fake_telegram_api(port=args.api_port)
+    api_url = f"http://127.0.0.1:{server.server_port}"
+    env = dict(os.environ, TELEGRAM_API_URL=api_url, BOT_MODE=args.mode, BOT_WORKERS=str(args.workers))
+    if args.mode == 'webhook':
+        # Без nginx заглушка отправляет обновления прямо в бота; через nginx - задать --webhook-base-url
+        env.setdefault('BOT_WEBHOOK_PORT', str(args.webhook_port))
+        env['BOT_WEBHOOK_BASE_URL'] = args.webhook_base_url or f"http://127.0.0.1:{env['BOT_WEBHOOK_PORT']}"
+        env['BOT_WEBHOOK_LISTEN'] = '127.0.0.1'
+        env.setdefault('BOT_WEBHOOK_SECRET', secrets.token_hex(32))
+
+    bot = subprocess.Popen([sys.executable, 'tg_bot.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        if not wait_bot_ready(api, args.mode, args.startup_timeout):
+            print(f"Бот не запустился за {args.startup_timeout} с", file=sys.stderr)
+            return 1
+        api.reset()
+
+        updates = [api.make_message_update(FIRST_CHAT_ID + index, args.text) for index in range(args.updates)]
+        started = time.monotonic()
+        # Вебхук: Telegram держит до max_connections параллельных запросов, здесь их число задает --concurrency
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            sent_at = dict(zip(
+                (update['message']['chat']['id'] for update in updates),
+                pool.map(api.push_update, updates),
+            ))
+        replies = api.wait_replies(args.updates, args.reply_timeout)
+        elapsed = time.monotonic() - started
+
+        first_reply = {}
+        for reply in replies:
+            if reply['chat_id'] in sent_at and reply['chat_id'] not in first_reply:
+                first_reply[reply['chat_id']] = reply['received_at']
+        latencies = [(first_reply[chat_id] - sent_at[chat_id]) * 1000 for chat_id in first_reply]
+
+        print(f"Режим: {args.mode}, воркеров: {args.workers}, обновлений: {args.updates}")
+        print(f"Ответили чатов: {len(first_reply)}/{args.updates}, ответов всего: {len(replies)}")
+        print(f"Пропускная способность: {len(first_reply) / elapsed:.1f} обновлений/с за {elapsed:.2f} с")
+        if latencies:
+            print(f"Задержка ответа, мс: p50={statistics.median(latencies):.1f} "
+                  f"p95={percentile(latencies, 0.95):.1f} max={max(latencies):.1f}")
+        return 0 if len(first_reply) == args.updates else 2
+    finally:
+        bot.terminate()
+        try:
+            bot.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark bot update delivery: polling vs webhook')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--updates', type=int, default=100)
+    parser.add_argument('--text', default='/start', help='message text sent by every test user')
+    parser.add_argument('--workers', type=int, default=8, help='BOT_WORKERS for the bot process')
+    parser.add_argument('--concurrency', type=int, default=40, help='parallel webhook deliveries')
+    parser.add_argument('--api-port', type=int, default=0, help='fake Telegram API port (0 = any free)')
+    parser.add_argument('--webhook-port', type=int, default=8081)
+    parser.add_argument('--webhook-base-url', default='', help='public webhook base, e.g. http://localhost via nginx')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--reply-timeout', type=float, default=60)
+    sys.exit(run(parser.parse_args()))
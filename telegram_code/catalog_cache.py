@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+
+import environs
+from telegram.ext import CallbackContext
+
+from api_client import call_api_get
+from media_cache import forget_local_file_ids
+from title_filters import set_title_index
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+# Каталог перечитывается не реже, чем раз в CATALOG_TTL секунд, и сразу после смены версии контента,
+# которую бэкенд увеличивает при любом изменении тем, уроков и тарифов в админке
+CATALOG_TTL = env.int("BOT_CATALOG_TTL", 600)
+CATALOG_CHECK_INTERVAL = env.int("BOT_CATALOG_CHECK_INTERVAL", 30)
+
+_refresh_lock = threading.Lock()
+
+
+def load_catalog():
+    """
+    Загружает каталог (темы с уроками, тарифы, названия контента) одним запросом
+    и строит индексы по названиям, в т.ч. индекс для фильтров кнопок (title_filters).
+    """
+    response = call_api_get("bot/catalog/")
+    response.raise_for_status()
+    data = response.json()
+    set_title_index(data['titles'])
+    return {
+        'version': data['version'],
+        'loaded_at': time.monotonic(),
+        'topics': data['topics'],
+        'topic_by_title': {topic['title']: topic for topic in reversed(data['topics'])},
+        'tariffs': data['tariffs'],
+        'tariff_by_title': {tariff['title']: tariff for tariff in reversed(data['tariffs'])},
+    }
+
+
+def refresh_catalog(bot_data: dict, version: int = None) -> dict:
+    """
+    Перечитывает каталог в bot_data, если его нет, он устарел по TTL или версия контента изменилась.
+    Параллельные вызовы из потоков обработки обновлений и задач JobQueue ждут одну загрузку.
+    """
+    with _refresh_lock:
+        catalog = bot_data.get('catalog')
+        expired = catalog is None or time.monotonic() - catalog['loaded_at'] > CATALOG_TTL
+        if expired or (version is not None and version != catalog['version']):
+            previous_version = catalog['version'] if catalog is not None else None
+            catalog = load_catalog()
+            bot_data['catalog'] = catalog
+            if catalog['version'] != previous_version:
+                forget_local_file_ids()
+            logger.info(f"Каталог бота загружен, версия контента {catalog['version']}")
+        return catalog
+
+
+def get_catalog(context: CallbackContext) -> dict:
+    """
+    Каталог из bot_data. Если перечитать устаревший каталог не удалось, возвращается старый,
+    без каталога вообще - пробрасывается ошибка запроса.
+    """
+    catalog = context.bot_data.get('catalog')
+    if catalog is not None and time.monotonic() - catalog['loaded_at'] <= CATALOG_TTL:
+        return catalog
+    try:
+        return refresh_catalog(context.bot_data)
+    except Exception as e:
+        if catalog is None:
+            raise
+        logger.warning(f"Каталог не обновлен, используется версия {catalog['version']}: {e}")
+        return catalog
+
+
+def invalidate_catalog(bot_data: dict) -> None:
+    """Сбрасывает каталог: следующее обращение загрузит его заново."""
+    bot_data.pop('catalog', None)
+
+
+def check_catalog_version(context: CallbackContext) -> None:
+    """Задача job_queue: сверяет версию контента на бэкенде и перечитывает каталог при изменении."""
+    response = call_api_get("bot/content_version/")
+    if not response.ok:
+        logger.warning(f"Не удалось проверить версию контента: {response.status_code}")
+        return
+    try:
+        refresh_catalog(context.bot_data, response.json()['version'])
+    except Exception as e:
+        logger.warning(f"Не удалось обновить каталог: {e}")
+
+
+def get_topics(context: CallbackContext) -> list:
+    """Все темы курса (с уроками) в порядке serial_number."""
+    return get_catalog(context)['topics']
+
+
+def get_topic(context: CallbackContext, topic_title: str):
+    """Тема по названию или None."""
+    return get_catalog(context)['topic_by_title'].get(topic_title)
+
+
+def get_tariffs(context: CallbackContext) -> list:
+    """Все тарифы."""
+    return get_catalog(context)['tariffs']
+
+
+def get_tariff(context: CallbackContext, tariff_title: str):
+    """Тариф по названию или None."""
+    return get_catalog(context)['tariff_by_title'].get(tariff_title)
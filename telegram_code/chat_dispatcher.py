@@ -0,0 +1,73 @@
+import logging
+import threading
+from queue import Queue
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import Dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_key(update: object) -> int:
+    """Ключ очередности обновления: чат, иначе пользователь (pre_checkout_query), иначе 0."""
+    if isinstance(update, Update):
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+    return 0
+
+
+class ChatOrderedDispatcher(Dispatcher):
+    """
+    Dispatcher, который обрабатывает обновления разных чатов параллельно в update_workers потоках.
+
+    Обновления одного чата всегда попадают в один поток (по chat_id) и обрабатываются по порядку,
+    поэтому состояние диалога и user_data чата не меняются одновременно. Обработчики бота остаются
+    синхронными: ожидание API бэкенда или outbox занимает только поток своего чата.
+    """
+
+    def __init__(self, *args, update_workers: int = 8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.update_workers = max(1, update_workers)
+        self._chat_queues = [Queue() for _ in range(self.update_workers)]
+        self._chat_threads = []
+
+    def start(self, ready: threading.Event = None) -> None:
+        if not self._chat_threads:
+            for index, chat_queue in enumerate(self._chat_queues):
+                thread = threading.Thread(target=self._process_chat_queue, args=(chat_queue,),
+                                          name=f'dispatcher_chat_{index}', daemon=True)
+                thread.start()
+                self._chat_threads.append(thread)
+        super().start(ready)
+
+    def process_update(self, update: object) -> None:
+        """Вызывается потоком диспетчера: передает обновление в поток его чата."""
+        if isinstance(update, TelegramError):
+            super().process_update(update)
+            return
+        self._chat_queues[update_chat_key(update) % self.update_workers].put(update)
+
+    def _process_chat_queue(self, chat_queue: Queue) -> None:
+        while True:
+            update = chat_queue.get()
+            if update is None:
+                chat_queue.task_done()
+                return
+            try:
+                Dispatcher.process_update(self, update)
+            except Exception:
+                logger.exception("Необработанная ошибка при обработке обновления")
+            finally:
+                chat_queue.task_done()
+
+    def stop(self) -> None:
+        """Останавливает прием обновлений и дожидается обработки уже распределенных по чатам."""
+        super().stop()
+        for chat_queue in self._chat_queues:
+            chat_queue.put(None)
+        for thread in self._chat_threads:
+            thread.join()
+        self._chat_threads = []
@@ -0,0 +1,101 @@
+import logging
+import time
+from datetime import datetime
+from datetime import time as day_time
+
+import environs
+import pytz
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import CallbackContext
+
+from api_client import call_api_post
+from outbox import bulk_sends, outbox
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+# Пользователей в одной пачке обхода (один запрос к бэкенду, одно UPDATE в БД)
+SWEEP_BATCH_SIZE = env.int("BOT_EXPIRY_SWEEP_BATCH", 1000)
+# За сколько дней до окончания доступа напоминать о продлении
+REMIND_DAYS = env.int("BOT_EXPIRY_REMIND_DAYS", 3)
+# Об окончании доступа сообщаем, только если он закончился не раньше стольких дней назад
+EXPIRED_NOTIFY_DAYS = env.int("BOT_EXPIRED_NOTIFY_DAYS", 3)
+# Обход раз в сутки, в дневное время по часовому поясу курса
+SWEEP_TIME = day_time(hour=env.int("BOT_EXPIRY_SWEEP_HOUR", 11),
+                      tzinfo=pytz.timezone(env.str("BOT_TIMEZONE", "Europe/Moscow")))
+
+MAIN_MENU_MARKUP = InlineKeyboardMarkup([[InlineKeyboardButton("📖 Главное меню", callback_data="main_menu")]])
+
+
+def format_date(value: str) -> str:
+    return datetime.strptime(value, '%Y-%m-%d').strftime('%d.%m.%Y')
+
+
+def tariff_text(item: dict) -> str:
+    return f" по тарифу «{item['tariff']}»" if item['tariff'] else ""
+
+
+def notify_expiring(context: CallbackContext, item: dict) -> None:
+    context.bot.submit_message(
+        chat_id=item['tg_id'],
+        text=f"Доступ к курсу{tariff_text(item)} заканчивается {format_date(item['access_date_finish'])}. "
+             f"Чтобы продолжить обучение без перерыва, продлите тариф в разделе «🖌 Тариф».",
+        reply_markup=MAIN_MENU_MARKUP,
+    )
+
+
+def notify_expired(context: CallbackContext, item: dict) -> None:
+    # Давно закончившийся доступ отзывается без сообщения
+    if not item['notify']:
+        return
+    context.bot.submit_message(
+        chat_id=item['tg_id'],
+        text=f"Срок доступа{tariff_text(item)} закончился {format_date(item['access_date_finish'])}. "
+             f"Пройденные темы и уроки сохранены: после оплаты доступ к ним откроется снова.",
+        reply_markup=MAIN_MENU_MARKUP,
+    )
+
+
+def wait_for_bulk_queue(limit: int) -> None:
+    """
+    Ждет, пока в очереди outbox останется меньше limit сообщений рассылки.
+    Следующая пачка отмечается в БД, только когда предыдущая почти отправлена, поэтому
+    при перезапуске бота теряется не больше одной пачки уведомлений.
+    """
+    while outbox.queue_depth()['bulk'] >= limit:
+        time.sleep(1)
+
+
+def sweep(context: CallbackContext, kind: str, notify) -> int:
+    """Обходит пачками Entitlement вида kind ('expired' или 'expiring') и ставит уведомления в очередь."""
+    after = None
+    total = 0
+    while True:
+        wait_for_bulk_queue(SWEEP_BATCH_SIZE)
+        response = call_api_post('bot/entitlements/sweep/', {
+            'kind': kind, 'after': after, 'limit': SWEEP_BATCH_SIZE, 'days': REMIND_DAYS,
+            'notify_days': EXPIRED_NOTIFY_DAYS,
+        })
+        if not response.ok:
+            # Необработанные пользователи останутся для следующего обхода
+            logger.error(f"Обход Entitlement '{kind}' прерван: {response.status_code} {response.text[:300]}")
+            return total
+        data = response.json()
+        with bulk_sends():
+            for item in data['items']:
+                notify(context, item)
+        total += len(data['items'])
+        after = data['next']
+        if after is None:
+            return total
+
+
+def sweep_entitlements(context: CallbackContext) -> None:
+    """Задача job_queue: отзыв закончившегося доступа и напоминания о скором окончании."""
+    started = time.monotonic()
+    expired = sweep(context, 'expired', notify_expired)
+    expiring = sweep(context, 'expiring', notify_expiring)
+    logger.info(f"Обход Entitlement: доступ отозван у {expired}, напоминаний {expiring}, "
+                f"за {time.monotonic() - started:.1f} с")
@@ -0,0 +1,262 @@
+"""
+Локальная заглушка Telegram Bot API для тестов и замеров доставки обновлений.
+
+Бот направляется на нее переменной TELEGRAM_API_URL (например, http://127.0.0.1:8090).
+Заглушка отдает обновления через getUpdates (polling) или отправляет их POST-запросом
+на адрес из setWebhook (webhook), а ответы бота (sendMessage, sendPhoto и т.д.) записывает
+вместе со временем получения.
+
+Запуск отдельно: python fake_telegram_api.py --port 8090
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1000000001, 'is_bot': True, 'first_name': 'Test bot', 'username': 'test_bot'}
+
+# Методы, ответы на которые записываются как ответы бота пользователю
+REPLY_METHODS = {'sendMessage', 'sendPhoto', 'sendDocument', 'sendVideo', 'sendInvoice',
+                 'editMessageText', 'editMessageReplyMarkup'}
+
+
+class ApiError(Exception):
+    """Ошибка Bot API, которую заглушка вернет боту (например, 429 с retry_after)."""
+
+    def __init__(self, error_code: int, description: str, retry_after: int = None):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+    def to_response(self) -> dict:
+        response = {'ok': False, 'error_code': self.error_code, 'description': self.description}
+        if self.retry_after is not None:
+            response['parameters'] = {'retry_after': self.retry_after}
+        return response
+
+
+class FakeTelegramApi:
+    """
+    Состояние заглушки: очередь обновлений, адрес вебхука и записанные ответы бота.
+    Потокобезопасно: бот обращается к ней одновременно из нескольких потоков (диспетчер, отправка outbox).
+    """
+
+    def __init__(self):
+        self.updates = []
+        self.webhook_url = ''
+        self.replies = []
+        self.calls = {}
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._webhook_session = requests.Session()
+
+    # Обновления
+
+    def make_message_update(self, chat_id: int, text: str) -> dict:
+        user = {'id': chat_id, 'is_bot': False, 'first_name': f'User {chat_id}'}
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': user['first_name']},
+            'from': user,
+            'text': text,
+        }
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return {'update_id': next(self._update_ids), 'message': message}
+
+    def push_update(self, update: dict) -> float:
+        """
+        Передает обновление боту: в режиме webhook - POST на адрес вебхука,
+        иначе кладет в очередь getUpdates. Возвращает время отправки (time.monotonic()).
+        """
+        sent_at = time.monotonic()
+        if self.webhook_url:
+            response = self._webhook_session.post(self.webhook_url, json=update, timeout=10)
+            if not response.ok:
+                logger.error(f"Вебхук ответил {response.status_code} на обновление {update['update_id']}")
+        else:
+            with self._condition:
+                self.updates.append(update)
+                self._condition.notify_all()
+        return sent_at
+
+    def get_updates(self, offset: int = 0, limit: int = 100, timeout: float = 0) -> list:
+        """Обновления с update_id >= offset; ждет новые до timeout секунд, как long polling Telegram."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if offset:
+                self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            while not self.updates and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            return self.updates[:limit]
+
+    # Ответы бота
+
+    def record_reply(self, method: str, params: dict) -> None:
+        chat_id = params.get('chat_id')
+        with self._condition:
+            self.replies.append({
+                'method': method,
+                'chat_id': int(chat_id) if chat_id not in (None, '') else None,
+                'text': params.get('text') or params.get('caption'),
+                'received_at': time.monotonic(),
+            })
+            self._condition.notify_all()
+
+    def wait_replies(self, count: int, timeout: float) -> list:
+        """Ждет, пока бот отправит не меньше count ответов, и возвращает все записанные ответы."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.replies) < count and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            return list(self.replies)
+
+    def reset(self) -> None:
+        with self._condition:
+            self.updates.clear()
+            self.replies.clear()
+            self.calls.clear()
+
+    # Методы Bot API
+
+    def sent_message(self, params: dict, **content) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'from': BOT_USER,
+            **content,
+        }
+
+    def new_file(self, prefix: str) -> dict:
+        number = next(self._file_ids)
+        return {'file_id': f'{prefix}-{number}', 'file_unique_id': f'{prefix}-u{number}',
+                'width': 100, 'height': 100, 'file_size': 1}
+
+    def call(self, method: str, params: dict):
+        """Выполняет метод Bot API и возвращает поле result ответа."""
+        with self._condition:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if method in REPLY_METHODS:
+            self.record_reply(method, params)
+
+        if method == 'getMe':
+            return BOT_USER
+        if method == 'getUpdates':
+            return self.get_updates(int(params.get('offset') or 0), int(params.get('limit') or 100),
+                                    float(params.get('timeout') or 0))
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = ''
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': 0}
+        if method in ('sendMessage', 'editMessageText'):
+            return self.sent_message(params, text=params.get('text', ''))
+        if method == 'sendPhoto':
+            return self.sent_message(params, photo=[self.new_file('photo')], caption=params.get('caption'))
+        if method == 'sendDocument':
+            document = {key: value for key, value in self.new_file('document').items()
+                        if key not in ('width', 'height')}
+            return self.sent_message(params, document=document, caption=params.get('caption'))
+        if method in ('sendVideo', 'sendInvoice', 'editMessageReplyMarkup'):
+            return self.sent_message(params)
+        # deleteMessage, answerCallbackQuery, sendChatAction и прочие методы без полезного результата
+        return True
+
+
+def parse_params(handler: BaseHTTPRequestHandler) -> dict:
+    """Параметры запроса к Bot API: JSON или multipart/form-data (при отправке файлов)."""
+    length = int(handler.headers.get('Content-Length') or 0)
+    body = handler.rfile.read(length) if length else b''
+    content_type = handler.headers.get('Content-Type', '')
+    if not body:
+        return {}
+    if content_type.startswith('application/json'):
+        return json.loads(body)
+    if content_type.startswith('multipart/form-data'):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+        )
+        params = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if part.get_filename() is None:
+                params[name] = part.get_content()
+        return params
+    return {}
+
+
+def make_handler(api: FakeTelegramApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # keep-alive соединения бота: без TCP_NODELAY каждый ответ ждет delayed ACK (~40 мс)
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            # /bot<token>/<method>
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 2 or not parts[0].startswith('bot'):
+                self.send_error(404)
+                return
+            try:
+                result = api.call(parts[1], parse_params(self))
+                body = json.dumps({'ok': True, 'result': result}).encode()
+                self.send_response(200)
+            except ApiError as e:
+                body = json.dumps(e.to_response()).encode()
+                self.send_response(e.error_code)
+            except Exception as e:
+                logger.error(f"Ошибка заглушки Telegram API в {parts[1]}: {e}")
+                body = json.dumps({'ok': False, 'error_code': 400, 'description': str(e)}).encode()
+                self.send_response(400)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_fake_telegram_api(host: str = '127.0.0.1', port: int = 8090):
+    """Запускает заглушку в фоновом потоке. Возвращает (api, server); остановка - server.shutdown()."""
+    api = FakeTelegramApi()
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Заглушка Telegram API слушает http://{host}:{server.server_port}")
+    return api, server
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Local Telegram Bot API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+    api, server = start_fake_telegram_api(args.host, args.port)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
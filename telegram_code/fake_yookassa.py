@@ -0,0 +1,99 @@
+"""
+Локальная заглушка ЮKassa для замера вебхука оплаты.
+
+Отправляет на вебхук уведомления payment.succeeded об N платежах, часть из них - повторно
+(как ЮKassa при неуспешной или медленной доставке), и считает время подтверждения каждого
+уведомления и запросы в секунду. Затем ждет, пока вебхук обработает все платежи (GET /stats),
+и выводит время обработки.
+
+Нужны пользователь (--user-id, --chat-id) и тариф (--tariff), существующие в базе бэкенда.
+
+    python fake_yookassa.py --webhook-url http://127.0.0.1:8443 --payments 500 --duplicates 0.3
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def make_notification(payment_id: str, args) -> dict:
+    return {
+        'type': 'notification',
+        'event': 'payment.succeeded',
+        'object': {
+            'id': payment_id,
+            'status': 'succeeded',
+            'paid': True,
+            'amount': {'value': f'{args.amount:.2f}', 'currency': 'RUB'},
+            'metadata': {'chat_id': str(args.chat_id), 'user_id': str(args.user_id), 'tariff': args.tariff},
+        },
+    }
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def run(args) -> int:
+    base_url = args.webhook_url.rstrip('/')
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=args.concurrency))
+
+    payment_ids = [f'bench-{uuid.uuid4()}' for _ in range(args.payments)]
+    deliveries = payment_ids + random.sample(payment_ids, int(len(payment_ids) * args.duplicates))
+    random.shuffle(deliveries)
+
+    def deliver(payment_id: str):
+        started = time.monotonic()
+        response = session.post(f'{base_url}/yookassa/webhook', json=make_notification(payment_id, args), timeout=30)
+        return time.monotonic() - started, response.status_code, response.json().get('status')
+
+    stats_before = session.get(f'{base_url}/stats', timeout=10).json()
+    done_before = stats_before.get('done', {}).get('count', 0) + stats_before.get('failed', {}).get('count', 0)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(deliver, deliveries))
+    elapsed = time.monotonic() - started
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    statuses = {}
+    for _, code, status in results:
+        statuses[f'{code} {status}'] = statuses.get(f'{code} {status}', 0) + 1
+    print(f"Уведомлений: {len(deliveries)} (платежей {args.payments}, повторов {len(deliveries) - args.payments})")
+    print(f"Ответы: {statuses}")
+    print(f"Подтверждение: {len(deliveries) / elapsed:.0f} запросов/с, p50={statistics.median(latencies):.1f} мс "
+          f"p95={percentile(latencies, 0.95):.1f} мс max={max(latencies):.1f} мс")
+
+    deadline = time.monotonic() + args.process_timeout
+    while time.monotonic() < deadline:
+        stats = session.get(f'{base_url}/stats', timeout=10).json()
+        finished = stats.get('done', {}).get('count', 0) + stats.get('failed', {}).get('count', 0) - done_before
+        if finished >= args.payments:
+            break
+        time.sleep(0.2)
+    processed_in = time.monotonic() - started
+    print(f"Обработано: {finished}/{args.payments} за {processed_in:.1f} с "
+          f"({finished / processed_in:.1f} платежей/с), по статусам: {stats}")
+    return 0 if finished >= args.payments else 2
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local YooKassa stand-in: payment.succeeded load with redeliveries')
+    parser.add_argument('--webhook-url', default='http://127.0.0.1:8443')
+    parser.add_argument('--payments', type=int, default=200)
+    parser.add_argument('--duplicates', type=float, default=0.3, help='share of payments delivered twice')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--user-id', type=int, required=True)
+    parser.add_argument('--chat-id', type=int, required=True)
+    parser.add_argument('--tariff', required=True)
+    parser.add_argument('--amount', type=float, default=1000)
+    parser.add_argument('--process-timeout', type=float, default=120)
+    sys.exit(run(parser.parse_args()))
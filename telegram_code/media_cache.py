@@ -0,0 +1,82 @@
+import logging
+from typing import Callable
+from urllib.parse import urlencode
+
+import telegram
+from telegram import Message
+
+from api_client import call_api_get, call_api_post, download_media
+
+logger = logging.getLogger(__name__)
+
+# file_id, уже известные этому процессу бота: (url, kind) -> file_id.
+# Сбрасываются при смене версии контента (см. catalog_cache), т.к. файл могли заменить в админке
+_local_file_ids = {}
+
+
+def forget_local_file_ids() -> None:
+    """Сбрасывает file_id, запомненные процессом бота."""
+    _local_file_ids.clear()
+
+
+def get_cached_file_id(url: str, kind: str):
+    """Возвращает file_id файла, уже загруженного в Telegram, или None."""
+    file_id = _local_file_ids.get((url, kind))
+    if file_id:
+        return file_id
+    response = call_api_get(f"bot/telegram_file/?{urlencode({'url': url, 'kind': kind})}")
+    if not response.ok:
+        return None
+    file_id = response.json().get('file_id')
+    if file_id:
+        _local_file_ids[(url, kind)] = file_id
+    return file_id
+
+
+def save_file_id(url: str, kind: str, file_id: str) -> None:
+    """Сохраняет file_id после первой загрузки файла, чтобы все процессы бота отправляли его повторно."""
+    _local_file_ids[(url, kind)] = file_id
+    response = call_api_post('/bot/telegram_file/add/', {'url': url, 'kind': kind, 'file_id': file_id})
+    if not response.ok:
+        logger.warning(f"file_id для {url} не сохранен: {response.status_code} {response.text}")
+
+
+def get_message_file_id(message: Message, kind: str):
+    """Достает file_id из отправленного сообщения с фото (наибольший размер) или документом."""
+    if kind == 'photo' and message.photo:
+        return message.photo[-1].file_id
+    if kind == 'document' and message.document:
+        return message.document.file_id
+    return None
+
+
+def send_cached_media(url: str, kind: str, send: Callable, timeout=10) -> Message:
+    """
+    Отправляет картинку или документ из media по file_id, если файл уже загружался в Telegram.
+    Иначе скачивает файл, отправляет его и запоминает полученный file_id.
+
+    Args:
+        url: ссылка на файл в media бэкенда.
+        kind: 'photo' или 'document'.
+        send: функция отправки, принимает file_id или содержимое файла и возвращает Message
+            (например, lambda media: update.message.reply_photo(photo=media, caption=...)).
+        timeout: таймаут скачивания файла (секунды или пара connect/read).
+
+    Raises:
+        requests.RequestException: файл не удалось скачать.
+    """
+    file_id = get_cached_file_id(url, kind)
+    if file_id:
+        try:
+            return send(file_id)
+        except telegram.error.BadRequest as e:
+            logger.warning(f"file_id для {url} не принят Telegram, загружаем файл заново: {e}")
+            _local_file_ids.pop((url, kind), None)
+
+    response = download_media(url, timeout=timeout)
+    response.raise_for_status()
+    message = send(response.content)
+    file_id = get_message_file_id(message, kind)
+    if file_id:
+        save_file_id(url, kind, file_id)
+    return message
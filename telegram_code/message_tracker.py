@@ -0,0 +1,163 @@
+import logging
+import queue
+import threading
+import time
+
+import environs
+import telegram
+from telegram import Bot
+from telegram.ext import CallbackContext
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+# Сколько последних сообщений бота и пользователя помнить на чат (более старые удалять уже не будем)
+MAX_TRACKED_MESSAGES = env.int("BOT_MAX_TRACKED_MESSAGES", 50)
+# Telegram не дает боту удалять сообщения старше 48 часов; берем с запасом
+MESSAGE_DELETE_MAX_AGE = 47 * 60 * 60
+# deleteMessages принимает до 100 ИД за вызов
+DELETE_BATCH_SIZE = 100
+# Не больше стольких вызовов удаления в секунду на все чаты, чтобы оставить лимит Telegram на отправку
+DELETE_CALLS_PER_SECOND = env.float("BOT_DELETE_CALLS_PER_SECOND", 10)
+
+TRACKED_MESSAGES_KEY = 'tracked_messages'
+
+
+def get_tracked_messages(context: CallbackContext) -> list:
+    """
+    Список [message_id, время отправки] сообщений чата в user_data.
+    ИД из прежнего списка prev_message_ids (состояние до обновления бота) переносятся в него.
+    """
+    tracked = context.user_data.setdefault(TRACKED_MESSAGES_KEY, [])
+    legacy_ids = context.user_data.pop('prev_message_ids', None)
+    if legacy_ids:
+        now = time.time()
+        tracked.extend([message_id, now] for message_id in legacy_ids if message_id)
+    return tracked
+
+
+def track_messages(context: CallbackContext, *message_ids) -> None:
+    """
+    Запоминает сообщения для удаления при следующем переходе по меню.
+    Хранится не больше MAX_TRACKED_MESSAGES последних сообщений, просроченные отбрасываются.
+    """
+    tracked = get_tracked_messages(context)
+    now = time.time()
+    for message_id in message_ids:
+        if message_id and not isinstance(message_id, int):
+            # Иначе объект попадет в user_data и в поток удаления
+            raise TypeError(f"track_messages ожидает message_id (int), получено {type(message_id).__name__}")
+    tracked.extend([message_id, now] for message_id in message_ids if message_id)
+    expired_before = now - MESSAGE_DELETE_MAX_AGE
+    if len(tracked) > MAX_TRACKED_MESSAGES or (tracked and tracked[0][1] < expired_before):
+        tracked[:] = [item for item in tracked[-MAX_TRACKED_MESSAGES:] if item[1] >= expired_before]
+
+
+def reset_tracked_messages(context: CallbackContext, *message_ids) -> None:
+    """Забывает ранее запомненные сообщения (без удаления) и запоминает переданные."""
+    get_tracked_messages(context).clear()
+    track_messages(context, *message_ids)
+
+
+def delete_tracked_messages(context: CallbackContext, chat_id: int) -> None:
+    """
+    Ставит запомненные сообщения чата в очередь на удаление и очищает список.
+    Удаление выполняет фоновый поток, обработчик не ждет ответов Telegram.
+    """
+    tracked = get_tracked_messages(context)
+    expired_before = time.time() - MESSAGE_DELETE_MAX_AGE
+    message_ids = [message_id for message_id, sent_at in tracked if sent_at >= expired_before]
+    tracked.clear()
+    if message_ids:
+        message_deleter.enqueue(context.bot, chat_id, message_ids)
+
+
+class MessageDeleter:
+    """
+    Фоновое удаление сообщений: ИД одного чата, накопившиеся в очереди, удаляются пачками
+    по DELETE_BATCH_SIZE одним вызовом deleteMessages. Частота вызовов ограничена,
+    при RetryAfter поток ждет указанное Telegram время и повторяет вызов.
+    """
+
+    def __init__(self, calls_per_second: float = DELETE_CALLS_PER_SECOND):
+        self.min_interval = 1 / calls_per_second if calls_per_second > 0 else 0
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._last_call = 0.0
+        self._batch_supported = True
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def enqueue(self, bot: Bot, chat_id: int, message_ids: list) -> None:
+        self._ensure_started()
+        with self._pending_lock:
+            pending = self._pending.get(chat_id)
+            if pending is not None:
+                pending[1].update(message_ids)
+                return
+            self._pending[chat_id] = (bot, set(message_ids))
+        self._queue.put(chat_id)
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='message_deleter', daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            chat_id = self._queue.get()
+            with self._pending_lock:
+                bot, message_ids = self._pending.pop(chat_id)
+            # Ошибка одного чата не должна останавливать поток удаления
+            try:
+                message_ids = sorted(message_ids)
+                for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                    self._delete_batch(bot, chat_id, message_ids[start:start + DELETE_BATCH_SIZE])
+            except Exception as e:
+                logger.warning(f"Не удалось удалить сообщения чата {chat_id}: {e}")
+
+    def _wait_rate_limit(self) -> None:
+        delay = self._last_call + self.min_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_call = time.monotonic()
+
+    def _call(self, method, *args, **kwargs):
+        while True:
+            self._wait_rate_limit()
+            try:
+                return method(*args, **kwargs)
+            except telegram.error.RetryAfter as e:
+                logger.warning(f"Telegram ограничил частоту запросов, удаление продолжится через {e.retry_after} с")
+                time.sleep(e.retry_after)
+
+    def _delete_batch(self, bot: Bot, chat_id: int, message_ids: list) -> None:
+        if self._batch_supported:
+            try:
+                # deleteMessages (Bot API 7.0) нет в python-telegram-bot 13, вызываем метод напрямую.
+                # Уже удаленные или недоступные сообщения Telegram пропускает
+                self._call(bot.request.post, f"{bot.base_url}/deleteMessages",
+                           {'chat_id': chat_id, 'message_ids': message_ids})
+                return
+            except telegram.error.InvalidToken:
+                # python-telegram-bot так сообщает об ответе 404: метода нет на сервере Bot API
+                logger.warning("deleteMessages не поддерживается сервером Bot API, удаляем по одному")
+                self._batch_supported = False
+            except telegram.error.BadRequest as e:
+                logger.warning(f"deleteMessages отклонен для чата {chat_id}, удаляем по одному: {e}")
+
+        for message_id in message_ids:
+            try:
+                self._call(bot.delete_message, chat_id=chat_id, message_id=message_id)
+            except telegram.error.BadRequest:
+                # Сообщение уже удалено пользователем или слишком старое
+                pass
+
+
+message_deleter = MessageDeleter()
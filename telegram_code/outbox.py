@@ -0,0 +1,362 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import environs
+import telegram
+from telegram import Bot, Update
+from telegram.ext import CallbackContext
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+# Приоритеты: ответ в чат текущего обновления, уведомление в другой чат, массовая рассылка
+INTERACTIVE = 0
+NOTIFICATION = 1
+BULK = 2
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', NOTIFICATION: 'notification', BULK: 'bulk'}
+
+# Лимиты Telegram: ~30 сообщений в секунду на бота, ~1 в секунду в личный чат, 20 в минуту в группу
+GLOBAL_RATE = env.float("OUTBOX_GLOBAL_RATE", 25)
+GLOBAL_BURST = env.float("OUTBOX_GLOBAL_BURST", 5)
+PRIVATE_CHAT_RATE = env.float("OUTBOX_PRIVATE_CHAT_RATE", 1)
+PRIVATE_CHAT_BURST = env.float("OUTBOX_PRIVATE_CHAT_BURST", 5)
+GROUP_CHAT_RATE = 20 / 60
+GROUP_CHAT_BURST = 3
+# Сколько отправок выполняется параллельно (каждая - HTTP-запрос к Bot API)
+SEND_WORKERS = env.int("OUTBOX_SEND_WORKERS", 8)
+NETWORK_RETRIES = 2
+# Корзины чатов без отправок дольше этого времени (секунды) удаляются
+CHAT_BUCKET_TTL = 600
+
+_current = threading.local()
+
+
+def chat_key(chat_id):
+    """ИД чата как число ('123' и 123 - один чат); @username остается строкой."""
+    try:
+        return int(chat_id)
+    except (TypeError, ValueError):
+        return chat_id
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available_at(self, now: float) -> float:
+        """Момент, когда в корзине будет целый токен (now, если уже есть)."""
+        self.refill(now)
+        ready = now if self.tokens >= 1 else now + (1 - self.tokens) / self.rate
+        return max(ready, self.blocked_until)
+
+    def take(self, now: float) -> None:
+        self.refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        """После RetryAfter: токенов нет до until."""
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = min(self.tokens, 0)
+
+
+class OutboxMetrics:
+    """Глубина очереди и время ожидания отправки по приоритетам."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {'sent': 0, 'errors': 0, 'retry_after': 0, 'wait_total_ms': 0.0, 'wait_max_ms': 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def record(self, priority: int, wait: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stats[PRIORITY_NAMES[priority]]
+            stats['sent'] += int(not error)
+            stats['errors'] += int(error)
+            stats['wait_total_ms'] += wait * 1000
+            stats['wait_max_ms'] = max(stats['wait_max_ms'], wait * 1000)
+
+    def record_retry_after(self, priority: int) -> None:
+        with self._lock:
+            self._stats[PRIORITY_NAMES[priority]]['retry_after'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                done = stats['sent'] + stats['errors']
+                result[name] = {**stats, 'wait_avg_ms': round(stats['wait_total_ms'] / done, 1) if done else 0.0}
+            return result
+
+
+class _Job:
+    __slots__ = ('priority', 'chat_id', 'send', 'args', 'kwargs', 'future', 'enqueued_at', 'network_retries')
+
+    def __init__(self, priority: int, chat_id, send, args, kwargs):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.send = send
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+        self.network_retries = 0
+
+
+class Outbox:
+    """
+    Планировщик исходящих сообщений бота.
+
+    Сообщения одного чата отправляются по очереди, не чаще лимита чата; все вместе - не чаще
+    глобального лимита. Из чатов, готовых к отправке, первым обслуживается чат с более высоким
+    приоритетом первого сообщения в очереди, затем - ждущий дольше. При RetryAfter чат
+    (и глобальная корзина) блокируются на указанное Telegram время, сообщение отправляется повторно.
+
+    Ответы в чат текущего обновления не ждут корзину чата (только блокировку после RetryAfter):
+    их ждет поток обработки обновлений, и ожидание токена чата задерживало бы другие чаты этого потока.
+    Потраченные ими токены уходят в минус и задерживают уведомления и рассылки в этот чат.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, global_burst: float = GLOBAL_BURST,
+                 send_workers: int = SEND_WORKERS):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.metrics = OutboxMetrics()
+        self._send_workers = send_workers
+        self._executor = None
+        self._lock = threading.Condition()
+        self._chats = {}
+        self._chat_buckets = {}
+        self._in_flight = set()
+        self._ready = []
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._thread = None
+
+    @staticmethod
+    def chat_bucket(chat_id) -> TokenBucket:
+        if isinstance(chat_id, str) or chat_id < 0:
+            return TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+        return TokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+
+    def submit(self, chat_id, send, args=(), kwargs=None, priority: int = None) -> Future:
+        """Ставит отправку в очередь; результат (Message) или ошибка - в возвращаемом Future."""
+        chat_id = chat_key(chat_id)
+        if priority is None:
+            priority = get_current_priority(chat_id)
+        job = _Job(priority, chat_id, send, args, kwargs or {})
+        with self._lock:
+            self._ensure_started()
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                queue = self._chats[chat_id] = deque()
+            queue.append(job)
+            if len(queue) == 1 and chat_id not in self._in_flight:
+                self._schedule_chat(chat_id)
+            self._lock.notify()
+        return job.future
+
+    def send(self, chat_id, send, args=(), kwargs=None, priority: int = None):
+        """Отправляет через очередь и ждет результат (для обработчиков, которым нужен message_id)."""
+        return self.submit(chat_id, send, args, kwargs, priority).result()
+
+    def queue_depth(self) -> dict:
+        with self._lock:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for queue in self._chats.values():
+                for job in queue:
+                    depth[PRIORITY_NAMES[job.priority]] += 1
+            return depth
+
+    def _ensure_started(self) -> None:
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._send_workers, thread_name_prefix='outbox_send')
+            self._thread = threading.Thread(target=self._run, name='outbox', daemon=True)
+            self._thread.start()
+
+    def _schedule_chat(self, chat_id) -> None:
+        """Помещает чат в очередь готовых или ожидающих по его корзине (вызывается под _lock)."""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = self.chat_bucket(chat_id)
+        now = time.monotonic()
+        head = self._chats[chat_id][0]
+        if head.priority == INTERACTIVE:
+            available_at = max(now, bucket.blocked_until)
+        else:
+            available_at = bucket.available_at(now)
+        if available_at <= now:
+            heapq.heappush(self._ready, (head.priority, head.enqueued_at, next(self._sequence), chat_id))
+        else:
+            heapq.heappush(self._waiting, (available_at, next(self._sequence), chat_id))
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                job = self._next_job()
+            if job is not None:
+                self._executor.submit(self._execute, job)
+
+    def _next_job(self):
+        """Ждет и возвращает следующую отправку с учетом корзин (вызывается под _lock)."""
+        while True:
+            now = time.monotonic()
+            while self._waiting and self._waiting[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._waiting)
+                self._schedule_chat(chat_id)
+
+            timeout = None
+            if self._ready:
+                global_at = self.global_bucket.available_at(now)
+                if global_at <= now:
+                    _, _, _, chat_id = heapq.heappop(self._ready)
+                    job = self._chats[chat_id].popleft()
+                    self._in_flight.add(chat_id)
+                    self._chat_buckets[chat_id].take(now)
+                    self.global_bucket.take(now)
+                    return job
+                timeout = global_at - now
+            if self._waiting:
+                wait = self._waiting[0][0] - now
+                timeout = wait if timeout is None else min(timeout, wait)
+            self._lock.wait(timeout)
+
+    def _execute(self, job: _Job) -> None:
+        started = time.monotonic()
+        retry = False
+        try:
+            result = job.send(*job.args, **job.kwargs)
+        except telegram.error.RetryAfter as e:
+            self.metrics.record_retry_after(job.priority)
+            logger.warning(f"Telegram ограничил отправку в чат {job.chat_id}, повтор через {e.retry_after} с")
+            until = time.monotonic() + float(e.retry_after)
+            with self._lock:
+                self._chat_buckets[job.chat_id].block(until)
+                self.global_bucket.block(time.monotonic() + min(float(e.retry_after), 1.0))
+            retry = True
+        except telegram.error.NetworkError as e:
+            # TimedOut не повторяем: сообщение могло быть доставлено
+            if isinstance(e, telegram.error.TimedOut) or job.network_retries >= NETWORK_RETRIES:
+                self.metrics.record(job.priority, started - job.enqueued_at, error=True)
+                job.future.set_exception(e)
+            else:
+                job.network_retries += 1
+                retry = True
+        except Exception as e:
+            self.metrics.record(job.priority, started - job.enqueued_at, error=True)
+            job.future.set_exception(e)
+        else:
+            self.metrics.record(job.priority, started - job.enqueued_at)
+            job.future.set_result(result)
+
+        with self._lock:
+            self._in_flight.discard(job.chat_id)
+            queue = self._chats[job.chat_id]
+            if retry:
+                queue.appendleft(job)
+            if queue:
+                self._schedule_chat(job.chat_id)
+            else:
+                del self._chats[job.chat_id]
+                self._forget_idle_buckets()
+            self._lock.notify()
+
+    def _forget_idle_buckets(self) -> None:
+        if len(self._chat_buckets) < 10000:
+            return
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items()
+                        if chat_id not in self._chats and now - bucket.updated > CHAT_BUCKET_TTL]:
+            del self._chat_buckets[chat_id]
+
+
+outbox = Outbox()
+
+
+def get_current_priority(chat_id) -> int:
+    """Приоритет отправки из текущего потока: рассылка, ответ в чат обновления или уведомление."""
+    if getattr(_current, 'bulk', False):
+        return BULK
+    current_chat_id = getattr(_current, 'chat_id', None)
+    if current_chat_id is not None and current_chat_id == chat_key(chat_id):
+        return INTERACTIVE
+    return NOTIFICATION
+
+
+def remember_update_chat(update: object, context: CallbackContext) -> None:
+    """
+    Обработчик TypeHandler(Update) в группе -1: запоминает чат обновления для потока, который его обрабатывает,
+    чтобы ответы в этот чат получали приоритет перед уведомлениями в другие чаты.
+    """
+    chat = update.effective_chat if isinstance(update, Update) else None
+    _current.chat_id = chat.id if chat else None
+
+
+@contextmanager
+def bulk_sends():
+    """Отправки внутри блока (рассылки) получают низший приоритет."""
+    previous = getattr(_current, 'bulk', False)
+    _current.bulk = True
+    try:
+        yield
+    finally:
+        _current.bulk = previous
+
+
+class ScheduledBot(Bot):
+    """Bot, у которого отправка сообщений, фото, документов и видео идет через очередь outbox."""
+
+    def _scheduled(self, send, chat_id, args, kwargs):
+        return outbox.send(chat_id, send, (chat_id,) + args, kwargs)
+
+    def send_message(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().send_message, chat_id, args, kwargs)
+
+    def submit_message(self, chat_id, *args, **kwargs) -> Future:
+        """Ставит сообщение в очередь, не дожидаясь отправки (для рассылок)."""
+        return outbox.submit(chat_id, super().send_message, (chat_id,) + args, kwargs)
+
+    def send_photo(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().send_photo, chat_id, args, kwargs)
+
+    def send_document(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().send_document, chat_id, args, kwargs)
+
+    def send_video(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().send_video, chat_id, args, kwargs)
+
+    def send_invoice(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().send_invoice, chat_id, args, kwargs)
+
+    def copy_message(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().copy_message, chat_id, args, kwargs)
+
+    def forward_message(self, chat_id, *args, **kwargs):
+        return self._scheduled(super().forward_message, chat_id, args, kwargs)
+
+
+def log_outbox_metrics(context=None) -> None:
+    """Пишет в лог глубину очереди и время ожидания отправки (подходит как задача job_queue)."""
+    depth = outbox.queue_depth()
+    for name, stats in outbox.metrics.snapshot().items():
+        logger.info(f"Outbox {name}: queued={depth[name]} sent={stats['sent']} errors={stats['errors']} "
+                    f"retry_after={stats['retry_after']} wait_avg={stats['wait_avg_ms']}ms "
+                    f"wait_max={stats['wait_max_ms']:.1f}ms")
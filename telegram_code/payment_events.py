@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+EVENTS_FILE = os.getenv("YOOKASSA_EVENTS_FILE", "yookassa_events.sqlite3")
+WORKERS = int(os.getenv("YOOKASSA_WORKERS", "4"))
+MAX_ATTEMPTS = int(os.getenv("YOOKASSA_MAX_ATTEMPTS", "12"))
+# Пауза перед повтором: RETRY_BASE * 2^(попытка-1) секунд с jitter, не больше RETRY_MAX
+RETRY_BASE = 5
+RETRY_MAX = 3600
+# Если обработчик упал, не завершив событие, оно снова берется в работу через LEASE секунд
+LEASE = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payment_events (
+    payment_id TEXT PRIMARY KEY,
+    event TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    steps TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    received_at REAL NOT NULL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS payment_events_due_idx ON payment_events (status, next_attempt_at);
+"""
+
+
+class RetryableError(Exception):
+    """Временная ошибка (бэкенд или Telegram недоступны): событие обрабатывается повторно позже."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PermanentError(Exception):
+    """Ошибка в данных события: повтор не поможет, событие помечается failed."""
+
+
+class EventStore:
+    """
+    Уведомления ЮKassa в SQLite, ключ - ИД платежа в ЮKassa. Повторная доставка того же
+    платежа не создает новую запись. Статусы: pending -> processing -> done или failed.
+    """
+
+    def __init__(self, filename: str = EVENTS_FILE):
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None, timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, payment_id: str, event: str, payload: dict) -> bool:
+        """Сохраняет уведомление. Возвращает False, если платеж уже был получен."""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT OR IGNORE INTO payment_events (payment_id, event, payload, next_attempt_at, received_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (payment_id, event, json.dumps(payload, ensure_ascii=False), now, now),
+            )
+            return cursor.rowcount == 1
+
+    def claim(self):
+        """Берет в работу одно событие, готовое к обработке, или возвращает None."""
+        now = time.time()
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT payment_id, payload, steps, attempts, received_at FROM payment_events "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'processing' AND lease_until < ?) "
+                    "ORDER BY next_attempt_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE payment_events SET status = 'processing', lease_until = ?, attempts = attempts + 1 "
+                        "WHERE payment_id = ?",
+                        (now + LEASE, row[0]),
+                    )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        payment_id, payload, steps, attempts, received_at = row
+        return {
+            'payment_id': payment_id,
+            'payload': json.loads(payload),
+            'steps': set(filter(None, steps.split(','))),
+            'attempt': attempts + 1,
+            'received_at': received_at,
+        }
+
+    def complete_step(self, payment_id: str, steps: set) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE payment_events SET steps = ? WHERE payment_id = ?",
+                (','.join(sorted(steps)), payment_id),
+            )
+
+    def finish(self, payment_id: str, status: str, error: str = None) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE payment_events SET status = ?, last_error = ?, processed_at = ?, lease_until = NULL "
+                "WHERE payment_id = ?",
+                (status, error, time.time(), payment_id),
+            )
+
+    def retry_later(self, payment_id: str, delay: float, error: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE payment_events SET status = 'pending', next_attempt_at = ?, last_error = ?, "
+                "lease_until = NULL WHERE payment_id = ?",
+                (time.time() + delay, error, payment_id),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*), AVG(processed_at - received_at) FROM payment_events GROUP BY status"
+            ).fetchall()
+        return {
+            status: {'count': count, 'avg_processing_s': round(avg, 3) if avg is not None else None}
+            for status, count, avg in rows
+        }
+
+
+class PaymentEventProcessor:
+    """
+    Обработка оплаты: активация (payment/activate/ - платеж, роль клиента и стартовый контент
+    в одной транзакции бэкенда) и сообщение пользователю. Бэкенд не активирует повторно платеж
+    с тем же external_payment_id, поэтому повтор шага безопасен.
+    """
+
+    def __init__(self, base_url: str, telegram_api_url: str, bot_token: str):
+        self.base_url = base_url.rstrip('/')
+        self.telegram_url = f"{telegram_api_url.rstrip('/')}/bot{bot_token}"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(WORKERS, 4))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, url: str, payload: dict) -> requests.Response:
+        try:
+            return self.session.post(url, json=payload, timeout=(3.05, 15))
+        except requests.RequestException as e:
+            raise RetryableError(str(e))
+
+    def check_backend_response(self, step: str, response: requests.Response) -> None:
+        if response.ok:
+            return
+        error = f"{step}: {response.status_code} {response.text[:300]}"
+        # 404 - пользователь или тариф еще не найден, 5xx и 429 - бэкенд перегружен
+        if response.status_code >= 500 or response.status_code in (404, 408, 429):
+            raise RetryableError(error)
+        raise PermanentError(error)
+
+    def process(self, event: dict, complete_step) -> None:
+        """Выполняет шаги, не выполненные в прошлых попытках, и отмечает каждый выполненный шаг."""
+        data = event['payload']
+        obj = data.get('object', {})
+        metadata = obj.get('metadata', {})
+        chat_id = metadata.get('chat_id')
+        user_id = int(metadata.get('user_id'))
+        tariff = metadata.get('tariff')
+        amount = obj.get('amount', {}).get('value', '0')
+        steps = event['steps']
+
+        if 'payment' in steps and 'content' not in steps:
+            # Событие начато до перехода на payment/activate/: платеж уже сохранен, осталось открыть контент
+            response = self.post(f"{self.base_url}/bot/start_content/add/", {'user': user_id, 'tariff': tariff})
+            self.check_backend_response('start_content/add', response)
+            steps.add('content')
+            complete_step(steps)
+
+        if 'activation' not in steps and 'content' not in steps:
+            # Доступ отсчитывается от получения уведомления, а не от успешного повтора
+            today = date.fromtimestamp(event['received_at'])
+            one_month_later = date.fromordinal(today.toordinal() + 30)
+            full_payload = {
+                'amount': amount,
+                'user': user_id,
+                'access_date_start': str(today),
+                'access_date_finish': str(one_month_later),
+                'tariff': tariff,
+                'status': "completed",
+                'service_description': f"Оплата тарифа {tariff}",
+                'external_payment_id': event['payment_id'],
+            }
+            response = self.post(f"{self.base_url}/bot/payment/activate/", full_payload)
+            self.check_backend_response('payment/activate', response)
+            steps.add('activation')
+            complete_step(steps)
+
+        if 'message' not in steps:
+            payload = {
+                "chat_id": chat_id,
+                "text": 'Оплата успешно произведена, можете приступать к прохождению курса',
+                "reply_markup": {"inline_keyboard": [[{"text": "📖 Главное меню", "callback_data": "main_menu"}]]},
+            }
+            response = self.post(f"{self.telegram_url}/sendMessage", payload)
+            if response.status_code == 429 or response.status_code >= 500:
+                retry_after = None
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after')
+                raise RetryableError(f"sendMessage: {response.status_code} {response.text[:300]}", retry_after)
+            if not response.ok:
+                # Пользователь заблокировал бота и т.п.: оплата уже учтена, повторять отправку незачем
+                logger.error(f"Сообщение об оплате {event['payment_id']} не отправлено: {response.text}")
+            steps.add('message')
+            complete_step(steps)
+
+
+class PaymentEventWorkers:
+    """Фоновые потоки, которые разбирают сохраненные уведомления с повторами и backoff."""
+
+    def __init__(self, store: EventStore, processor: PaymentEventProcessor, workers: int = WORKERS):
+        self.store = store
+        self.processor = processor
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._started:
+                return
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f'payment_events_{index}', daemon=True).start()
+            self._started = True
+            logger.info(f"Запущено обработчиков уведомлений ЮKassa: {self.workers}")
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                event = self.store.claim()
+            except Exception as e:
+                logger.error(f"Не удалось получить уведомление из очереди: {e}")
+                event = None
+            if event is None:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+            self.handle(event)
+
+    def handle(self, event: dict) -> None:
+        payment_id = event['payment_id']
+        try:
+            self.processor.process(event, lambda steps: self.store.complete_step(payment_id, steps))
+        except RetryableError as e:
+            if event['attempt'] >= MAX_ATTEMPTS:
+                logger.error(f"Уведомление {payment_id} не обработано за {MAX_ATTEMPTS} попыток: {e}")
+                self.store.finish(payment_id, 'failed', str(e))
+                return
+            delay = e.retry_after or min(RETRY_MAX, RETRY_BASE * 2 ** (event['attempt'] - 1))
+            delay = delay * random.uniform(1.0, 1.25)
+            logger.warning(f"Уведомление {payment_id}: {e}, повтор {event['attempt'] + 1} через {delay:.0f} с")
+            self.store.retry_later(payment_id, delay, str(e))
+        except Exception as e:
+            logger.error(f"Уведомление {payment_id} не обработано: {e}")
+            self.store.finish(payment_id, 'failed', str(e))
+        else:
+            self.store.finish(payment_id, 'done')
+            logger.info(f"Оплата {payment_id} обработана, попытка {event['attempt']}")
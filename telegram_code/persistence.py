@@ -0,0 +1,252 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from collections import defaultdict
+from functools import partial
+from typing import DefaultDict, Optional, Tuple
+
+import environs
+from telegram.ext import BasePersistence, Dispatcher
+from telegram.ext.utils.types import ConversationDict
+
+logger = logging.getLogger(__name__)
+
+env = environs.Env()
+env.read_env()
+
+PERSISTENCE_FILE = env.str("BOT_PERSISTENCE_FILE", "bot_persistence.sqlite3")
+# Как часто (секунды) накопленные изменения пишутся в файл
+FLUSH_INTERVAL = env.float("BOT_PERSISTENCE_FLUSH_INTERVAL", 2.0)
+# Ключи bot_data, которые переживают перезапуск. Каталог (catalog) не сохраняется: он загружается с бэкенда
+PERSISTENT_BOT_DATA_KEYS = ('client_updates',)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (key TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL, key TEXT NOT NULL, state BLOB NOT NULL, PRIMARY KEY (name, key)
+);
+"""
+
+
+def dump(value) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def encode_key(key: Tuple[int, ...]) -> str:
+    return ','.join(str(part) for part in key)
+
+
+def decode_key(key: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in key.split(',')) if key else ()
+
+
+class SqlitePersistence(BasePersistence):
+    """
+    Хранит user_data, chat_data, нужные ключи bot_data и состояния ConversationHandler в SQLite.
+
+    Диспетчер вызывает update_* после каждого обновления; здесь изменения только запоминаются
+    (последняя копия по каждому ключу), а в файл их пишет фоновый поток раз в FLUSH_INTERVAL секунд
+    одной транзакцией. При остановке бота (flush) несохраненные изменения записываются сразу.
+    Все данные загружаются при старте одним чтением каждой таблицы.
+
+    После каждой задачи JobQueue диспетчер вызывает update_persistence без обновления, и PTB
+    копирует user_data всех пользователей. attach заменяет этот вызов: сохраняются bot_data
+    и только user_data, отмеченные в задаче через touch_user_data.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        instance = super().__new__(cls, *args, **kwargs)
+        # BasePersistence копирует переданные данные (replace_bot) перед update_bot_data.
+        # Отбираем сохраняемые ключи до копирования, чтобы не копировать каталог на каждом обновлении
+        update_bot_data = instance.update_bot_data
+
+        def update_persistent_bot_data(data: dict) -> None:
+            update_bot_data({key: data[key] for key in PERSISTENT_BOT_DATA_KEYS if key in data})
+
+        object.__setattr__(instance, 'update_bot_data', update_persistent_bot_data)
+        # В user_data и chat_data бота только простые значения (без объектов Bot), а обход insert_bot
+        # занимает большую часть времени восстановления десятков тысяч пользователей - загружаем без него
+        object.__setattr__(instance, 'get_user_data', partial(cls.get_user_data, instance))
+        object.__setattr__(instance, 'get_chat_data', partial(cls.get_chat_data, instance))
+        return instance
+
+    def __init__(self, filename: str = PERSISTENCE_FILE, flush_interval: float = FLUSH_INTERVAL,
+                 store_user_data: bool = True, store_chat_data: bool = False, store_bot_data: bool = True):
+        super().__init__(store_user_data=store_user_data, store_chat_data=store_chat_data,
+                         store_bot_data=store_bot_data, store_callback_data=False)
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self._dirty_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._dirty_user_data = {}
+        self._dirty_chat_data = {}
+        self._dirty_bot_data = None
+        self._dirty_conversations = {}
+        self._touched_users = set()
+        self._conversations = None
+        self._stopped = threading.Event()
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(filename, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='persistence_flusher', daemon=True)
+        self._flusher.start()
+
+    # Загрузка при старте
+
+    def _load_table(self, query: str) -> list:
+        with self._write_lock:
+            return self._connection.execute(query).fetchall()
+
+    def get_user_data(self) -> DefaultDict[int, dict]:
+        rows = self._load_table("SELECT user_id, data FROM user_data")
+        logger.info(f"Восстановлены user_data {len(rows)} пользователей")
+        return defaultdict(dict, ((user_id, pickle.loads(data)) for user_id, data in rows))
+
+    def get_chat_data(self) -> DefaultDict[int, dict]:
+        rows = self._load_table("SELECT chat_id, data FROM chat_data")
+        return defaultdict(dict, ((chat_id, pickle.loads(data)) for chat_id, data in rows))
+
+    def get_bot_data(self) -> dict:
+        rows = self._load_table("SELECT key, data FROM bot_data")
+        return {key: pickle.loads(data) for key, data in rows}
+
+    def get_callback_data(self) -> Optional[tuple]:
+        return None
+
+    def get_conversations(self, name: str) -> ConversationDict:
+        if self._conversations is None:
+            self._conversations = defaultdict(dict)
+            for conversation_name, key, state in self._load_table("SELECT name, key, state FROM conversations"):
+                self._conversations[conversation_name][decode_key(key)] = pickle.loads(state)
+            logger.info(f"Восстановлены состояния диалогов: "
+                        f"{sum(len(states) for states in self._conversations.values())}")
+        return dict(self._conversations.get(name, {}))
+
+    # Изменения от диспетчера: только запоминаются до следующей записи
+
+    def update_user_data(self, user_id: int, data: dict) -> None:
+        with self._dirty_lock:
+            self._dirty_user_data[user_id] = data
+
+    def update_chat_data(self, chat_id: int, data: dict) -> None:
+        with self._dirty_lock:
+            self._dirty_chat_data[chat_id] = data
+
+    def update_bot_data(self, data: dict) -> None:
+        with self._dirty_lock:
+            self._dirty_bot_data = data
+
+    def update_callback_data(self, data) -> None:
+        pass
+
+    def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        with self._dirty_lock:
+            self._dirty_conversations[(name, encode_key(key))] = new_state
+
+    def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # Изменения вне обработки обновлений (задачи JobQueue)
+
+    def touch_user_data(self, user_id: int) -> None:
+        """Отмечает user_data, измененные задачей JobQueue: они сохранятся после этой задачи."""
+        with self._dirty_lock:
+            self._touched_users.add(user_id)
+
+    def attach(self, dispatcher: Dispatcher) -> None:
+        """Заменяет update_persistence диспетчера: вызов без обновления сохраняет только отмеченные user_data."""
+        update_persistence = dispatcher.update_persistence
+
+        def update_touched_persistence(update: object = None) -> None:
+            if update is not None:
+                update_persistence(update)
+                return
+            with self._dirty_lock:
+                user_ids, self._touched_users = self._touched_users, set()
+            if self.store_bot_data:
+                self.update_bot_data(dispatcher.bot_data)
+            if self.store_user_data:
+                for user_id in user_ids:
+                    if user_id in dispatcher.user_data:
+                        self.update_user_data(user_id, dispatcher.user_data[user_id])
+
+        # Dispatcher предупреждает о новых атрибутах экземпляра, ставим в обход __setattr__
+        object.__setattr__(dispatcher, 'update_persistence', update_touched_persistence)
+
+    # Запись
+
+    def _take_dirty(self):
+        with self._dirty_lock:
+            dirty = (self._dirty_user_data, self._dirty_chat_data, self._dirty_bot_data, self._dirty_conversations)
+            self._dirty_user_data, self._dirty_chat_data = {}, {}
+            self._dirty_bot_data, self._dirty_conversations = None, {}
+        return dirty
+
+    def _restore_dirty(self, user_data: dict, chat_data: dict, bot_data: Optional[dict], conversations: dict) -> None:
+        """Возвращает в очередь изменения, которые не удалось записать (более новые копии не затираются)."""
+        with self._dirty_lock:
+            self._dirty_user_data = {**user_data, **self._dirty_user_data}
+            self._dirty_chat_data = {**chat_data, **self._dirty_chat_data}
+            if self._dirty_bot_data is None:
+                self._dirty_bot_data = bot_data
+            self._dirty_conversations = {**conversations, **self._dirty_conversations}
+
+    def write_dirty(self) -> int:
+        """Записывает накопленные изменения одной транзакцией. Возвращает число записанных строк."""
+        user_data, chat_data, bot_data, conversations = self._take_dirty()
+        if not (user_data or chat_data or bot_data is not None or conversations):
+            return 0
+
+        try:
+            user_rows = [(user_id, dump(data)) for user_id, data in user_data.items()]
+            chat_rows = [(chat_id, dump(data)) for chat_id, data in chat_data.items()]
+            bot_rows = [(key, dump(value)) for key, value in bot_data.items()] if bot_data is not None else []
+            state_rows = [(name, key, dump(state)) for (name, key), state in conversations.items()
+                          if state is not None]
+            ended = [(name, key) for (name, key), state in conversations.items() if state is None]
+
+            with self._write_lock:
+                connection = self._connection
+                connection.execute("BEGIN")
+                try:
+                    connection.executemany("INSERT OR REPLACE INTO user_data VALUES (?, ?)", user_rows)
+                    connection.executemany("INSERT OR REPLACE INTO chat_data VALUES (?, ?)", chat_rows)
+                    connection.executemany("INSERT OR REPLACE INTO bot_data VALUES (?, ?)", bot_rows)
+                    connection.executemany("INSERT OR REPLACE INTO conversations VALUES (?, ?, ?)", state_rows)
+                    connection.executemany("DELETE FROM conversations WHERE name = ? AND key = ?", ended)
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+        except Exception:
+            self._restore_dirty(user_data, chat_data, bot_data, conversations)
+            raise
+        return len(user_rows) + len(chat_rows) + len(bot_rows) + len(state_rows) + len(ended)
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.write_dirty()
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояние бота: {e}")
+
+    def flush(self) -> None:
+        """Вызывается Updater при остановке: останавливает фоновую запись и сохраняет остаток."""
+        self._stopped.set()
+        self._flusher.join(timeout=self.flush_interval + 5)
+        written = self.write_dirty()
+        logger.info(f"Состояние бота сохранено при остановке, записей: {written}")
+
+
+def create_persistence() -> SqlitePersistence:
+    """Persistence бота с настройками из окружения (BOT_PERSISTENCE_FILE, BOT_PERSISTENCE_FLUSH_INTERVAL)."""
+    return SqlitePersistence(PERSISTENCE_FILE, FLUSH_INTERVAL)
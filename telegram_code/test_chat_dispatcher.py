@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+from queue import Queue
+
+from telegram import Bot, Chat, Message, Update, User
+from telegram.ext import Filters, MessageHandler
+
+from chat_dispatcher import ChatOrderedDispatcher
+
+# Время обработки одного обновления (ожидание API бэкенда)
+HANDLER_DELAY = 0.05
+
+
+# Запуск из каталога telegram_code: python -m unittest test_chat_dispatcher
+class ChatOrderedDispatcherTests(unittest.TestCase):
+    """Обновления разных чатов обрабатываются параллельно, одного чата - по порядку."""
+
+    def setUp(self):
+        self.bot = Bot('123:TEST')
+        # Имя потоков диспетчера строится из ИД бота: задаем его, чтобы не вызывать getMe
+        self.bot._bot = User(123, 'test_bot', True)
+        self.dispatcher = ChatOrderedDispatcher(self.bot, Queue(), workers=1, use_context=True, update_workers=8)
+        self.handled = {}
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.dispatcher.add_handler(MessageHandler(Filters.text, self.handle))
+        thread = threading.Thread(target=self.dispatcher.start)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.dispatcher.stop)
+
+    def handle(self, update: Update, context) -> None:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(HANDLER_DELAY)
+        with self.lock:
+            self.active -= 1
+            self.handled.setdefault(update.effective_chat.id, []).append(update.message.text)
+
+    def push_updates(self, chats: int, per_chat: int) -> None:
+        update_id = 0
+        for chat_id in range(1, chats + 1):
+            for number in range(per_chat):
+                update_id += 1
+                message = Message(update_id, None, Chat(chat_id, Chat.PRIVATE), text=str(number),
+                                  from_user=User(chat_id, 'user', False), bot=self.bot)
+                self.dispatcher.update_queue.put(Update(update_id, message=message))
+        deadline = time.monotonic() + 10
+        while sum(len(texts) for texts in self.handled.values()) < chats * per_chat:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+    def test_chats_are_processed_in_parallel(self):
+        started = time.monotonic()
+        self.push_updates(chats=16, per_chat=2)
+        self.assertGreater(self.max_active, 1)
+        # Последовательно: 32 * HANDLER_DELAY = 1.6 с
+        self.assertLess(time.monotonic() - started, 16 * HANDLER_DELAY)
+
+    def test_chat_updates_keep_order(self):
+        self.push_updates(chats=4, per_chat=10)
+        for texts in self.handled.values():
+            self.assertEqual(texts, [str(number) for number in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from queue import Queue
+
+from telegram import Bot
+from telegram.ext import Dispatcher
+
+from persistence import SqlitePersistence
+
+
+# Запуск из каталога telegram_code: python -m unittest test_persistence
+class JobPersistenceTests(unittest.TestCase):
+    """После задачи JobQueue сохраняются только user_data, измененные задачей."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.persistence = SqlitePersistence(os.path.join(directory.name, 'bot.sqlite3'), flush_interval=3600)
+        self.addCleanup(self.persistence.flush)
+        self.dispatcher = Dispatcher(Bot('123:TEST'), Queue(), persistence=self.persistence, use_context=True)
+        self.persistence.attach(self.dispatcher)
+        for user_id in range(1, 101):
+            self.dispatcher.user_data[user_id]['role'] = 'client'
+        self.dispatcher.bot_data['client_updates'] = {}
+
+    def test_job_run_does_not_queue_every_user(self):
+        self.dispatcher.update_persistence()
+        self.assertEqual(self.persistence._dirty_user_data, {})
+        self.assertEqual(self.persistence._dirty_bot_data, {'client_updates': {}})
+
+    def test_job_run_queues_touched_users(self):
+        self.dispatcher.user_data[7].pop('role')
+        self.persistence.touch_user_data(7)
+        self.dispatcher.update_persistence()
+        self.assertEqual(self.persistence._dirty_user_data, {7: {}})
+
+        self.dispatcher.update_persistence()
+        self.assertEqual(self.persistence.write_dirty(), 2)
+        self.assertEqual(self.persistence._dirty_user_data, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
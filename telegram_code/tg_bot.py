@@ -4,6 +4,7 @@ import os
 import time
 from datetime import datetime, timedelta
 from enum import Enum, auto
+from queue import Queue
 from textwrap import dedent
 from typing import Dict
 from telegram.utils.request import Request
@@ -14,19 +15,30 @@ import requests
 import telegram
 from bs4 import BeautifulSoup
 from more_itertools import chunked
-from telegram import (Bot, Chat, InlineKeyboardButton, InlineKeyboardMarkup,
+from telegram import (Chat, InlineKeyboardButton, InlineKeyboardMarkup,
                       KeyboardButton, LabeledPrice, Message, ParseMode,
                       ReplyKeyboardMarkup, Update)
 from telegram.ext import (CallbackContext, CallbackQueryHandler,
                           CommandHandler, ConversationHandler, Filters,
-                          MessageHandler, PreCheckoutQueryHandler, Updater)
-
-from text_filters import (ValidLessonFilter, ValidPracticeFilter,
-                          ValidTariffFilter, ValidTestsFilter,
-                          ValidTopicFilter, ValidVideoFilter)
-from utils import (call_api_get, call_api_post, clean_html,
-                   delete_previous_messages, download_youtube_video,
-                   validate_phone_number, create_yookassa_payment)
+                          JobQueue, MessageHandler, PreCheckoutQueryHandler,
+                          TypeHandler, Updater)
+
+from api_client import (call_api_get, call_api_post, configure_api_client,
+                        log_api_metrics)
+import catalog_cache
+from chat_dispatcher import ChatOrderedDispatcher
+from entitlement_sweeper import SWEEP_TIME, sweep_entitlements
+from media_cache import send_cached_media
+from message_tracker import (delete_tracked_messages, reset_tracked_messages,
+                             track_messages)
+from outbox import (SEND_WORKERS, ScheduledBot, log_outbox_metrics,
+                    remember_update_chat)
+from persistence import create_persistence
+from title_filters import (ValidLessonFilter, ValidPracticeFilter,
+                           ValidTariffFilter, ValidTestsFilter,
+                           ValidTopicFilter, ValidVideoFilter)
+from utils import (clean_html, download_youtube_video, validate_phone_number,
+                   create_yookassa_payment)
 
 class States(Enum):
     MAIN_MENU = auto()
@@ -69,8 +81,23 @@ def get_telegram_id(update: Update, context: CallbackContext) -> int:
     return update.message.from_user.id
 
 
+def remember_content_ids(context: CallbackContext, kind: str, items: list) -> None:
+    """
+    Запоминает ИД контента, показанного кнопками (название -> ИД),
+    чтобы после выбора обращаться к API по ИД, а не по названию.
+    """
+    context.user_data[f'{kind}_ids'] = {item['title']: item[f'{kind}_id'] for item in items}
+
+
+def get_content_id(context: CallbackContext, kind: str, title: str):
+    """Возвращает ИД выбранного контента (topic, lesson, video, test, practice) или None, если он неизвестен."""
+    if title == context.user_data.get(f'{kind}_title') and context.user_data.get(f'{kind}_id'):
+        return context.user_data[f'{kind}_id']
+    return context.user_data.get(f'{kind}_ids', {}).get(title)
+
+
 def get_user_role(telegram_id: int) -> str:
-    """Получает роль пользователя через API."""
+    """Получает роль пользователя через API: после оплаты или окончания тарифа роль меняется."""
     try:
         response = call_api_get(f"bot/tg_user/{telegram_id}")
         response.raise_for_status()
@@ -83,7 +110,7 @@ def get_user_role(telegram_id: int) -> str:
 
 def handle_api_error(update: Update, context: CallbackContext, error: Exception, chat_id: int):
     """Обрабатывает ошибку API и возвращает состояние ADMIN."""
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
     menu_msg = "Ошибка при загрузке информации, перешлите это сообщение администратору"
     telegram_id = get_telegram_id(update, context)
     error_msg = dedent(f"""\
@@ -99,9 +126,7 @@ def handle_api_error(update: Update, context: CallbackContext, error: Exception,
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
     admin_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
 
-    if 'prev_message_ids' not in context.user_data:
-        context.user_data['prev_message_ids'] = []
-    context.user_data['prev_message_ids'].append(admin_message_id)
+    track_messages(context, admin_message_id)
 
 
 def send_message_bot(context: CallbackContext, update: Update, text: str, markup, is_callback: bool = False,
@@ -293,6 +318,21 @@ def get_menu_for_role(user_data: dict) -> tuple[str, list[list[str]]]:
     return text, keyboard
 
 
+def refresh_catalog_command(update: Update, context: CallbackContext) -> None:
+    """Команда /refresh_catalog для администратора: сразу перечитывает кэш тем и тарифов бота."""
+    telegram_id = update.effective_user.id
+    if get_user_role(telegram_id) != 'admin':
+        return
+    catalog_cache.invalidate_catalog(context.bot_data)
+    try:
+        catalog = catalog_cache.get_catalog(context)
+    except requests.RequestException as e:
+        logger.error(f"Не удалось обновить каталог: {e}")
+        update.message.reply_text("Не удалось обновить каталог, бэкенд недоступен.")
+        return
+    update.message.reply_text(f"Каталог обновлен, версия контента {catalog['version']}.")
+
+
 def start(update: Update, context: CallbackContext) -> States:
     """
     Старт бота: проверяет пользователя в БД, приветствует его или регистрирует нового.
@@ -304,15 +344,12 @@ def start(update: Update, context: CallbackContext) -> States:
     telegram_id = message.from_user.id
 
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
-    # Инициализируем список
-    if 'prev_message_ids' not in context.user_data:
-        context.user_data['prev_message_ids'] = []
 
     # Безопасно добавляем message_id
     if message:
-        context.user_data['prev_message_ids'].append(message.message_id)
+        track_messages(context, message.message_id)
 
     # Обработка callback_query
     is_callback = bool(query)
@@ -322,12 +359,14 @@ def start(update: Update, context: CallbackContext) -> States:
 
     telegram_id = get_telegram_id(update, context)
     context.user_data["telegram_id"] = telegram_id
-    response = call_api_get(f"bot/tg_user/{telegram_id}")
+    # Пользователь, роль, контакт, тариф, доступный контент и прогресс - одним запросом
+    response = call_api_get(f"bot/bootstrap/{telegram_id}/")
 
     if response.ok:
         user_data = response.json()
         menu_msg, keyboard = get_menu_for_role(user_data)
         context.user_data["user_id"] = user_data["user_id"]
+        remember_content_ids(context, 'topic', user_data["available"]["topics"])
     else:
         username = update.message.from_user.username or update.message.from_user.first_name
         menu_msg = dedent(f"""\
@@ -352,9 +391,7 @@ def start(update: Update, context: CallbackContext) -> States:
 
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
     start_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-    if 'prev_message_ids' not in context.user_data:
-        context.user_data['prev_message_ids'] = []
-    context.user_data['prev_message_ids'].append(start_message_id)
+    track_messages(context, start_message_id)
     return States.TOPICS_MENU
 
 
@@ -364,11 +401,9 @@ def get_topics_name(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором меню
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
-    response = call_api_get(f"bot/topics/")
-    response.raise_for_status()
-    topics = response.json()
+    topics = catalog_cache.get_topics(context)
     topics_buttons = [topic["title"] for topic in topics]
     topics_buttons.extend(["📖 Главное меню"])
     keyboard = list(chunked(topics_buttons, 2))
@@ -380,7 +415,7 @@ def get_topics_name(update: Update, context: CallbackContext) -> States:
                 """)
     is_callback = bool(update.callback_query)
     topic_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-    context.user_data['prev_message_ids'].append(topic_message)
+    track_messages(context, topic_message)
     return States.TOPIC
 
 
@@ -392,12 +427,15 @@ def get_topic_info(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором темы
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
-    response = call_api_get(f"bot/topic/{topic_title}")
     try:
-        response.raise_for_status()
-        topic_data = response.json()
+        topic_data = catalog_cache.get_topic(context, topic_title)
+        if topic_data is None:
+            # Темы еще нет в кэше бота (добавлена только что) - берем из API
+            response = call_api_get(f"bot/topic/{topic_title}")
+            response.raise_for_status()
+            topic_data = response.json()
         description = clean_html(topic_data['description']) if topic_data['description'] else "Описание отсутствует"
 
         menu_msg = dedent(f"""\
@@ -414,24 +452,21 @@ def get_topic_info(update: Update, context: CallbackContext) -> States:
         if topic_data['picture']:
             logger.info(f"Fetching picture: {topic_data['picture']}")
             try:
-                picture_response = requests.get(topic_data['picture'], timeout=10)
-                picture_response.raise_for_status()
-                photo_message = update.message.reply_photo(
-                    photo=picture_response.content,
-                    caption=menu_msg,
-                    parse_mode=ParseMode.HTML
+                photo_message = send_cached_media(
+                    topic_data['picture'], 'photo',
+                    lambda photo: update.message.reply_photo(photo=photo, caption=menu_msg, parse_mode=ParseMode.HTML)
                 )
-                context.user_data['prev_message_ids'].append(photo_message.message_id)
+                track_messages(context, photo_message.message_id)
             except requests.RequestException as e:
                 logger.warning(f"Failed to load picture: {e}")
                 text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-                context.user_data['prev_message_ids'].append(text_message.message_id)
+                track_messages(context, text_message.message_id)
         else:
             text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-            context.user_data['prev_message_ids'].append(text_message.message_id)
+            track_messages(context, text_message.message_id)
 
         menu_message = update.message.reply_text(text='Для возврата выбери тип меню', reply_markup=markup)
-        context.user_data['prev_message_ids'].append(menu_message.message_id)
+        track_messages(context, menu_message.message_id)
         return States.MAIN_MENU
 
     except requests.RequestException as e:
@@ -448,7 +483,7 @@ def handle_invalid_symbol(update: Update, context: CallbackContext) -> States:
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
 
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     keyboard = [["📖 Главное меню", "🗂 Темы уроков"]]
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -459,25 +494,23 @@ def handle_invalid_symbol(update: Update, context: CallbackContext) -> States:
         is_callback=False
     )
 
-    if 'prev_message_ids' not in context.user_data:
-        context.user_data['prev_message_ids'] = []
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     return States.MAIN_MENU
 
 
 def message_to_admin(update: Update, context: CallbackContext) -> States:
     message_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     menu_msg = 'Напишите вопрос администратору и нажмите отправить'
     message_to_admin = send_message_bot(context, update, menu_msg, markup=None, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
     return States.ADMIN
 
 
 def send_to_admin(update: Update, context: CallbackContext) -> States:
     message_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     telegram_id = get_telegram_id(update, context)
     user_fullname = str(update.message.from_user['first_name']) + ' ' + str(update.message.from_user['last_name'])
     message = update.message.text
@@ -493,7 +526,7 @@ def send_to_admin(update: Update, context: CallbackContext) -> States:
                                  resize_keyboard=True,
                                  one_time_keyboard=True)
     message_to_admin = send_message_bot(context, update, menu_msg, markup, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
 
     # Получаем telegram_id администратора из БД
     response = call_api_get('bot/get_tg_admin')
@@ -526,7 +559,7 @@ def send_to_admin(update: Update, context: CallbackContext) -> States:
         menu_msg = "Произошла ошибка отправки сообщения администратору напишите ему по номеру телефона +7 980 300 45 45"
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
         admin_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(admin_message_id)
+        track_messages(context, admin_message_id)
         return States.MAIN_MENU
 
 
@@ -539,7 +572,7 @@ def handle_message_from_client(update: Update, context: CallbackContext):
 
     # Отправляем сообщение администратору с просьбой написать ответ
     message = query.message.reply_text(text='Напиши ответ клиенту и нажми отправить')
-    context.user_data['prev_message_ids'].append(message.message_id)
+    track_messages(context, message.message_id)
     return States.ADMIN_ANSWER
 
 
@@ -547,7 +580,7 @@ def send_message_to_user(update, context):
     telegram_id = get_telegram_id(update, context)
     message_from_admin = update.message.text
     message_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     admin_name = str(update.message.from_user['first_name'])
 
@@ -560,7 +593,7 @@ def send_message_to_user(update, context):
                     """).replace("    ", "")
     update.message.chat.id = context.user_data['client_chat_id']
     admin_message_id = send_message_bot(context, update, message_to_client, markup=None, is_callback=False)
-    context.user_data['prev_message_ids'].append(admin_message_id)
+    track_messages(context, admin_message_id)
 
     update.message.chat.id = telegram_id
     message_keyboard = [['📖 Главное меню']]
@@ -570,7 +603,7 @@ def send_message_to_user(update, context):
                                  one_time_keyboard=True)
     menu_msg = 'сообщение отправлено'
     message_to_admin = send_message_bot(context, update, menu_msg, markup, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
     return States.MAIN_MENU
 
 
@@ -582,7 +615,7 @@ def start_registration(update: Update, context: CallbackContext) -> States:
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
 
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     message_keyboard = [['✅ Согласен', '❌ Не согласен']]
     markup = ReplyKeyboardMarkup(message_keyboard,
@@ -606,7 +639,7 @@ def start_registration(update: Update, context: CallbackContext) -> States:
         filename="Соглашение на обработку персональных данных.pdf",
         caption=menu_msg,
         reply_markup=markup)
-    context.user_data['prev_message_ids'] = [document_message.message_id]
+    reset_tracked_messages(context, document_message.message_id)
     return States.ACCEPT_PRIVACY
 
 
@@ -617,7 +650,7 @@ def cancel_agreement(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение по нажатию кнопки
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     menu_msg = dedent("""
     К сожалению, тогда мы не сможем дать вам возможность пройти тест или провести оплату,
@@ -634,7 +667,7 @@ def cancel_agreement(update: Update, context: CallbackContext) -> States:
     is_callback = bool(update.callback_query)
     agree_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
 
-    context.user_data['prev_message_ids'].append(agree_message_id)
+    track_messages(context, agree_message_id)
     return States.ACCEPT_PRIVACY
 
 
@@ -645,7 +678,7 @@ def start_user_registration(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение по нажатию кнопки
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     menu_msg = dedent("""
         👤 Пожалуйста, напишите свое имя фамилию и город проживания через пробел и нажмите отправить сообщение
@@ -658,7 +691,7 @@ def start_user_registration(update: Update, context: CallbackContext) -> States:
     is_callback = bool(update.callback_query)
     registration_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
 
-    context.user_data['prev_message_ids'].append(registration_message_id)
+    track_messages(context, registration_message_id)
     return States.START_REGISTRATION
 
 
@@ -668,7 +701,7 @@ def get_user_information(update: Update, context: CallbackContext) -> States:
     будущей записи в БД.
     """
     message_answer_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_answer_id)
+    track_messages(context, message_answer_id)
     words_in_user_answer = len(update.message.text.split())
     if words_in_user_answer != 3:
         incorrect_imput_message = update.message.reply_text(dedent("""\
@@ -676,7 +709,7 @@ def get_user_information(update: Update, context: CallbackContext) -> States:
 
         Попробуйте еще раз:
         """))
-        context.user_data['prev_message_ids'].append(incorrect_imput_message.message_id)
+        track_messages(context, incorrect_imput_message.message_id)
         return States.START_REGISTRATION
 
     context.user_data["firstname"], context.user_data["secondname"], context.user_data["city"] = update.message.text.split()
@@ -689,7 +722,7 @@ def get_user_information(update: Update, context: CallbackContext) -> States:
     is_callback = bool(update.callback_query)
     email_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
 
-    context.user_data['prev_message_ids'].append(email_message_id)
+    track_messages(context, email_message_id)
     return States.USER_EMAIL
 
 
@@ -698,7 +731,7 @@ def update_email(update: Update, context: CallbackContext) -> States:
     Перезаписываем email при нажатии кнопки Назад на шаге ввода телефонного номера
     """
     message_answer_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_answer_id)
+    track_messages(context, message_answer_id)
     menu_msg = dedent("""
         👤 Пожалуйста, напишите ваш email в формате user@rambler.com и нажмите отправить сообщение
         """).replace("  ", "")
@@ -708,7 +741,7 @@ def update_email(update: Update, context: CallbackContext) -> States:
     is_callback = bool(update.callback_query)
     email_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
 
-    context.user_data['prev_message_ids'].append(email_message_id)
+    track_messages(context, email_message_id)
     return States.USER_EMAIL
 
 
@@ -718,7 +751,7 @@ def get_user_email(update: Update, context: CallbackContext) -> States:
     будущей записи в БД.
     """
     message_answer_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_answer_id)
+    track_messages(context, message_answer_id)
     context.user_data['user_email'] = update.message.text
 
     keyboard = [
@@ -741,7 +774,7 @@ def get_user_email(update: Update, context: CallbackContext) -> States:
 
     is_callback = bool(update.callback_query)
     phone_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-    context.user_data['prev_message_ids'].append(phone_message_id)
+    track_messages(context, phone_message_id)
     return States.USER_PHONE_NUMBER
 
 
@@ -758,7 +791,7 @@ def send_contact_to_api(update: Update, context: CallbackContext, payload: dict)
             """).replace("  ", "")
             is_callback = bool(update.callback_query)
             phone_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-            context.user_data['prev_message_ids'].append(phone_message_id)
+            track_messages(context, phone_message_id)
             return States.TEST_LEVEL
         else:
             errors = response.json()
@@ -766,30 +799,30 @@ def send_contact_to_api(update: Update, context: CallbackContext, payload: dict)
             if 'email' in errors:
                 error_msg += "- Введите корректный email (например, example@example.com)\n"
                 message_id = send_message_bot(context, update, error_msg, markup=None, is_callback=False)
-                context.user_data['prev_message_ids'].append(message_id)
+                track_messages(context, message_id)
                 return States.USER_EMAIL
             if 'phonenumber' in errors:
                 error_msg += "- Введите корректный номер телефона (например, +79991234567)\n"
                 message_keyboard = [[KeyboardButton('Отправить свой номер телефона', request_contact=True)]]
                 markup = ReplyKeyboardMarkup(message_keyboard, one_time_keyboard=True, resize_keyboard=True)
                 message_id = send_message_bot(context, update, error_msg, markup, is_callback=False)
-                context.user_data['prev_message_ids'].append(message_id)
+                track_messages(context, message_id)
                 return States.USER_PHONE_NUMBER
             error_msg += f"- Неизвестная ошибка: {errors}"
             message_id = send_message_bot(context, update, error_msg, markup=None, is_callback=False)
-            context.user_data['prev_message_ids'].append(message_id)
+            track_messages(context, message_id)
             return States.MAIN_MENU
     except requests.RequestException as e:
         error_msg = f"Ошибка подключения к серверу: {str(e)}"
         message_id = send_message_bot(context, update, error_msg, markup=None, is_callback=False)
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.MAIN_MENU
 
 
 def get_user_phone_number(update: Update, context: CallbackContext) -> int:
     """Получаем и валидируем номер телефона пользователя."""
     message_answer_id = update.message.message_id
-    context.user_data.setdefault('prev_message_ids', []).append(message_answer_id)
+    track_messages(context, message_answer_id)
 
     # Получаем номер телефона
     if update.message.contact:
@@ -805,7 +838,7 @@ def get_user_phone_number(update: Update, context: CallbackContext) -> int:
         Введённый номер некорректен. Попробуйте снова (например, +79991234567):
         """)
         message_id = update.message.reply_text(error_message, reply_markup=markup).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.USER_PHONE_NUMBER
 
     context.user_data["phone_number"] = phone_number
@@ -838,62 +871,68 @@ def start_test(update: Update, context: CallbackContext) -> States:
             return States.MAIN_MENU
 
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     telegram_id = get_telegram_id(update, context)
     if not telegram_id:
         logger.error("Не удалось получить telegram_id")
         message_id = context.bot.send_message(chat_id=chat_id, text="Ошибка: пользователь не идентифицирован.",
-                                              parse_mode=ParseMode.HTML)
-        context.user_data['prev_message_ids'] = context.user_data.get('prev_message_ids', []) + [message_id]
+                                              parse_mode=ParseMode.HTML).message_id
+        track_messages(context, message_id)
         return States.MAIN_MENU
 
+    test_id = get_content_id(context, 'test', test_title)
     # Проверяем роль пользователя
     user_role = get_user_role(telegram_id)
     if user_role not in ('admin', 'client'):
         test_title = "Тест уровня"
+        test_id = None
 
-    response = call_api_get(f'bot/start_test/{test_title}')
+    # Попытка создается на сервере, правильные ответы в бот не передаются
+    payload = {'telegram_id': telegram_id, 'test_id': test_id, 'test_title': test_title}
+    response = call_api_post('/bot/test_attempt/start/', payload)
     if response.ok:
-        test_data = response.json()
+        attempt_data = response.json()
         context.user_data['test_title'] = test_title
+        # Вопросы целиком не храним: только попытку и текущий вопрос
+        for key in ('questions', 'correct_answers', 'show_right_answer'):
+            context.user_data.pop(key, None)
         context.user_data.update({
-            'test_id': test_data['test_id'],
-            'questions': test_data['questions'],
-            'show_right_answer': test_data['show_right_answer'],
+            'test_id': attempt_data['test_id'],
+            'test_attempt_id': attempt_data['attempt_id'],
+            'questions_total': attempt_data['questions_total'],
+            'current_question': attempt_data['questions'][0],
             'current_question_index': 0,
-            'correct_answers': 0,
-            'prev_message_ids': [],
             'chat_id': chat_id,
             'user_role': user_role,
             'user_id': context.user_data.get('user_id'),
             'telegram_id': telegram_id
         })
+        reset_tracked_messages(context)
         return show_question(chat_id, context)
     else:
-        message_id = context.bot.send_message(chat_id=chat_id, text="Тест не найден.", parse_mode=ParseMode.HTML)
-        context.user_data['prev_message_ids'] = context.user_data.get('prev_message_ids', []) + [message_id]
+        message_id = context.bot.send_message(chat_id=chat_id, text="Тест не найден.",
+                                              parse_mode=ParseMode.HTML).message_id
+        track_messages(context, message_id)
         return States.TEST_LEVEL
 
 
 def show_question(chat_id: int, context: CallbackContext) -> States:
     """Показывает текущий вопрос с вариантами ответа."""
-    questions = context.user_data['questions']
+    question = context.user_data.get('current_question')
+    questions_total = context.user_data['questions_total']
     current_question_index = context.user_data['current_question_index']
-    prev_message_ids = context.user_data['prev_message_ids']
 
-    """Показывает текущий вопрос с вариантами ответа."""
-    if current_question_index >= len(questions):
+    if question is None:
         return show_test_result(chat_id, context)
 
-    question = questions[current_question_index]
     answers = question['answers']
     answers_text = "\n".join([f"<b>{answer['serial_number']}</b>. {answer['description']}" for answer in answers])
     keyboard = [[str(answer['serial_number']) for answer in answers]]
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
 
     msg = dedent(f"""
-    Вопрос {current_question_index + 1}/{len(questions)}:
+    Вопрос {current_question_index + 1}/{questions_total}:
     {question['description']}
 
     Варианты ответа:
@@ -905,14 +944,11 @@ def show_question(chat_id: int, context: CallbackContext) -> States:
     picture = question.get('picture')
     if picture and isinstance(picture, str) and picture.strip():
         try:
-            picture_response = requests.get(picture, timeout=5)
-            picture_response.raise_for_status()
-            message_id = context.bot.send_photo(
-                chat_id=chat_id,
-                photo=picture_response.content,
-                caption=msg,
-                reply_markup=markup,
-                parse_mode=ParseMode.HTML
+            message_id = send_cached_media(
+                picture, 'photo',
+                lambda photo: context.bot.send_photo(chat_id=chat_id, photo=photo, caption=msg,
+                                                     reply_markup=markup, parse_mode=ParseMode.HTML),
+                timeout=5
             ).message_id
         except (requests.RequestException, telegram.error.BadRequest) as e:
             print(f"Ошибка загрузки или отправки фото: {e}. Используем текст.")
@@ -930,70 +966,76 @@ def show_question(chat_id: int, context: CallbackContext) -> States:
             parse_mode=ParseMode.HTML
         ).message_id
 
-    prev_message_ids.append(message_id)
-    context.user_data['prev_message_ids'] = prev_message_ids
+    track_messages(context, message_id)
     return States.TEST_QUESTION
 
 
 def handle_answer(update: Update, context: CallbackContext) -> States:
-    """Обрабатывает ответ пользователя."""
+    """Отправляет ответ пользователя на проверку в API и показывает следующий вопрос."""
     chat_id = update.message.chat_id
     user_answer = update.message.text
-    context.user_data['prev_message_ids'] = context.user_data.get('prev_message_ids', []) + [update.message.message_id]
+    track_messages(context, update.message.message_id)
 
-    if 'questions' not in context.user_data or 'current_question_index' not in context.user_data:
+    if 'test_attempt_id' not in context.user_data or 'current_question_index' not in context.user_data:
         context.bot.send_message(chat_id=chat_id, text="Ошибка: состояние теста не найдено. Начните тест заново.",
                                  parse_mode=ParseMode.HTML)
         return States.TEST_LEVEL
 
-    questions = context.user_data['questions']
-    current_question_index = context.user_data['current_question_index']
-    show_right_answer = context.user_data.get('show_right_answer', False)
-    correct_answers = context.user_data['correct_answers']
-    prev_message_ids = context.user_data['prev_message_ids']
+    question = context.user_data.get('current_question')
+    attempt_id = context.user_data['test_attempt_id']
 
     # Проверяем, завершён ли тест
-    if current_question_index >= len(questions):
+    if question is None:
         context.bot.send_message(chat_id=chat_id, text="Тест уже завершён. Результаты отображены.", parse_mode=ParseMode.HTML)
-        delete_previous_messages(context, chat_id, prev_message_ids)
+        delete_tracked_messages(context, chat_id)
         return States.MAIN_MENU
 
-    question = questions[current_question_index]
-    answers = question['answers']
-
-    correct_answers_list = [a for a in answers if a['right']]
-    correct_serial_numbers = {str(a['serial_number']) for a in answers if a['right']}
-
-    try:
-        user_answers = set(user_answer.split(',')) if user_answer else set()
-    except ValueError:
+    payload = {'question_id': question['question_id'], 'answer': user_answer or ''}
+    response = call_api_post(f'/bot/test_attempt/{attempt_id}/answer/', payload)
+    if response.status_code == 400:
         message_id = context.bot.send_message(chat_id=chat_id,
                                               text="Ошибка: укажите номера ответов через запятую (например, 1,2).",
                                               parse_mode=ParseMode.HTML).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
 
         return States.TEST_QUESTION
+    if response.status_code == 409:
+        # Попытка уже завершена или тест изменился: ответы в нее больше не принимаются
+        logger.warning(f"Ответ не принят попыткой {attempt_id}: {response.text[:300]}")
+        for key in ('test_attempt_id', 'current_question', 'current_question_index'):
+            context.user_data.pop(key, None)
+        delete_tracked_messages(context, chat_id)
+        keyboard = [["📝 Доступные темы", "📖 Главное меню"]]
+        markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+        message_id = context.bot.send_message(chat_id=chat_id,
+                                              text="Эта попытка теста уже завершена. Начните тест заново.",
+                                              reply_markup=markup, parse_mode=ParseMode.HTML).message_id
+        track_messages(context, message_id)
+        return States.MAIN_MENU
+    try:
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error(f"Ошибка проверки ответа в попытке {attempt_id}: {e}")
+        return handle_api_error(update, context, e, chat_id)
+    result = response.json()
 
-    if user_answers == correct_serial_numbers:
-        correct_answers += 1
+    if result['is_correct']:
         msg = "🎉 Правильно!"
         message_id = context.bot.send_message(chat_id=chat_id, text=msg, reply_markup=None,
                                               parse_mode=ParseMode.HTML).message_id
     else:
-        if show_right_answer:
-            correct_descriptions = "\n".join([f"{a['serial_number']}. {a['description']}" for a in correct_answers_list])
+        if result['right_answers']:
+            correct_descriptions = "\n".join([f"{a['serial_number']}. {a['description']}" for a in result['right_answers']])
             msg = f"❌ Неправильно. Правильные ответы:\n{correct_descriptions}"
         else:
             msg = "❌ Неправильно."
         message_id = context.bot.send_message(chat_id=chat_id, text=msg, parse_mode=ParseMode.HTML).message_id
 
-    context.user_data['prev_message_ids'].append(message_id)
-    current_question_index += 1
+    track_messages(context, message_id)
 
     context.user_data.update({
-        'current_question_index': current_question_index,
-        'correct_answers': correct_answers,
-        'prev_message_ids': prev_message_ids
+        'current_question': result['next_question'],
+        'current_question_index': context.user_data['current_question_index'] + 1,
     })
 
     return show_question(chat_id, context)
@@ -1001,26 +1043,33 @@ def handle_answer(update: Update, context: CallbackContext) -> States:
 
 def show_test_result(chat_id: int, context: CallbackContext) -> States:
     """Показывает итоговый результат теста."""
-    prev_message_ids = context.user_data.get('prev_message_ids', [])
-    delete_previous_messages(context, chat_id, prev_message_ids)
+    delete_tracked_messages(context, chat_id)
 
-    questions = context.user_data['questions']
-    correct_answers = context.user_data['correct_answers']
     user_role = context.user_data['user_role']
     user_id = context.user_data['user_id']
     test_id = context.user_data['test_id']
+    attempt_id = context.user_data['test_attempt_id']
 
-    total_questions = len(questions)
-    percentage = (correct_answers / total_questions) * 100
+    # Результат считается на сервере по сохраненным ответам попытки
+    try:
+        response = call_api_post(f'/bot/test_attempt/{attempt_id}/finish/', {})
+        response.raise_for_status()
+        attempt_result = response.json()
+    except requests.RequestException as e:
+        logger.error(f"Ошибка завершения попытки {attempt_id}: {e}")
+        message_id = context.bot.send_message(chat_id=chat_id, text="Ошибка при подсчете результата теста.",
+                                              parse_mode=ParseMode.HTML).message_id
+        reset_tracked_messages(context, message_id)
+        return States.MAIN_MENU
+    percentage = attempt_result['percentage']
 
     if user_role in ('admin', 'client'):
-        if percentage >= 80:
-            payload = {'user_id': user_id, 'test_id': test_id}
-            logger.info(f"Добавление контента: user_id={user_id}, test_id={test_id}")
-            logger.info(f"payload: {payload}")
-            result = add_content_via_api('/bot/next_content_test/add/', payload, context)
-            if not result or result[0] is None:
-                logger.error(f"Failed to add content, result: {result}")
+        if attempt_result['passed']:
+            # Следующий контент открывает сам бэкенд при завершении пройденной попытки
+            unlock = attempt_result.get('unlock')
+            if not unlock or not unlock.get('next_content'):
+                logger.error(f"Контент после теста не открыт: user_id={user_id}, test_id={test_id}, "
+                             f"attempt_id={attempt_id}, unlock={unlock}")
                 keyboard = [["📝 Доступные темы", "📖 Главное меню"]]
                 markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
                 message_id = context.bot.send_message(
@@ -1029,35 +1078,31 @@ def show_test_result(chat_id: int, context: CallbackContext) -> States:
                     reply_markup=markup,
                     parse_mode=ParseMode.HTML
                 ).message_id
-                context.user_data['prev_message_ids'].append(message_id)
+                track_messages(context, message_id)
                 return States.MAIN_MENU
 
-            next_content, next_step, next_step_params = result
+            next_content = unlock['next_content']
+            next_step = unlock.get('next_step')
+            next_step_params = unlock.get('next_step_params', {})
 
             # Формируем и отправляем сообщение о новом контенте
             menu_msg = format_content_message(next_content)
             message_id = send_content_message(context, menu_msg, chat_id=chat_id)
-            context.user_data['prev_message_ids'].append(message_id)
+            track_messages(context, message_id)
 
             logger.info(f"Next step determined: {next_step}, params: {next_step_params}")
 
+            # Параметры следующего шага содержат названия и ИД контента
+            context.user_data.update(next_step_params)
             if next_step == 'topic':
-                context.user_data['topic_title'] = next_step_params.get('topic_title')
                 return States.AVAILABLE_TOPIC
             elif next_step == 'lesson':
-                context.user_data['topic_title'] = next_step_params.get('topic_title')
-                context.user_data['lesson_title'] = next_step_params.get('lesson_title')
                 return States.AVAILABLE_LESSON
             elif next_step == 'video':
-                context.user_data['video_title'] = next_step_params.get('video_title')
-                context.user_data['lesson_title'] = next_step_params.get('lesson_title')
                 return States.AVAILABLE_FINISH_VIDEO
             elif next_step == 'test':
-                context.user_data['test_title'] = next_step_params.get('test_title')
                 return States.AVAILABLE_FINISH_TEST
             elif next_step == 'practice':
-                context.user_data['practice_title'] = next_step_params.get('practice_title')
-                context.user_data['lesson_title'] = next_step_params.get('lesson_title')
                 return States.AVAILABLE_FINISH_PRACTICE
             else:
                 return States.AVAILABLE_FINISH
@@ -1071,7 +1116,7 @@ def show_test_result(chat_id: int, context: CallbackContext) -> States:
                 reply_markup=markup,
                 parse_mode=ParseMode.HTML
             ).message_id
-            context.user_data['prev_message_ids'].append(message_id)
+            track_messages(context, message_id)
             return States.MAIN_MENU
 
     result_msg = "{:.0f}% правильных ответов - твой результат \n".format(percentage)
@@ -1090,7 +1135,7 @@ def show_test_result(chat_id: int, context: CallbackContext) -> States:
         reply_markup=markup,
         parse_mode=ParseMode.HTML
     ).message_id
-    context.user_data['prev_message_ids'] = [message_id]
+    reset_tracked_messages(context, message_id)
     return States.TEST_QUESTION
 
 
@@ -1107,7 +1152,7 @@ def start_payment(update: Update, context: CallbackContext) -> States:
         context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
 
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     telegram_id = get_telegram_id(update, context)
     response = call_api_get(f"bot/tg_user/{telegram_id}")
@@ -1121,9 +1166,7 @@ def start_payment(update: Update, context: CallbackContext) -> States:
 
                 Вы уже зарегистрированы в нашем проекте, поэтому можем перейти к выбору тарифа
             """)
-        response = call_api_get(f"bot/tariffs/")
-        response.raise_for_status()
-        tariffs = response.json()
+        tariffs = catalog_cache.get_tariffs(context)
         tariffs_buttons = [tariff["title"] for tariff in tariffs]
         tariffs_buttons.extend(["🗂 Темы уроков"])
         keyboard = list(chunked(tariffs_buttons, 2))
@@ -1132,7 +1175,7 @@ def start_payment(update: Update, context: CallbackContext) -> States:
                                      one_time_keyboard=True)
         is_callback = bool(update.callback_query)
         registration_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'] = [registration_message]
+        reset_tracked_messages(context, registration_message)
         return States.TARIFF
 
     else:
@@ -1146,7 +1189,7 @@ def start_payment(update: Update, context: CallbackContext) -> States:
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
         is_callback = bool(update.callback_query)
         registration_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'] = [registration_message]
+        reset_tracked_messages(context, registration_message)
         return States.ACCEPT_PRIVACY
 
 
@@ -1158,12 +1201,14 @@ def get_tariff_info(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
-    response = call_api_get(f"bot/tariff/{tariff_title}")
     try:
-        response.raise_for_status()
-        tariff_data = response.json()
+        tariff_data = catalog_cache.get_tariff(context, tariff_title)
+        if tariff_data is None:
+            response = call_api_get(f"bot/tariff/{tariff_title}")
+            response.raise_for_status()
+            tariff_data = response.json()
         description = clean_html(tariff_data['description']) if tariff_data['description'] else "Описание отсутствует"
         context.user_data['tariff_title'] = tariff_data['title']
         context.user_data['tariff_price'] = tariff_data['price']
@@ -1186,7 +1231,7 @@ def get_tariff_info(update: Update, context: CallbackContext) -> States:
 
         is_callback = bool(update.callback_query)
         tariff_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(tariff_message_id)
+        track_messages(context, tariff_message_id)
         return States.PAYMENT
 
     except requests.RequestException as e:
@@ -1229,7 +1274,7 @@ def send_payment(update, context):
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode='Markdown'
     ).message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     return States.PAYMENT
 
 
@@ -1252,7 +1297,7 @@ def send_invoice(update: Update, context: CallbackContext) -> States:
                     3. Прикрепите файл с чеком к сообщению и нажмите отправить
                     """).replace("  ", "")
     message_to_admin = send_message_bot(context, update, menu_msg, markup=None, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
     return States.INVOICE
 
 
@@ -1270,7 +1315,7 @@ def send_invoice_to_admin(update: Update, context: CallbackContext) -> States:
                                  resize_keyboard=True,
                                  one_time_keyboard=True)
     message_to_admin = send_message_bot(context, update, menu_msg, markup, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
 
     # Получаем telegram_id администратора из БД
     response = call_api_get('bot/get_tg_admin')
@@ -1308,7 +1353,7 @@ def send_invoice_to_admin(update: Update, context: CallbackContext) -> States:
                    " напишите ему по номеру телефона +7 980 300 45 45"
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
         admin_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(admin_message_id)
+        track_messages(context, admin_message_id)
         return States.MAIN_MENU
 
 
@@ -1322,7 +1367,7 @@ def get_admin_invoice_approval(update: Update, context: CallbackContext):
     client_chat_id = callback_data.split('_')[-1]
 
     message_id = query.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     menu_msg = 'Ответ отправлен пользователю. Нажмите кнопку "📖 Главное меню" или /start'
     keyboard = [["📖 Главное меню"]]
@@ -1333,8 +1378,8 @@ def get_admin_invoice_approval(update: Update, context: CallbackContext):
         text=menu_msg,
         reply_markup=markup,
         parse_mode=ParseMode.HTML
-    )
-    context.user_data['prev_message_ids'].append(message_id)
+    ).message_id
+    track_messages(context, message_id)
 
     # Формируем и отправляем сообщение о новом контенте клиенту
     menu_msg = 'Администратор проверил и утвердил вашу оплату. Вам доступны уроки по кнопке "📝 Доступные темы"'
@@ -1346,7 +1391,7 @@ def get_admin_invoice_approval(update: Update, context: CallbackContext):
         reply_markup=markup,
         parse_mode=ParseMode.HTML
     ).message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     return States.AVAILABLE_FINISH  # Состояние для администратора
 
 
@@ -1357,7 +1402,7 @@ def show_tariff_info(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     telegram_id = get_telegram_id(update, context)
     response = call_api_get(f"bot/tg_user/{telegram_id}")
@@ -1366,7 +1411,15 @@ def show_tariff_info(update: Update, context: CallbackContext) -> States:
         response.raise_for_status()
         user_data = response.json()
         logger.info(f"User info: {user_data }")
-        tariff_data = user_data['payments'][-1]
+        tariff_data = user_data['entitlement']
+        if not tariff_data or not tariff_data['tariff_detail']:
+            keyboard = [["🔙 Назад"]]
+            markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+            is_callback = bool(update.callback_query)
+            tariff_message_id = send_message_bot(context, update, "У вас нет оплаченного тарифа", markup,
+                                                 is_callback)
+            track_messages(context, tariff_message_id)
+            return States.MAIN_MENU
         tariff_title = tariff_data['tariff_detail']['title']
         tariff_price = tariff_data['tariff_detail']['price']
         tariff_description = clean_html(tariff_data['tariff_detail']['description']) if tariff_data[
@@ -1397,7 +1450,7 @@ def show_tariff_info(update: Update, context: CallbackContext) -> States:
 
         is_callback = bool(update.callback_query)
         tariff_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(tariff_message_id)
+        track_messages(context, tariff_message_id)
         return States.MAIN_MENU
 
     except requests.RequestException as e:
@@ -1412,16 +1465,17 @@ def get_available_topics_name(update: Update, context: CallbackContext) -> State
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     telegram_id = get_telegram_id(update, context)
-    response = call_api_get(f"bot/available_topics/{telegram_id}")
+    response = call_api_get(f"bot/available_content/{telegram_id}/")
     response.raise_for_status()
 
     availability = response.json()
     topics = availability['topics']
     logger.info(f"Topics for keyboard: {[topic['title'] for topic in topics]}")
     context.user_data['available_lessons'] = availability['lessons']
+    remember_content_ids(context, 'topic', topics)
     topics_buttons = [topic["title"] for topic in topics]
     topics_buttons.extend(["📖 Главное меню"])
     keyboard = list(chunked(topics_buttons, 2))
@@ -1433,7 +1487,7 @@ def get_available_topics_name(update: Update, context: CallbackContext) -> State
                 """)
     is_callback = bool(update.callback_query)
     topic_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-    context.user_data['prev_message_ids'] = [topic_message]
+    reset_tracked_messages(context, topic_message)
     return States.AVAILABLE_TOPIC
 
 
@@ -1447,21 +1501,22 @@ def get_available_topic_info(update: Update, context: CallbackContext) -> States
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
+    topic_id = get_content_id(context, 'topic', topic_title)
     context.user_data["topic_title"] = topic_title
+    context.user_data["topic_id"] = topic_id
 
-    response = call_api_get(f"bot/topic/{topic_title}")
+    if topic_id:
+        response = call_api_get(f"bot/topic_by_id/{topic_id}/")
+    else:
+        response = call_api_get(f"bot/topic/{topic_title}")
     try:
         response.raise_for_status()
         topic_data = response.json()
+        context.user_data["topic_id"] = topic_data['topic_id']
         description = clean_html(topic_data['description']) if topic_data['description'] else "Описание отсутствует"
 
-        response_all_topic_lessons = call_api_get(f"bot/topic_lessons/{topic_title}")
-        response_all_topic_lessons.raise_for_status()
-        topic_lessons_data = response_all_topic_lessons.json()
-        topic_lessons_id = [lesson["lesson_id"] for lesson in topic_lessons_data]
-
         menu_msg = dedent(f"""\
             <b>Тема:</b>
             {topic_data['title']}
@@ -1471,10 +1526,11 @@ def get_available_topic_info(update: Update, context: CallbackContext) -> States
         """).replace("  ", "")
 
         telegram_id = get_telegram_id(update, context)
-        response = call_api_get(f"bot/available_topics/{telegram_id}")
+        response = call_api_get(f"bot/available_content/{telegram_id}/?topic_id={topic_data['topic_id']}")
         response.raise_for_status()
         availability = response.json()
-        topics_buttons = [lesson["title"] for lesson in availability['lessons'] if lesson["lesson_id"] in topic_lessons_id]
+        remember_content_ids(context, 'lesson', availability['lessons'])
+        topics_buttons = [lesson["title"] for lesson in availability['lessons']]
         topics_buttons.extend(["📖 Главное меню", "🔙 Назад"])
         keyboard = list(chunked(topics_buttons, 2))
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -1483,24 +1539,21 @@ def get_available_topic_info(update: Update, context: CallbackContext) -> States
         if topic_data['picture']:
             logger.info(f"Fetching picture: {topic_data['picture']}")
             try:
-                picture_response = requests.get(topic_data['picture'], timeout=10)
-                picture_response.raise_for_status()
-                photo_message = update.message.reply_photo(
-                    photo=picture_response.content,
-                    caption=menu_msg,
-                    parse_mode=ParseMode.HTML
+                photo_message = send_cached_media(
+                    topic_data['picture'], 'photo',
+                    lambda photo: update.message.reply_photo(photo=photo, caption=menu_msg, parse_mode=ParseMode.HTML)
                 )
-                context.user_data['prev_message_ids'].append(photo_message.message_id)
+                track_messages(context, photo_message.message_id)
             except requests.RequestException as e:
                 logger.warning(f"Failed to load picture: {e}")
                 text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-                context.user_data['prev_message_ids'].append(text_message.message_id)
+                track_messages(context, text_message.message_id)
         else:
             text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-            context.user_data['prev_message_ids'].append(text_message.message_id)
+            track_messages(context, text_message.message_id)
 
         menu_message = update.message.reply_text(text='Выбери доступные уроки', reply_markup=markup)
-        context.user_data['prev_message_ids'].append(menu_message.message_id)
+        track_messages(context, menu_message.message_id)
         return States.AVAILABLE_LESSON
 
     except requests.RequestException as e:
@@ -1521,13 +1574,18 @@ def get_lesson_info(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
-    response = call_api_get(f"bot/lesson/{topic_title}/{lesson_title}")
+    lesson_id = get_content_id(context, 'lesson', lesson_title)
+    if lesson_id:
+        response = call_api_get(f"bot/lesson_by_id/{lesson_id}/")
+    else:
+        response = call_api_get(f"bot/lesson/{topic_title}/{lesson_title}")
     try:
         response.raise_for_status()
         lesson_data = response.json()
         context.user_data["lesson_title"] = lesson_data['title']
+        context.user_data["lesson_id"] = lesson_data['lesson_id']
         description = clean_html(lesson_data['description']) if lesson_data['description'] else "Описание отсутствует"
 
         menu_msg = dedent(f"""\
@@ -1547,26 +1605,23 @@ def get_lesson_info(update: Update, context: CallbackContext) -> States:
         if lesson_data['picture']:
             logger.info(f"Fetching picture: {lesson_data['picture']}")
             try:
-                lesson_response = requests.get(lesson_data['picture'])
-                lesson_response.raise_for_status()
-                photo_message = update.message.reply_photo(
-                    photo=lesson_response.content,
-                    caption=menu_msg,
-                    parse_mode=ParseMode.HTML
+                photo_message = send_cached_media(
+                    lesson_data['picture'], 'photo',
+                    lambda photo: update.message.reply_photo(photo=photo, caption=menu_msg, parse_mode=ParseMode.HTML)
                 )
-                context.user_data['prev_message_ids'].append(photo_message.message_id)
+                track_messages(context, photo_message.message_id)
             except requests.RequestException as e:
                 logger.warning(f"Failed to load picture: {e}")
                 text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-                context.user_data['prev_message_ids'].append(text_message.message_id)
+                track_messages(context, text_message.message_id)
 
         else:
             text_message = update.message.reply_text(menu_msg, parse_mode=ParseMode.HTML)
-            context.user_data['prev_message_ids'].append(text_message.message_id)
+            track_messages(context, text_message.message_id)
 
 
         menu_message = update.message.reply_text(text='Начинай с просмотра видео', reply_markup=markup)
-        context.user_data['prev_message_ids'].append(menu_message.message_id)
+        track_messages(context, menu_message.message_id)
         return States.AVAILABLE_ITEMS
 
     except requests.RequestException as e:
@@ -1581,23 +1636,22 @@ def get_available_video_title(update: Update, context: CallbackContext) -> State
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     try:
         lesson_title = context.user_data["lesson_title"]
         topic_title = context.user_data["topic_title"]
-        response_all_lesson_video = call_api_get(f"bot/lesson_video/{topic_title}/{lesson_title}")
-        response_all_lesson_video.raise_for_status()
-        lesson_video_data = response_all_lesson_video.json()
-        lesson_video_id = [lesson["video_id"] for lesson in lesson_video_data]
-
         telegram_id = get_telegram_id(update, context)
-        response = call_api_get(f"bot/available_topics/{telegram_id}")
+        lesson_id = context.user_data.get("lesson_id")
+        if lesson_id:
+            response = call_api_get(f"bot/available_lesson_video_by_id/{telegram_id}/{lesson_id}/")
+        else:
+            response = call_api_get(f"bot/available_lesson_video/{telegram_id}/{topic_title}/{lesson_title}/")
         response.raise_for_status()
 
-        availability = response.json()
-        videos = availability['videos']
-        video_buttons = [video["title"] for video in videos if video["video_id"] in lesson_video_id]
+        videos = response.json()
+        remember_content_ids(context, 'video', videos)
+        video_buttons = [video["title"] for video in videos]
         video_buttons.extend(["📖 Главное меню", "🔙 Назад"])
         keyboard = list(chunked(video_buttons, 2))
         markup = ReplyKeyboardMarkup(keyboard,
@@ -1608,7 +1662,7 @@ def get_available_video_title(update: Update, context: CallbackContext) -> State
                     """)
         is_callback = bool(update.callback_query)
         video_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'] = [video_message]
+        reset_tracked_messages(context, video_message)
         return States.AVAILABLE_CONTENT
 
     except requests.RequestException as e:
@@ -1628,18 +1682,23 @@ def get_video_info(update: Update, context: CallbackContext) -> States:
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     lesson_title = context.user_data["lesson_title"]
-    response = call_api_get(f"bot/video/{lesson_title}/{video_title}")
+    video_id = get_content_id(context, 'video', video_title)
+    if video_id:
+        response = call_api_get(f"bot/video_by_id/{video_id}/")
+    else:
+        response = call_api_get(f"bot/video/{lesson_title}/{video_title}")
     try:
         response.raise_for_status()
         video_data = response.json()
 
         video_link = video_data['video_link']
         context.user_data['video_id'] = video_data['video_id']
+        context.user_data['video_title'] = video_data['title']
         video_message = context.bot.send_message(chat_id=chat_id, text=video_link)
-        context.user_data['prev_message_ids'].append(video_message.message_id)
+        track_messages(context, video_message.message_id)
 
         if not video_data['summaries']:
             description = 'Нет описания'
@@ -1657,7 +1716,7 @@ def get_video_info(update: Update, context: CallbackContext) -> States:
 
         is_callback = bool(update.callback_query)
         description_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(description_message_id)
+        track_messages(context, description_message_id)
 
         return States.AVAILABLE_QUESTION
 
@@ -1673,7 +1732,7 @@ def get_video_control_question(update: Update, context: CallbackContext) -> Stat
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     video_id = context.user_data['video_id']
     response = call_api_get(f'bot/video_question/{video_id}')
@@ -1698,14 +1757,11 @@ def get_video_control_question(update: Update, context: CallbackContext) -> Stat
         picture = question.get('picture')
         if picture and isinstance(picture, str) and picture.strip():
             try:
-                picture_response = requests.get(picture, timeout=5)
-                picture_response.raise_for_status()
-                message_id = context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=picture_response.content,
-                    caption=msg,
-                    reply_markup=markup,
-                    parse_mode=ParseMode.HTML
+                message_id = send_cached_media(
+                    picture, 'photo',
+                    lambda photo: context.bot.send_photo(chat_id=chat_id, photo=photo, caption=msg,
+                                                         reply_markup=markup, parse_mode=ParseMode.HTML),
+                    timeout=5
                 ).message_id
             except (requests.RequestException, telegram.error.BadRequest) as e:
                 logger.error(f"Ошибка загрузки или отправки фото: {e}")
@@ -1723,14 +1779,14 @@ def get_video_control_question(update: Update, context: CallbackContext) -> Stat
                 parse_mode=ParseMode.HTML
             ).message_id
 
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.AVAILABLE_QUESTION
     else:
         logger.error(f"API error: {response.status_code} - {response.text}")
         keyboard = [["📖 Главное меню"]]
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
         message_id = send_message_bot(context, update, "Вопрос не найден. Обратитесь к администратору", markup, False)
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.MAIN_MENU
 
 
@@ -1738,7 +1794,7 @@ def handle_video_question_answer(update: Update, context: CallbackContext) -> St
     """Обрабатывает ответ пользователя."""
     chat_id = update.message.chat_id
     user_answer = update.message.text
-    context.user_data['prev_message_ids'].append(update.message.message_id)
+    track_messages(context, update.message.message_id)
     answers = context.user_data.get("answers", [])
 
     correct_answers_list = [a for a in answers if a['right']]
@@ -1752,7 +1808,7 @@ def handle_video_question_answer(update: Update, context: CallbackContext) -> St
             reply_markup=None,
             parse_mode=ParseMode.HTML
         ).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         video_id = context.user_data['video_id']
         telegram_id = get_telegram_id(update, context)
         response = call_api_get(f"bot/tg_user/{telegram_id}")
@@ -1782,28 +1838,22 @@ def handle_video_question_answer(update: Update, context: CallbackContext) -> St
         # Формируем и отправляем сообщение о новом контенте
         menu_msg = format_content_message(next_content)
         message_id = send_content_message(context, menu_msg, chat_id=chat_id)
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
 
         logger.info(f"Next step determined: {next_step}, params: {next_step_params}")
 
         # Определяем, что доступно пользователю после успешного ответа и отправляем его в соответствующий States
+        # Параметры следующего шага содержат названия и ИД контента
+        context.user_data.update(next_step_params)
         if next_step == 'topic':
-            context.user_data['topic_title'] = next_step_params['topic_title']
             return States.AVAILABLE_TOPIC
         elif next_step == 'lesson':
-            context.user_data['topic_title'] = next_step_params['topic_title']
-            context.user_data['lesson_title'] = next_step_params['lesson_title']
             return States.AVAILABLE_LESSON
         elif next_step == 'video':
-            context.user_data['video_title'] = next_step_params['video_title']
-            context.user_data['lesson_title'] = next_step_params['lesson_title']
             return States.AVAILABLE_FINISH_VIDEO
         elif next_step == 'test':
-            context.user_data['test_title'] = next_step_params['test_title']
             return States.AVAILABLE_FINISH_TEST
         elif next_step == 'practice':
-            context.user_data['practice_title'] = next_step_params['practice_title']
-            context.user_data['lesson_title'] = next_step_params['lesson_title']
             return States.AVAILABLE_FINISH_PRACTICE
         else:
             return States.AVAILABLE_FINISH
@@ -1811,7 +1861,7 @@ def handle_video_question_answer(update: Update, context: CallbackContext) -> St
     else:
         msg = "❌ Неправильно. Попробуй снова"
         message_id = context.bot.send_message(chat_id=chat_id, text=msg, parse_mode=ParseMode.HTML).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
 
         time.sleep(1)
 
@@ -1829,14 +1879,14 @@ def handle_video_question_answer(update: Update, context: CallbackContext) -> St
                     {answers_text}
                     """).replace("  ", "")
 
-        delete_previous_messages(context, chat_id)
+        delete_tracked_messages(context, chat_id)
         message_id = context.bot.send_message(
             chat_id=chat_id,
             text=msg,
             reply_markup=markup,
             parse_mode=ParseMode.HTML
         ).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.AVAILABLE_QUESTION
 
 
@@ -1846,16 +1896,22 @@ def get_available_tests_title(update: Update, context: CallbackContext) -> State
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     try:
         lesson_title = context.user_data["lesson_title"]
         topic_title = context.user_data["topic_title"]
-        response_all_lesson_tests = call_api_get(f"bot/lesson_tests/{topic_title}/{lesson_title}")
-        response_all_lesson_tests.raise_for_status()
-        tests_data = response_all_lesson_tests.json()
+        telegram_id = get_telegram_id(update, context)
+        lesson_id = context.user_data.get("lesson_id")
+        if lesson_id:
+            response = call_api_get(f"bot/available_lesson_tests_by_id/{telegram_id}/{lesson_id}/")
+        else:
+            response = call_api_get(f"bot/available_lesson_tests/{telegram_id}/{topic_title}/{lesson_title}/")
+        response.raise_for_status()
+        tests = response.json()
+        remember_content_ids(context, 'test', tests)
 
-        if not tests_data or (isinstance(tests_data, dict) and not tests_data.get('data')):
+        if not tests:
             logger.info(f"Тесты для урока '{lesson_title}' не найдены")
             keyboard = [["🔙 Назад", "📖 Главное меню"]]
             markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -1864,18 +1920,10 @@ def get_available_tests_title(update: Update, context: CallbackContext) -> State
                 "В этом уроке пока нет доступных тестов. Вернитесь назад или в главное меню.",
                 markup, False
             )
-            context.user_data['prev_message_ids'].append(message_id)
+            track_messages(context, message_id)
             return States.AVAILABLE_CONTENT
 
-        tests_id = [test["test_id"] for test in tests_data]
-
-        telegram_id = get_telegram_id(update, context)
-        response = call_api_get(f"bot/available_topics/{telegram_id}")
-        response.raise_for_status()
-
-        availability = response.json()
-        tests = availability['tests']
-        test_buttons = [test["title"] for test in tests if test["test_id"] in tests_id]
+        test_buttons = [test["title"] for test in tests]
         test_buttons.extend(["📖 Главное меню", "🔙 Назад"])
         keyboard = list(chunked(test_buttons, 2))
         markup = ReplyKeyboardMarkup(keyboard,
@@ -1886,7 +1934,7 @@ def get_available_tests_title(update: Update, context: CallbackContext) -> State
                     """)
         is_callback = bool(update.callback_query)
         test_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(test_message)
+        track_messages(context, test_message)
         return States.AVAILABLE_CONTENT
 
     except requests.RequestException as e:
@@ -1901,16 +1949,22 @@ def get_available_practices_title(update: Update, context: CallbackContext) -> S
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     try:
         lesson_title = context.user_data["lesson_title"]
         topic_title = context.user_data["topic_title"]
-        response_all_lesson_practices = call_api_get(f"bot/lesson_practices/{topic_title}/{lesson_title}")
-        response_all_lesson_practices.raise_for_status()
-        practices_data = response_all_lesson_practices.json()
+        telegram_id = get_telegram_id(update, context)
+        lesson_id = context.user_data.get("lesson_id")
+        if lesson_id:
+            response = call_api_get(f"bot/available_lesson_practices_by_id/{telegram_id}/{lesson_id}/")
+        else:
+            response = call_api_get(f"bot/available_lesson_practices/{telegram_id}/{topic_title}/{lesson_title}/")
+        response.raise_for_status()
+        practices = response.json()
+        remember_content_ids(context, 'practice', practices)
 
-        if not practices_data or (isinstance(practices_data, dict) and not practices_data.get('data')):
+        if not practices:
             logger.info(f"Практические задачи для урока '{lesson_title}' не найдены")
             keyboard = [["🔙 Назад", "📖 Главное меню"]]
             markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -1919,18 +1973,10 @@ def get_available_practices_title(update: Update, context: CallbackContext) -> S
                 "В этом уроке пока нет доступных практических заданий. Вернитесь назад или в главное меню.",
                 markup, False
             )
-            context.user_data['prev_message_ids'].append(message_id)
+            track_messages(context, message_id)
             return States.AVAILABLE_CONTENT
 
-        practices_id = [practice["practice_id"] for practice in practices_data]
-
-        telegram_id = get_telegram_id(update, context)
-        response = call_api_get(f"bot/available_topics/{telegram_id}")
-        response.raise_for_status()
-
-        availability = response.json()
-        practices = availability['practices']
-        practice_buttons = [practice["title"] for practice in practices if practice["practice_id"] in practices_id]
+        practice_buttons = [practice["title"] for practice in practices]
         practice_buttons.extend(["📖 Главное меню", "🔙 Назад"])
         keyboard = list(chunked(practice_buttons, 2))
         markup = ReplyKeyboardMarkup(keyboard,
@@ -1941,7 +1987,7 @@ def get_available_practices_title(update: Update, context: CallbackContext) -> S
                     """)
         is_callback = bool(update.callback_query)
         practice_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(practice_message)
+        track_messages(context, practice_message)
         return States.AVAILABLE_CONTENT
 
     except requests.RequestException as e:
@@ -1956,16 +2002,21 @@ def get_practice_info(update: Update, context: CallbackContext) -> States:
     if practice_title == "Следующий шаг ➡️":
         practice_title = context.user_data["practice_title"]
 
+    practice_id = get_content_id(context, 'practice', practice_title)
     context.user_data["practice_title"] = practice_title
+    context.user_data["practice_id"] = practice_id
     chat_id = update.message.chat_id
 
     # Удаляем сообщение пользователя с выбором
     context.bot.delete_message(chat_id=chat_id, message_id=update.message.message_id)
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     lesson_title = context.user_data["lesson_title"]
-    response = call_api_get(f"bot/practice/{lesson_title}/{practice_title}")
+    if practice_id:
+        response = call_api_get(f"bot/practice_by_id/{practice_id}/")
+    else:
+        response = call_api_get(f"bot/practice/{lesson_title}/{practice_title}")
 
     try:
         response.raise_for_status()
@@ -1975,20 +2026,22 @@ def get_practice_info(update: Update, context: CallbackContext) -> States:
         practice_exercise = practice_data.get('exercise')
         if not practice_exercise:
             raise ValueError("Exercise file not found or is empty!")
-        practice_exercise_response = requests.get(practice_exercise, timeout=5)
-        practice_exercise_response.raise_for_status()
         keyboard = [["🔙 Назад", "📖 Главное меню"],
                     ["Отправить ответ на проверку"]]
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
-        message_id = context.bot.send_document(
-            chat_id=chat_id,
-            document=practice_exercise_response.content,
-            filename=practice_title,
-            caption="Практическое задание",
-            reply_markup=markup,
-            parse_mode=ParseMode.HTML
+        message_id = send_cached_media(
+            practice_exercise, 'document',
+            lambda document: context.bot.send_document(
+                chat_id=chat_id,
+                document=document,
+                filename=practice_title,
+                caption="Практическое задание",
+                reply_markup=markup,
+                parse_mode=ParseMode.HTML
+            ),
+            timeout=5
         ).message_id
-        context.user_data['prev_message_ids'].append(message_id)
+        track_messages(context, message_id)
         return States.PRACTICE
 
     except requests.RequestException as e:
@@ -1998,7 +2051,7 @@ def get_practice_info(update: Update, context: CallbackContext) -> States:
     except ValueError as e:
         logger.error(f"File error: {str(e)}")
         message = context.bot.send_message(chat_id=chat_id, text="Ошибка: файл задания отсутствует.")
-        context.user_data['prev_message_ids'].append(message.message_id)
+        track_messages(context, message.message_id)
         handle_api_error(update, context, e, chat_id)
         return States.ADMIN
 
@@ -2011,7 +2064,7 @@ def send_practice_to_check(update: Update, context: CallbackContext) -> States:
                     3. Прикрепите файл к сообщению и нажмите отправить
                     """).replace("  ", "")
     message_to_admin = send_message_bot(context, update, menu_msg, markup=None, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
     return States.PRACTICE
 
 
@@ -2029,7 +2082,7 @@ def send_practice_to_admin(update: Update, context: CallbackContext) -> States:
                                  resize_keyboard=True,
                                  one_time_keyboard=True)
     message_to_admin = send_message_bot(context, update, menu_msg, markup, is_callback=False)
-    context.user_data['prev_message_ids'].append(message_to_admin)
+    track_messages(context, message_to_admin)
 
     # Получаем telegram_id администратора из БД
     response = call_api_get('bot/get_tg_admin')
@@ -2072,13 +2125,13 @@ def send_practice_to_admin(update: Update, context: CallbackContext) -> States:
                    " напишите ему по номеру телефона +7 980 300 45 45"
         markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
         admin_message_id = send_message_bot(context, update, menu_msg, markup, is_callback)
-        context.user_data['prev_message_ids'].append(admin_message_id)
+        track_messages(context, admin_message_id)
         return States.MAIN_MENU
 
 
 def not_send_document(update: Update, context: CallbackContext) -> States:
     message_id = update.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     keyboard = [["🔙 Назад", "📖 Главное меню"],
                 ["Отправить ответ на проверку"]]
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -2086,7 +2139,7 @@ def not_send_document(update: Update, context: CallbackContext) -> States:
                'Расширение .doc'
     is_callback = bool(update.callback_query)
     practice_message = send_message_bot(context, update, menu_msg, markup, is_callback)
-    context.user_data['prev_message_ids'].append(practice_message)
+    track_messages(context, practice_message)
     return States.PRACTICE
 
 
@@ -2101,7 +2154,7 @@ def get_admin_approval(update: Update, context: CallbackContext):
     practice_id = callback_data.split('_')[-2]
 
     message_id = query.message.message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     menu_msg = 'Ответ отправлен пользователю. Нажмите кнопку "📖 Главное меню" или /start'
     keyboard = [["📖 Главное меню"]]
@@ -2112,8 +2165,8 @@ def get_admin_approval(update: Update, context: CallbackContext):
         text=menu_msg,
         reply_markup=markup,
         parse_mode=ParseMode.HTML
-    )
-    context.user_data['prev_message_ids'].append(message_id)
+    ).message_id
+    track_messages(context, message_id)
 
     # Подготовка данных для API
     payload = {
@@ -2147,7 +2200,7 @@ def get_admin_approval(update: Update, context: CallbackContext):
         reply_markup=markup,
         parse_mode=ParseMode.HTML
     ).message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     logger.info(f"Next step determined: {next_step}, params: {next_step_params}")
     return States.AVAILABLE_FINISH  # Состояние для администратора
@@ -2156,7 +2209,7 @@ def get_admin_approval(update: Update, context: CallbackContext):
 def get_next_step_after_practice(update: Update, context: CallbackContext) -> States:
     chat_id = update.effective_chat.id
     # Удаляем предыдущие сообщения
-    delete_previous_messages(context, chat_id)
+    delete_tracked_messages(context, chat_id)
 
     # Получаем сохранённые данные клиента
     client_updates = context.bot_data.get('client_updates', {}).get(str(chat_id))
@@ -2167,20 +2220,8 @@ def get_next_step_after_practice(update: Update, context: CallbackContext) -> St
     next_step = client_updates['next_step']
     next_step_params = client_updates['next_step_params']
 
-    # Обновляем context.user_data для клиента
-    if next_step == 'topic':
-        context.user_data['topic_title'] = next_step_params.get('topic_title')
-    elif next_step == 'lesson':
-        context.user_data['topic_title'] = next_step_params.get('topic_title')
-        context.user_data['lesson_title'] = next_step_params.get('lesson_title')
-    elif next_step == 'video':
-        context.user_data['video_title'] = next_step_params.get('video_title')
-        context.user_data['lesson_title'] = next_step_params.get('lesson_title')
-    elif next_step == 'test':
-        context.user_data['test_title'] = next_step_params.get('test_title')
-    elif next_step == 'practice':
-        context.user_data['practice_title'] = next_step_params.get('practice_title')
-        context.user_data['lesson_title'] = next_step_params.get('lesson_title')
+    # Обновляем context.user_data для клиента: параметры следующего шага содержат названия и ИД контента
+    context.user_data.update(next_step_params)
 
     menu_msg = "Нажми еще раз Следующий шаг"
     telegram_id = get_telegram_id(update, context)
@@ -2194,7 +2235,7 @@ def get_next_step_after_practice(update: Update, context: CallbackContext) -> St
         reply_markup=markup,
         parse_mode=ParseMode.HTML
     ).message_id
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
 
     # Определяем следующее состояние
     if next_step == 'topic':
@@ -2213,7 +2254,7 @@ def get_next_step_after_practice(update: Update, context: CallbackContext) -> St
 def user_done_progress(update: Update, context: CallbackContext) -> States:
     """Присылает пользователю информацию по пройденным позициям."""
     chat_id = update.effective_chat.id
-    context.user_data['prev_message_ids'].append(update.message.message_id if update.message else None)
+    track_messages(context, update.message.message_id if update.message else None)
     telegram_id = get_telegram_id(update, context)
 
     try:
@@ -2229,14 +2270,14 @@ def user_done_progress(update: Update, context: CallbackContext) -> States:
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
     is_callback = bool(update and update.callback_query) if update else False
     message_id = send_message_bot(context, update, menu_msg, markup, is_callback, chat_id)
-    context.user_data['prev_message_ids'].append(message_id)
+    track_messages(context, message_id)
     return States.MAIN_MENU
 
 
 # def send_message_to_simpa(update: Update, context: CallbackContext) -> States:
 #     """Отправляет сообщение в чат gpt."""
 #     chat_id = update.effective_chat.id
-#     context.user_data['prev_message_ids'].append(update.message.message_id)
+#     track_messages(context, update.message.message_id)
 #
 #     # Запрашиваем сообщение у пользователя
 #     message = "Введите сообщение для симпа бота и нажмите отправить. Если передумали нажмите кнопку 📖 Главное меню"
@@ -2248,7 +2289,7 @@ def user_done_progress(update: Update, context: CallbackContext) -> States:
 #         reply_markup=markup,
 #         parse_mode=ParseMode.HTML
 #     )
-#     context.user_data['prev_message_ids'].append(message_id)
+#     track_messages(context, message_id)
 #     context.user_data['awaiting_simpa_message'] = True
 #     return States.AWAITING_SIMPA_MESSAGE
 #
@@ -2278,7 +2319,7 @@ def user_done_progress(update: Update, context: CallbackContext) -> States:
 #     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
 #     is_callback = bool(update and update.callback_query) if update else False
 #     message_id = send_message_bot(context, update, menu_msg, markup, is_callback, chat_id)
-#     context.user_data['prev_message_ids'].append(message_id)
+#     track_messages(context, message_id)
 #     return States.MAIN_MENU
 
 
@@ -2293,13 +2334,37 @@ if __name__ == '__main__':
     telegram_bot_token = env.str("TG_BOT_TOKEN")
     provider_ukassa_token = env.str("PAYMENT_UKASSA_TOKEN")
 
-    # Настройка Request с увеличенными таймаутами
-    request = Request(connect_timeout=10, read_timeout=30)  # 10 сек на соединение, 30 сек на чтение
-    bot = Bot(token=telegram_bot_token, request=request)
+    # BOT_WORKERS потоков обрабатывают обновления разных чатов параллельно (обновления одного чата -
+    # по порядку в одном потоке); пул соединений к API бэкенда того же размера
+    workers = env.int("BOT_WORKERS", 8)
+    configure_api_client(pool_size=workers)
+
+    # Настройка Request с увеличенными таймаутами: 10 сек на соединение, 30 сек на чтение.
+    # Соединений к Bot API хватает потокам чатов, отправке outbox и задачам JobQueue
+    request = Request(con_pool_size=workers + SEND_WORKERS + 4, connect_timeout=10, read_timeout=30)
+    # TELEGRAM_API_URL позволяет направить бота на локальную заглушку Telegram API (fake_telegram_api.py)
+    telegram_api_url = env.str("TELEGRAM_API_URL", "https://api.telegram.org").rstrip('/')
+    # Отправка сообщений идет через очередь outbox с лимитами Telegram на чат и на бота
+    bot = ScheduledBot(token=telegram_bot_token, request=request,
+                       base_url=f"{telegram_api_url}/bot", base_file_url=f"{telegram_api_url}/file/bot")
 
     # Создание Updater с настроенным ботом
-    updater = Updater(bot=bot, use_context=True, request_kwargs={'connection_pool_maxsize': 5000})
-    dispatcher = updater.dispatcher
+    # Состояние диалогов, user_data и client_updates сохраняются в SQLite (запись пачками в фоне)
+    # и восстанавливаются после перезапуска бота
+    persistence = create_persistence()
+    dispatcher = ChatOrderedDispatcher(bot, Queue(), workers=1, job_queue=JobQueue(), persistence=persistence,
+                                       use_context=True, update_workers=workers)
+    dispatcher.job_queue.set_dispatcher(dispatcher)
+    updater = Updater(dispatcher=dispatcher, workers=None)
+    # После задач JobQueue сохраняются только user_data, измененные задачей, а не всех пользователей
+    persistence.attach(dispatcher)
+    updater.job_queue.run_repeating(log_api_metrics, interval=env.int("API_METRICS_INTERVAL", 300))
+    updater.job_queue.run_repeating(log_outbox_metrics, interval=env.int("API_METRICS_INTERVAL", 300))
+    # Каталог тем и тарифов держится в bot_data и перечитывается после изменений контента на бэкенде
+    updater.job_queue.run_repeating(catalog_cache.check_catalog_version,
+                                    interval=catalog_cache.CATALOG_CHECK_INTERVAL, first=0)
+    # Раз в сутки: отзыв закончившегося доступа и напоминания о продлении (рассылка через outbox)
+    updater.job_queue.run_daily(sweep_entitlements, time=SWEEP_TIME)
 
     valid_topic_filter = ValidTopicFilter()
     valid_tariff_filter = ValidTariffFilter()
@@ -2741,6 +2806,7 @@ if __name__ == '__main__':
         fallbacks=[],
         allow_reentry=True,
         name='bot_conversation',
+        persistent=True,
         per_message=False,
     )
 
@@ -2759,9 +2825,37 @@ if __name__ == '__main__':
 
 
     dispatcher.add_error_handler(error_handler)
+    # Чат текущего обновления: ответы в него отправляются раньше уведомлений в другие чаты
+    dispatcher.add_handler(TypeHandler(Update, remember_update_chat), group=-1)
+    # Команда администратора регистрируется до conv_handler: иначе в диалоге ее перехватит его обработчик текста
+    dispatcher.add_handler(CommandHandler('refresh_catalog', refresh_catalog_command))
     dispatcher.add_handler(conv_handler)
     start_handler = CommandHandler('start', start)
     dispatcher.add_handler(start_handler)
 
-    updater.start_polling()
+    # Каталог и индекс названий для фильтров загружаются до приема первых сообщений
+    try:
+        catalog_cache.refresh_catalog(dispatcher.bot_data)
+    except requests.RequestException as e:
+        logger.error(f"Каталог не загружен при старте, повтор по расписанию: {e}")
+
+    # Режим получения обновлений: polling (по умолчанию) или webhook за nginx
+    if env.str("BOT_MODE", "polling") == "webhook":
+        # Секрет пути - отдельное случайное значение: путь попадает в логи nginx и в настройки Telegram
+        webhook_secret = env.str("BOT_WEBHOOK_SECRET", "")
+        webhook_base_url = env.str("BOT_WEBHOOK_BASE_URL", "").rstrip('/')
+        if not webhook_secret or not webhook_base_url:
+            raise SystemExit("Для BOT_MODE=webhook нужны BOT_WEBHOOK_SECRET и BOT_WEBHOOK_BASE_URL")
+        url_path = f"telegram/webhook/{webhook_secret}"
+        updater.start_webhook(
+            listen=env.str("BOT_WEBHOOK_LISTEN", "0.0.0.0"),
+            port=env.int("BOT_WEBHOOK_PORT", 8081),
+            url_path=url_path,
+            webhook_url=f"{webhook_base_url}/{url_path}",
+            max_connections=env.int("BOT_WEBHOOK_MAX_CONNECTIONS", 40),
+        )
+        logger.info("Бот запущен в режиме webhook")
+    else:
+        updater.start_polling()
+        logger.info("Бот запущен в режиме polling")
     updater.idle()
@@ -0,0 +1,64 @@
+import logging
+
+from telegram import Message
+from telegram.ext import MessageFilter
+
+logger = logging.getLogger(__name__)
+
+
+class TitleIndex:
+    """
+    Названия всего контента и тарифов в одном словаре: название -> виды ('topics', 'lessons', ...).
+    Проверка сообщения - один поиск по хэшу строки, т.е. O(len(text)), без запросов к API.
+    """
+
+    def __init__(self, titles: dict):
+        kinds_by_title = {}
+        for kind, kind_titles in titles.items():
+            for title in kind_titles:
+                kinds_by_title.setdefault(title, set()).add(kind)
+        self.kinds_by_title = {title: frozenset(kinds) for title, kinds in kinds_by_title.items()}
+
+    def kinds_of(self, text: str) -> frozenset:
+        return self.kinds_by_title.get(text, frozenset())
+
+
+_state = {'index': TitleIndex({})}
+
+
+def set_title_index(titles: dict) -> None:
+    """Заменяет индекс названий (вызывается при загрузке каталога бота)."""
+    _state['index'] = TitleIndex(titles)
+    logger.info(f"Индекс названий обновлен: {len(_state['index'].kinds_by_title)} названий")
+
+
+class ValidTitleFilter(MessageFilter):
+    """Пропускает сообщение, если его текст - название контента вида kind."""
+    kind = None
+
+    def filter(self, message: Message) -> bool:
+        return bool(message.text) and self.kind in _state['index'].kinds_of(message.text)
+
+
+class ValidTopicFilter(ValidTitleFilter):
+    kind = 'topics'
+
+
+class ValidLessonFilter(ValidTitleFilter):
+    kind = 'lessons'
+
+
+class ValidVideoFilter(ValidTitleFilter):
+    kind = 'videos'
+
+
+class ValidTestsFilter(ValidTitleFilter):
+    kind = 'tests'
+
+
+class ValidPracticeFilter(ValidTitleFilter):
+    kind = 'practices'
+
+
+class ValidTariffFilter(ValidTitleFilter):
+    kind = 'tariffs'